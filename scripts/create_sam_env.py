@@ -4,8 +4,24 @@ from the existing .env file.
 """
 
 import os
-import json
-from dotenv import dotenv_values
+import re
+import orjson
+from pathlib import Path
+
+# KEY=value lines, optionally prefixed with `export`; comments and blank lines don't match
+ENV_LINE = re.compile(r'^[ \t]*(?:export[ \t]+)?([A-Za-z_][A-Za-z0-9_]*)[ \t]*=[ \t]*(.*?)[ \t\r]*$', re.M)
+
+
+def parse_env(text):
+    """Parse .env content into a dict, stripping quotes and inline comments."""
+    env_vars = {}
+    for key, value in ENV_LINE.findall(text):
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+            value = value[1:-1]
+        else:
+            value = value.split(' #', 1)[0].rstrip()
+        env_vars[key] = value
+    return env_vars
 
 def create_sam_env_json():
     """
@@ -24,7 +40,7 @@ def create_sam_env_json():
     print(f"Reading environment variables from {env_path}...")
     
     # Load .env file into a dictionary
-    env_vars = dotenv_values(env_path)
+    env_vars = parse_env(Path(env_path).read_text(encoding='utf-8'))
 
     # Hardcode the API_STAGE variable as it might not be in the .env file
     if 'API_STAGE' not in env_vars:
@@ -37,8 +53,8 @@ def create_sam_env_json():
 
     print(f"Writing SAM-compatible environment variables to {env_json_path}...")
     
-    with open(env_json_path, 'w') as f:
-        json.dump(sam_vars, f, indent=2)
+    with open(env_json_path, 'wb') as f:
+        f.write(orjson.dumps(sam_vars, option=orjson.OPT_INDENT_2))
 
     print("✅ Success! .env.json file created.")
     print("   You can now run `sam local start-api`.")
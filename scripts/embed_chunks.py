@@ -1,63 +1,554 @@
 """
-Generate BGE-M3 embeddings for JSONL chunks and save back to JSONL.
+Generate BGE-M3 embeddings for JSONL chunks and save them as .npy sidecars.
 
 This script:
-1. Reads chunks from JSONL files
+1. Streams chunks from JSONL files, one window at a time
 2. Generates BGE-M3 embeddings (GPU accelerated if available)
-3. Adds 'embedding' field to each chunk
-4. Saves back to JSONL files
+3. Writes embeddings to X_embeddings.f16.npy (float16, one row per chunk)
+4. Writes the chunks, each with a 'row_index' pointing at its embeddings row,
+   to X_chunks.jsonl.gz (compressed in-line, no separate gzip pass)
+5. Optionally (--quantize) writes a binary or int8 copy for compact storage
+   and fast first-pass search, keeping the float16 file for rescoring
 
 Use this on vast.ai to generate embeddings, then download and index locally.
 """
 
-import json
+import argparse
+import gzip
+import hashlib
+import os
+import numpy as np
+import orjson
 import torch
 from pathlib import Path
-from typing import List, Dict, Any
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from sentence_transformers import SentenceTransformer
+from sentence_transformers.quantization import quantize_embeddings
 from tqdm import tqdm
 
+# Run with the project root on PYTHONPATH (poetry run locally, remote_ingest.sh on vast.ai)
+from src.retrieval.embedding_sidecars import embeddings_path, sidecar_path
 
-def load_chunks(jsonl_path: Path) -> List[Dict[str, Any]]:
-    """Load chunks from JSONL file."""
-    chunks = []
-    with open(jsonl_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            chunks.append(json.loads(line))
-    return chunks
 
+# Files up to this size are read in one go and split in C; larger ones are streamed
+MAX_IN_MEMORY_BYTES = 1 << 30
 
-def save_chunks(chunks: List[Dict[str, Any]], jsonl_path: Path):
-    """Save chunks with embeddings to JSONL file."""
-    with open(jsonl_path, 'w', encoding='utf-8') as f:
-        for chunk in chunks:
-            f.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+MODEL_NAME = 'BAAI/bge-m3'
 
 
-def embed_chunks(chunks: List[Dict[str, Any]], model: SentenceTransformer, batch_size: int = 32) -> List[Dict[str, Any]]:
-    """Add embeddings to chunks."""
-    print(f"Embedding {len(chunks)} chunks...")
+def iter_lines(jsonl_path: Path) -> Iterator[bytes]:
+    """Yield the non-blank raw lines of a JSONL file (the rows that hold a chunk)."""
+    if jsonl_path.stat().st_size > MAX_IN_MEMORY_BYTES:
+        with open(jsonl_path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield line
+        return
+
+    # One read + a C-level split instead of a Python-level readline loop
+    for line in jsonl_path.read_bytes().split(b'\n'):
+        if line.strip():
+            yield line
+
+
+def iter_chunks(jsonl_path: Path) -> Iterator[Dict[str, Any]]:
+    """Stream chunks from JSONL file."""
+    for line in iter_lines(jsonl_path):
+        yield orjson.loads(line)
+
+
+def count_chunks(jsonl_path: Path) -> int:
+    """Count chunks in JSONL file without parsing them (blank lines skipped, as in iter_chunks)."""
+    return sum(1 for _ in iter_lines(jsonl_path))
+
+
+def hashes_path(jsonl_path: Path) -> Path:
+    """Sidecar of per-row content hashes (uint64) matching the embeddings file."""
+    return sidecar_path(jsonl_path, "embeddings.hashes.npy")
+
+
+def meta_path(jsonl_path: Path) -> Path:
+    """Sidecar recording which model/backend/dtype produced the embeddings file."""
+    return sidecar_path(jsonl_path, "embeddings.meta.json")
+
+
+def embedding_signature(model: SentenceTransformer, backend: str) -> Dict[str, str]:
+    """What an embedding depends on besides the text: model, backend and weight dtype."""
+    # ONNX Runtime/OpenVINO models run fp32; PyTorch weights are whatever load_model left them in
+    dtype = str(next(model.parameters()).dtype).removeprefix('torch.') if backend == "torch" else "float32"
+    return {"model": MODEL_NAME, "backend": backend, "dtype": dtype}
+
+
+def chunk_hash(text: str) -> bytes:
+    """Stable 64-bit content hash of a chunk's text (8-byte digest)."""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+
+
+def load_previous_embeddings(
+    jsonl_path: Path,
+    dim: int,
+    signature: Dict[str, str]
+) -> Tuple[Optional[np.ndarray], Dict[int, int]]:
+    """
+    Load embeddings from a previous run for reuse.
+
+    Nothing is reused unless the previous run recorded the same signature
+    (see embedding_signature): rows keyed by text alone would otherwise mix
+    vectors from different models or precisions.
+
+    Returns:
+        (embeddings memmap or None, {content hash: row index})
+    """
+    npy_path, hash_path, info_path = embeddings_path(jsonl_path), hashes_path(jsonl_path), meta_path(jsonl_path)
+    if not (npy_path.exists() and hash_path.exists() and info_path.exists()):
+        return None, {}
+
+    previous_signature = orjson.loads(info_path.read_bytes())
+    if previous_signature != signature:
+        print(f"Previous embeddings were made with {previous_signature}, not {signature}: re-encoding all chunks")
+        return None, {}
+
+    embeddings = np.load(npy_path, mmap_mode='r')
+    hashes = np.load(hash_path)
+    if embeddings.shape != (len(hashes), dim):
+        return None, {}
+    return embeddings, {h: row for row, h in enumerate(hashes.tolist())}
+
+
+def tokens_path(jsonl_path: Path) -> Path:
+    """Token cache for a chunks JSONL (x_chunks.jsonl -> x_tokens.npz)."""
+    return sidecar_path(jsonl_path, "tokens.npz")
+
+
+def load_token_cache(jsonl_path: Path) -> Dict[int, np.ndarray]:
+    """Load {content hash: int32 token ids} from a previous run's token cache."""
+    path = tokens_path(jsonl_path)
+    if not path.exists():
+        return {}
 
-    # Extract texts
-    texts = [chunk['text'] for chunk in chunks]
+    with np.load(path) as cache:
+        hashes, lengths, ids = cache['hashes'], cache['lengths'], cache['ids']
+    # Ragged rows are views into the single concatenated ids array
+    return dict(zip(hashes.tolist(), np.split(ids, np.cumsum(lengths)[:-1])))
 
-    # Generate embeddings in batches with progress bar
-    embeddings = model.encode(
-        texts,
-        batch_size=batch_size,
-        show_progress_bar=True,
-        convert_to_numpy=True
+
+def save_token_cache(jsonl_path: Path, hashes: List[int], token_cache: Dict[int, np.ndarray]) -> None:
+    """Persist token ids for the given hashes as ragged int32 ids + lengths."""
+    rows = [token_cache[h] for h in hashes]
+    path = tokens_path(jsonl_path)
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f,
+            hashes=np.array(hashes, dtype=np.uint64),
+            lengths=np.array([len(row) for row in rows], dtype=np.int32),
+            ids=np.concatenate(rows) if rows else np.empty(0, dtype=np.int32)
+        )
+    tmp_path.replace(path)
+
+
+def tokenize_texts(texts: List[str], model: SentenceTransformer) -> List[np.ndarray]:
+    """Tokenize with the model's fast tokenizer exactly as model.encode would (no padding)."""
+    encoded = model.tokenizer(
+        [text.strip() for text in texts],
+        padding=False,
+        truncation=True,
+        max_length=model.max_seq_length
     )
+    return [np.asarray(ids, dtype=np.int32) for ids in encoded['input_ids']]
+
+
+def encode_tokens(
+    token_ids: List[np.ndarray],
+    model: SentenceTransformer,
+    batch_size: int,
+    out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Encode pre-tokenized texts by calling the model's forward pass directly.
+
+    Batches are built over length-sorted rows and padded to the batch max, so
+    this skips model.encode's tokenization entirely. int32 ids halve the
+    host-to-device payload compared to the tokenizer's int64 tensors. On GPU,
+    each batch is copied from pinned memory on a side stream while the
+    previous batch's forward pass runs.
+    """
+    lengths = np.fromiter(map(len, token_ids), dtype=np.int64, count=len(token_ids))
+    order = np.argsort(lengths, kind='stable')
+    pad_token_id = model.tokenizer.pad_token_id
+    if out is None:
+        out = np.empty((len(token_ids), model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+    device = torch.device(model.device)
+    on_gpu = device.type == "cuda"
+    # Side stream for host-to-device copies so they overlap the current forward pass
+    copy_stream = torch.cuda.Stream(device) if on_gpu else None
+
+    def to_device(batch: np.ndarray) -> Dict[str, torch.Tensor]:
+        input_ids = np.full((len(batch), lengths[batch].max()), pad_token_id, dtype=np.int32)
+        attention_mask = np.zeros_like(input_ids)
+        for row, i in enumerate(batch):
+            input_ids[row, :lengths[i]] = token_ids[i]
+            attention_mask[row, :lengths[i]] = 1
+
+        features = {'input_ids': torch.from_numpy(input_ids), 'attention_mask': torch.from_numpy(attention_mask)}
+        if not on_gpu:
+            return features
+        # Pinned (page-locked) staging lets the copy run asynchronously
+        with torch.cuda.stream(copy_stream):
+            return {name: tensor.pin_memory().to(device, non_blocking=True) for name, tensor in features.items()}
+
+    batches = [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+    with torch.inference_mode():
+        features = to_device(batches[0]) if batches else None
+        for k, batch in enumerate(batches):
+            if on_gpu:
+                torch.cuda.current_stream(device).wait_stream(copy_stream)
+                for tensor in features.values():
+                    tensor.record_stream(torch.cuda.current_stream(device))
+
+            # Queued asynchronously on GPU; build and copy the next batch meanwhile
+            embeddings = model(features)['sentence_embedding']
+            if k + 1 < len(batches):
+                features = to_device(batches[k + 1])
+            out[batch] = embeddings.float().cpu().numpy()
+
+    return out
+
+
+def encode_chunks(
+    texts: List[str],
+    hashes: List[int],
+    model: SentenceTransformer,
+    batch_size: int,
+    pool: Optional[Dict[str, Any]] = None,
+    token_cache: Optional[Dict[int, np.ndarray]] = None,
+    out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Encode chunks, going through the token cache when one is given."""
+    if token_cache is None:
+        return encode_texts(texts, model, batch_size, pool, out=out)
+
+    missing = [i for i, h in enumerate(hashes) if h not in token_cache]
+    if missing:
+        for i, ids in zip(missing, tokenize_texts([texts[i] for i in missing], model)):
+            token_cache[hashes[i]] = ids
+    return encode_tokens([token_cache[h] for h in hashes], model, batch_size, out=out)
+
+
+def encode_texts(
+    texts: List[str],
+    model: SentenceTransformer,
+    batch_size: int,
+    pool: Optional[Dict[str, Any]] = None,
+    out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Encode texts, returning embeddings in the same order as the input.
+
+    If out is given (e.g. a slice of the output memmap), embeddings are
+    written straight into it instead of a new array.
+    """
+    # Sort by length so each batch is padded to a similar length (smart batching)
+    order = np.argsort([len(text) for text in texts], kind='stable')
+    sorted_texts = [texts[i] for i in order]
+
+    if pool is not None:
+        # ~4 work items per worker so faster workers pick up the slack
+        chunk_size = max(1, len(texts) // (4 * len(pool['processes'])))
+        sorted_embeddings = model.encode_multi_process(
+            sorted_texts, pool, batch_size=batch_size, chunk_size=chunk_size
+        )
+    else:
+        # No autograd bookkeeping: we never backprop through the encoder
+        with torch.inference_mode():
+            sorted_embeddings = model.encode(
+                sorted_texts,
+                batch_size=batch_size,
+                show_progress_bar=False,
+                convert_to_numpy=True
+            )
+
+    # Restore original chunk order
+    if out is None:
+        out = np.empty_like(sorted_embeddings)
+    out[order] = sorted_embeddings
+    return out
+
+
+def embed_file(
+    jsonl_path: Path,
+    model: SentenceTransformer,
+    backend: str,
+    batch_size: int = 32,
+    window_size: int = 4096,
+    pool: Optional[Dict[str, Any]] = None,
+    use_token_cache: bool = False
+) -> int:
+    """
+    Embed every chunk of a JSONL file into a float16 .npy sidecar.
+
+    Chunks are read, encoded and written one window at a time so peak memory
+    stays proportional to window_size rather than to the corpus size. Each
+    chunk gets a 'row_index' pointing at its row in the sidecar array, which is
+    written through a memmap. Chunk metadata is gzip-compressed as it is
+    written, to X_chunks.jsonl.gz next to the (untouched) input file. Outputs
+    are written to temporary paths and only replace the originals on success. If a multi-process pool is given,
+    each window is split across its workers.
 
-    # Add embeddings to chunks
-    for chunk, embedding in zip(chunks, embeddings):
-        chunk['embedding'] = embedding.tolist()
+    Chunks whose content hash matches a row of the previous run's sidecar
+    (X_embeddings.hashes.npy) reuse that embedding instead of being re-encoded,
+    provided X_embeddings.meta.json shows the same model, backend and dtype.
 
-    return chunks
+    With use_token_cache, token ids are kept in X_tokens.npz across runs and
+    the model's forward pass is fed directly, skipping re-tokenization.
+
+    Returns:
+        Number of chunks embedded
+    """
+    total_chunks = count_chunks(jsonl_path)
+    dim = model.get_sentence_embedding_dimension()
+    signature = embedding_signature(model, backend)
+    previous_embeddings, previous_rows = load_previous_embeddings(jsonl_path, dim, signature)
+    print(f"Embedding {total_chunks} chunks ({len(previous_rows)} embeddings from a previous run available)...")
+
+    npy_path, hash_path, info_path = embeddings_path(jsonl_path), hashes_path(jsonl_path), meta_path(jsonl_path)
+    gz_path = jsonl_path.with_suffix(jsonl_path.suffix + '.gz')
+    tmp_gz_path = gz_path.with_suffix(gz_path.suffix + '.tmp')
+    tmp_npy_path = npy_path.with_suffix(npy_path.suffix + '.tmp')
+    tmp_hash_path = hash_path.with_suffix(hash_path.suffix + '.tmp')
+    chunks = iter_chunks(jsonl_path)
+    reused = 0
+    token_cache = load_token_cache(jsonl_path) if use_token_cache else None
+
+    try:
+        embeddings_out = np.lib.format.open_memmap(
+            tmp_npy_path, mode='w+', dtype=np.float16, shape=(total_chunks, dim)
+        )
+        hashes_out = np.lib.format.open_memmap(
+            tmp_hash_path, mode='w+', dtype=np.uint64, shape=(total_chunks,)
+        )
+
+        # Level 3: most of gzip's ratio on JSON at a fraction of the CPU of the default 9
+        with gzip.open(tmp_gz_path, 'wb', compresslevel=3) as out, \
+             tqdm(total=total_chunks, unit="chunk") as progress:
+            row = 0
+            while window := list(islice(chunks, window_size)):
+                digests = [chunk_hash(chunk['text']) for chunk in window]
+                hashes = np.frombuffer(b''.join(digests), dtype='>u8')
+                hash_ints = hashes.tolist()
+
+                # Reuse rows whose text is unchanged since the previous run; encode the rest
+                cached = [(i, previous_rows[h]) for i, h in enumerate(hash_ints) if h in previous_rows]
+                to_encode = [i for i, h in enumerate(hash_ints) if h not in previous_rows]
+
+                # Fill the output memmap slice in place, no per-window staging array
+                window_embeddings = embeddings_out[row:row + len(window)]
+                if not cached:
+                    encode_chunks([chunk['text'] for chunk in window], hash_ints, model, batch_size,
+                                  pool, token_cache, out=window_embeddings)
+                else:
+                    window_embeddings[[i for i, _ in cached]] = previous_embeddings[[r for _, r in cached]]
+                    reused += len(cached)
+                    if to_encode:
+                        window_embeddings[to_encode] = encode_chunks(
+                            [window[i]['text'] for i in to_encode], [hash_ints[i] for i in to_encode],
+                            model, batch_size, pool, token_cache
+                        )
+
+                hashes_out[row:row + len(window)] = hashes
+
+                for chunk, digest in zip(window, digests):
+                    chunk.pop('embedding', None)
+                    chunk['row_index'] = row
+                    chunk['chunk_hash'] = digest.hex()
+                    out.write(orjson.dumps(chunk, option=orjson.OPT_APPEND_NEWLINE))
+                    row += 1
+
+                progress.update(len(window))
+
+        embeddings_out.flush()
+        hashes_out.flush()
+        if token_cache is not None:
+            # Only keep tokens of chunks still in the file
+            save_token_cache(jsonl_path, [h for h in hashes_out.tolist() if h in token_cache], token_cache)
+        del embeddings_out, hashes_out
+    except BaseException:
+        tmp_gz_path.unlink(missing_ok=True)
+        tmp_npy_path.unlink(missing_ok=True)
+        tmp_hash_path.unlink(missing_ok=True)
+        raise
+
+    if reused:
+        print(f"Reused {reused} unchanged embeddings, encoded {total_chunks - reused}")
+
+    # Release the previous memmap before replacing the file it maps
+    del previous_embeddings
+    # Drop the old signature first, so an interruption never pairs it with new rows
+    info_path.unlink(missing_ok=True)
+    tmp_hash_path.replace(hash_path)
+    tmp_npy_path.replace(npy_path)
+    tmp_gz_path.replace(gz_path)
+    info_path.write_bytes(orjson.dumps(signature))
+    return total_chunks
+
+
+def quantize_file(npy_path: Path, precision: str, window_size: int = 4096) -> Path:
+    """
+    Write a quantized copy of a float16 embeddings sidecar.
+
+    binary: packed sign bits (uint8, dim/8 bytes per row) for Hamming search,
+        written to X_embeddings.bin.npy
+    int8: per-dimension min/max scaling over the whole corpus, written to
+        X_embeddings.int8.npy with the calibration ranges in X_embeddings.int8.json
+
+    Returns:
+        Path of the quantized .npy file
+    """
+    embeddings = np.load(npy_path, mmap_mode='r')
+    num_rows, dim = embeddings.shape
+    prefix = npy_path.name.removesuffix('.f16.npy')
+
+    if precision == "binary":
+        out_path = npy_path.with_name(f"{prefix}.bin.npy")
+        out_dtype, out_dim = np.uint8, dim // 8
+        kwargs = {}
+    else:
+        # Calibrate on the full corpus so every window shares the same scale
+        ranges = np.stack([np.full(dim, np.inf, dtype=np.float32),
+                           np.full(dim, -np.inf, dtype=np.float32)])
+        for start in range(0, num_rows, window_size):
+            window = embeddings[start:start + window_size].astype(np.float32)
+            ranges[0] = np.minimum(ranges[0], window.min(axis=0))
+            ranges[1] = np.maximum(ranges[1], window.max(axis=0))
+
+        out_path = npy_path.with_name(f"{prefix}.int8.npy")
+        out_dtype, out_dim = np.int8, dim
+        kwargs = {"ranges": ranges}
+        with open(npy_path.with_name(f"{prefix}.int8.json"), 'wb') as f:
+            f.write(orjson.dumps({"min": ranges[0], "max": ranges[1]}, option=orjson.OPT_SERIALIZE_NUMPY))
+
+    quantized = np.lib.format.open_memmap(out_path, mode='w+', dtype=out_dtype, shape=(num_rows, out_dim))
+    for start in range(0, num_rows, window_size):
+        window = embeddings[start:start + window_size].astype(np.float32)
+        # "ubinary" packs bits into uint8 (plain "binary" offsets them into int8)
+        quantized[start:start + len(window)] = quantize_embeddings(
+            window, precision="ubinary" if precision == "binary" else "int8", **kwargs
+        )
+    quantized.flush()
+    return out_path
+
+
+def load_model(device: str, backend: str = "auto", dtype: str = "fp16") -> Tuple[SentenceTransformer, str]:
+    """
+    Load BGE-M3 with the fastest available backend for the device.
+
+    "auto" uses PyTorch on GPU and ONNX Runtime on CPU, where its
+    graph-level fusions are several times faster than eager PyTorch. If an
+    ONNX/OpenVINO load fails (missing optimum extras, export error), falls
+    back to PyTorch.
+
+    dtype sets the PyTorch GPU weights: fp16, bf16 (falls back to fp16 on
+    GPUs without bf16 support) or fp32. CPU always runs fp32.
+
+    Returns:
+        (model, backend actually used)
+    """
+    if backend == "auto":
+        backend = "torch" if device == "cuda" else "onnx"
+
+    if backend != "torch":
+        provider = "CUDAExecutionProvider" if device == "cuda" else "CPUExecutionProvider"
+        model_kwargs = {"provider": provider} if backend == "onnx" else None
+        try:
+            return SentenceTransformer(MODEL_NAME, device=device, backend=backend,
+                                       model_kwargs=model_kwargs), backend
+        except Exception as e:
+            print(f"⚠️  {backend} backend unavailable ({e}), falling back to torch")
+
+    model = SentenceTransformer(MODEL_NAME, device=device)
+    model.eval()
+    if device == "cuda":
+        # FP16/BF16 halve weight/activation traffic and VRAM and use tensor cores.
+        # BF16 trades mantissa for FP32's range (no overflow in long sequences).
+        if dtype == "bf16" and not torch.cuda.is_bf16_supported():
+            print("⚠️  bf16 not supported on this GPU, using fp16")
+            dtype = "fp16"
+        if dtype == "bf16":
+            model = model.to(torch.bfloat16)
+        elif dtype == "fp16":
+            model = model.half()
+    return model, "torch"
+
+
+def start_pool(model: SentenceTransformer, device: str) -> Optional[Dict[str, Any]]:
+    """
+    Start a multi-process encode pool when the host has spare devices.
+
+    One worker per GPU on multi-GPU hosts; on many-core CPU hosts up to 4 CPU
+    workers, each limited to its share of cores to avoid oversubscription.
+    Returns None when a single process is the better choice.
+    """
+    if device == "cuda":
+        gpu_count = torch.cuda.device_count()
+        if gpu_count < 2:
+            return None
+        target_devices = [f"cuda:{i}" for i in range(gpu_count)]
+    else:
+        cpu_count = os.cpu_count() or 1
+        num_workers = min(4, cpu_count // 4)
+        if num_workers < 2:
+            return None
+        target_devices = ["cpu"] * num_workers
+        # Inherited by the spawned workers before torch initializes there
+        os.environ["OMP_NUM_THREADS"] = str(cpu_count // num_workers)
+
+    print(f"Starting {len(target_devices)} encode workers: {', '.join(target_devices)}")
+    return model.start_multi_process_pool(target_devices=target_devices)
+
+
+def default_batch_size(device: str, half_precision: bool) -> int:
+    """Pick an encode batch size from available VRAM (32 on CPU)."""
+    if device != "cuda":
+        return 32
+
+    vram_gb = torch.cuda.get_device_properties(0).total_memory / 1024**3
+    if vram_gb <= 8:
+        batch_size = 16
+    elif vram_gb <= 16:
+        batch_size = 64
+    elif vram_gb <= 24:
+        batch_size = 128
+    else:
+        batch_size = 256
+
+    # FP32 activations take twice the memory
+    return batch_size if half_precision else batch_size // 2
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Generate BGE-M3 embeddings for JSONL chunks")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Encode batch size (default: picked from available VRAM)")
+    parser.add_argument("--window-size", type=int, default=4096,
+                        help="Chunks read, encoded and written per window (bounds peak memory)")
+    parser.add_argument("--quantize", choices=["binary", "int8"], default=None,
+                        help="Also write a binary or int8 quantized copy of the embeddings")
+    parser.add_argument("--no-token-cache", action="store_true",
+                        help="Don't cache token ids in X_tokens.npz (torch backend only)")
+    parser.add_argument("--backend", choices=["auto", "torch", "onnx", "openvino"], default="auto",
+                        help="Inference backend (default: torch on GPU, onnx on CPU)")
+    parser.add_argument("--dtype", choices=["fp16", "bf16", "fp32"], default="fp16",
+                        help="PyTorch weight precision on GPU (default: fp16)")
+    return parser.parse_args()
 
 
 def main():
     """Main workflow."""
+    args = parse_args()
+
     print("="*80)
     print("BGE-M3 Embedding Generator")
     print("="*80)
@@ -68,6 +559,12 @@ def main():
     if device == "cuda":
         print(f"GPU: {torch.cuda.get_device_name(0)}")
         print(f"VRAM: {torch.cuda.get_device_properties(0).total_memory / 1024**3:.1f}GB")
+    else:
+        # Some environments default torch to a single intra-op thread; use every
+        # core we are allowed on (respects taskset/numactl pinning where supported)
+        torch.set_num_threads(len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity")
+                              else os.cpu_count() or 1)
+        print(f"CPU threads: {torch.get_num_threads()}")
 
     # Paths
     project_root = Path(__file__).parent.parent
@@ -84,55 +581,65 @@ def main():
 
     # Load model
     print(f"\n📥 Loading BGE-M3 model...")
-    model = SentenceTransformer('BAAI/bge-m3', device=device)
-    print(f"✅ Model loaded (embedding dim: {model.get_sentence_embedding_dimension()})")
+    model, backend = load_model(device, args.backend, args.dtype)
+    print(f"✅ Model loaded (embedding dim: {model.get_sentence_embedding_dimension()}, "
+          f"backend: {backend})")
 
-    # Process Code du travail
-    print(f"\n" + "="*80)
-    print("Processing Code du travail")
-    print("="*80)
+    half_precision = device == "cuda" and backend == "torch" and args.dtype != "fp32"
+    batch_size = args.batch_size or default_batch_size(device, half_precision=half_precision)
+    print(f"Batch size: {batch_size}")
 
-    print(f"Loading chunks from {code_travail_path.name}...")
-    code_travail_chunks = load_chunks(code_travail_path)
-    print(f"Loaded {len(code_travail_chunks)} chunks")
-
-    code_travail_chunks = embed_chunks(code_travail_chunks, model, batch_size=32)
-
-    print(f"Saving embeddings to {code_travail_path}...")
-    save_chunks(code_travail_chunks, code_travail_path)
-    print(f"✅ Saved {len(code_travail_chunks)} chunks with embeddings")
-
-    # Process KALI
-    print(f"\n" + "="*80)
-    print("Processing KALI conventions")
-    print("="*80)
+    # ONNX Runtime/OpenVINO already use every core in-process
+    pool = start_pool(model, device) if backend == "torch" else None
+    # The token cache feeds the PyTorch forward pass directly, in-process
+    use_token_cache = backend == "torch" and pool is None and not args.no_token_cache
+    try:
+        # Process Code du travail
+        print(f"\n" + "="*80)
+        print("Processing Code du travail")
+        print("="*80)
 
-    print(f"Loading chunks from {kali_path.name}...")
-    kali_chunks = load_chunks(kali_path)
-    print(f"Loaded {len(kali_chunks)} chunks")
+        code_travail_count = embed_file(
+            code_travail_path, model, backend, batch_size=batch_size, window_size=args.window_size,
+            pool=pool, use_token_cache=use_token_cache
+        )
+        print(f"✅ Saved {code_travail_count} embeddings to {embeddings_path(code_travail_path)}")
+        if args.quantize:
+            quantized_path = quantize_file(embeddings_path(code_travail_path), args.quantize, args.window_size)
+            print(f"✅ Saved {args.quantize} embeddings to {quantized_path}")
 
-    kali_chunks = embed_chunks(kali_chunks, model, batch_size=32)
+        # Process KALI
+        print(f"\n" + "="*80)
+        print("Processing KALI conventions")
+        print("="*80)
 
-    print(f"Saving embeddings to {kali_path}...")
-    save_chunks(kali_chunks, kali_path)
-    print(f"✅ Saved {len(kali_chunks)} chunks with embeddings")
+        kali_count = embed_file(
+            kali_path, model, backend, batch_size=batch_size, window_size=args.window_size,
+            pool=pool, use_token_cache=use_token_cache
+        )
+        print(f"✅ Saved {kali_count} embeddings to {embeddings_path(kali_path)}")
+        if args.quantize:
+            quantized_path = quantize_file(embeddings_path(kali_path), args.quantize, args.window_size)
+            print(f"✅ Saved {args.quantize} embeddings to {quantized_path}")
+    finally:
+        if pool is not None:
+            model.stop_multi_process_pool(pool)
 
     # Summary
-    total_chunks = len(code_travail_chunks) + len(kali_chunks)
+    total_chunks = code_travail_count + kali_count
     print(f"\n" + "="*80)
     print("✅ Embedding Complete!")
     print("="*80)
     print(f"Total chunks embedded: {total_chunks:,}")
-    print(f"  - Code du travail: {len(code_travail_chunks):,}")
-    print(f"  - KALI: {len(kali_chunks):,}")
-    print(f"\nFiles updated:")
-    print(f"  - {code_travail_path}")
-    print(f"  - {kali_path}")
+    print(f"  - Code du travail: {code_travail_count:,}")
+    print(f"  - KALI: {kali_count:,}")
+    print(f"\nFiles written:")
+    print(f"  - {code_travail_path}.gz (+ {embeddings_path(code_travail_path).name})")
+    print(f"  - {kali_path}.gz (+ {embeddings_path(kali_path).name})")
     print(f"\nNext steps:")
-    print(f"  1. Compress: gzip data/processed/*_chunks.jsonl")
-    print(f"  2. Download to local machine")
-    print(f"  3. Decompress: gunzip data/processed/*.jsonl.gz")
-    print(f"  4. Index: make ingest-only")
+    print(f"  1. Download to local machine (.jsonl.gz + .npy files)")
+    print(f"  2. Decompress: gunzip -f data/processed/*.jsonl.gz")
+    print(f"  3. Index: make ingest-only")
 
 
 if __name__ == "__main__":
@@ -1,80 +1,90 @@
 """
 Explore AgentPublic/legi dataset to understand Code du travail coverage.
 
-This script streams the dataset without downloading everything to:
+This script loads the dataset as an Arrow table (cached on disk) to:
 1. Count how many Code du travail chunks exist
 2. Identify the category labels used
 3. Sample a few examples to compare with our processing
+
+Counts and filters run as vectorized pyarrow.compute kernels over the
+columns instead of a Python loop over 1.26M records.
 """
 
 from datasets import load_dataset
 from collections import Counter
+import pyarrow.compute as pc
 import json
 import sys
 
 def explore_dataset(sample_size=None):
-    print("Loading AgentPublic/legi dataset in streaming mode...")
+    print("Loading AgentPublic/legi dataset (Arrow, cached on disk)...")
     if sample_size:
         print(f"Sampling first {sample_size:,} records for quick exploration.\n")
     else:
-        print("Scanning ALL 1.26M records (this will take a few minutes).\n")
+        print("Scanning ALL 1.26M records.\n")
 
-    dataset = load_dataset("AgentPublic/legi", streaming=True, split='train')
+    dataset = load_dataset("AgentPublic/legi", split='train')
 
     # Limit to sample if specified
     if sample_size:
-        dataset = dataset.take(sample_size)
-
-    # Tracking
-    code_travail_count = 0
-    total_count = 0
-    categories = Counter()
-    titles = Counter()
+        dataset = dataset.select(range(min(sample_size, len(dataset))))
+
+    # Only the columns we tally/filter on; full rows are fetched for the few samples
+    table = dataset.select_columns(['category', 'title', 'full_title', 'chunk_id']).with_format("arrow")[:]
+    total_count = table.num_rows
+
+    category = pc.fill_null(table['category'], '')
+    category_counts = pc.value_counts(category)
+    categories = Counter(dict(zip(
+        category_counts.field('values').to_pylist(),
+        category_counts.field('counts').to_pylist()
+    )))
+
+    # title, falling back to full_title when missing or empty
+    raw_title = table['title']
+    title = pc.if_else(pc.fill_null(pc.not_equal(raw_title, ''), False), raw_title, table['full_title'])
+    title_counts = pc.value_counts(pc.drop_null(title))
+    titles = Counter({
+        value: count
+        for value, count in zip(title_counts.field('values').to_pylist(), title_counts.field('counts').to_pylist())
+        if value
+    })
+
+    # Filter by category='CODE' AND title contains 'travail'
+    is_code = pc.equal(category, 'CODE')
+    is_travail = pc.fill_null(pc.match_substring(pc.utf8_lower(title), 'travail'), False)
+    is_code_travail = pc.and_(is_code, is_travail)
+    code_travail_count = pc.sum(is_code_travail).as_py() or 0
+
+    # Collect samples where category='CODE' to see what titles look like
+    code_indices = pc.indices_nonzero(is_code)[:10]
+    code_category_samples = [
+        {
+            'title': row_title,
+            'full_title': (row['full_title'] or '')[:100],
+            'chunk_id': row['chunk_id']
+        }
+        for row, row_title in zip(
+            table.take(code_indices).to_pylist(),
+            title.take(code_indices).to_pylist()
+        )
+    ]
+
+    # Collect first 3 Code du travail examples
     sample_examples = []
-    code_category_samples = []  # Samples where category='CODE'
-
-    for example in dataset:
-        total_count += 1
-        category = example.get('category', '')
-        categories[category] += 1
-
-        title = example.get('title', '') or example.get('full_title', '')
-        if title:
-            titles[title] += 1
-
-        # Collect samples where category='CODE' to see what titles look like
-        if category == 'CODE' and len(code_category_samples) < 10:
-            code_category_samples.append({
-                'title': title,
-                'full_title': example.get('full_title', '')[:100],
-                'chunk_id': example.get('chunk_id')
-            })
-
-        # Check if this is Code du travail
-        # Filter by category='CODE' AND title contains 'travail'
-        is_code = category == 'CODE'
-        is_travail = 'travail' in title.lower() if title else False
-
-        if is_code and is_travail:
-            code_travail_count += 1
-
-            # Collect first 3 examples
-            if len(sample_examples) < 3:
-                sample_examples.append({
-                    'chunk_id': example.get('chunk_id'),
-                    'category': category,
-                    'nature': example.get('nature'),
-                    'title': example.get('title', '')[:100],
-                    'chunk_text': example.get('chunk_text', '')[:200],
-                    'chunk_index': example.get('chunk_index'),
-                    'status': example.get('status'),
-                    'start_date': example.get('start_date'),
-                    'end_date': example.get('end_date')
-                })
-
-            # Progress updates
-            if code_travail_count % 1000 == 0:
-                print(f"Progress: {total_count:,} total | {code_travail_count:,} Code du travail found")
+    for index in pc.indices_nonzero(is_code_travail)[:3].to_pylist():
+        example = dataset[index]
+        sample_examples.append({
+            'chunk_id': example.get('chunk_id'),
+            'category': example.get('category'),
+            'nature': example.get('nature'),
+            'title': (example.get('title') or '')[:100],
+            'chunk_text': (example.get('chunk_text') or '')[:200],
+            'chunk_index': example.get('chunk_index'),
+            'status': example.get('status'),
+            'start_date': example.get('start_date'),
+            'end_date': example.get('end_date')
+        })
 
     # Results
     print("\n" + "="*80)
@@ -0,0 +1,33 @@
+#!/usr/bin/env bash
+# Remote half of run_vast_ingestion.py: generates the embeddings on the vast.ai
+# instance. Uploaded to /workspace/scripts/ together with embed_chunks.py, the
+# src/ module it imports and the compressed inputs.
+#
+# Environment:
+#   HF_HOME          HuggingFace cache (default: /workspace/hf_cache, on the
+#                    instance disk so keep_alive re-runs reuse BGE-M3)
+#   MODEL_CACHE_URL  Optional .tar.gz of the HF cache with BGE-M3, fetched
+#                    instead of the Hub when the model isn't cached yet
+set -euo pipefail
+
+export HF_HOME="${HF_HOME:-/workspace/hf_cache}"
+mkdir -p "$HF_HOME"
+if [ -n "${MODEL_CACHE_URL:-}" ] && [ ! -d "$HF_HOME/hub/models--BAAI--bge-m3" ]; then
+    curl -sSL "$MODEL_CACHE_URL" | tar -xzf - -C "$HF_HOME"
+fi
+
+# Decompress the uploaded inputs (.zst, or .gz when zstd wasn't installed
+# locally; the newer archive wins if a keep_alive re-run left both)
+cd /workspace/data/processed
+for name in code_travail_chunks.jsonl kali_chunks.jsonl; do
+    if [ -f "upload_cache/$name.zst" ] && [ ! "upload_cache/$name.gz" -nt "upload_cache/$name.zst" ]; then
+        zstd -q -d -c "upload_cache/$name.zst" > "$name"
+    else
+        gunzip -c "upload_cache/$name.gz" > "$name"
+    fi
+done
+
+# Run embedding script (writes *_chunks.jsonl.gz directly).
+# BF16 on the GPU: half the VRAM of FP32, so 12GB cards fit
+cd /workspace
+PYTHONPATH=/workspace python scripts/embed_chunks.py --dtype bf16
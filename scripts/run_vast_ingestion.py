@@ -3,30 +3,82 @@ Automate BGE-M3 embedding generation on vast.ai GPU instance.
 
 This script:
 1. Provisions a vast.ai GPU instance
-2. Uploads JSONL files (40MB) and embedding script
+2. Uploads compressed (zstd, or gzip) JSONL files (40MB raw) and embedding script
 3. Generates BGE-M3 embeddings on GPU
-4. Downloads embedded JSONL files back to local machine (gzipped)
+4. Downloads chunk JSONL files (gzipped) and float16 .npy embeddings back to local machine
 5. Destroys instance
 
 Requirements:
-- vast.ai CLI: pip install vastai
-- vast.ai API key: vastai set api-key YOUR_KEY
+- vast.ai API key: vastai set api-key YOUR_KEY (pip install vastai), saved to
+  ~/.config/vastai/vast_api_key; all instance operations then use the REST API
+- rsync locally (installed on the instance automatically)
+- Optional: asyncssh, to download results over a single SFTP session
 
 Cost: ~$0.10-0.20 total
 
 After download:
-1. Decompress: gunzip data/processed/*.jsonl.gz
+1. Decompress: gunzip -f data/processed/*.jsonl.gz
 2. Index locally: make ingest-only
 """
 
+import argparse
+import asyncio
+import os
+import random
+import shlex
+import shutil
+import stat
 import subprocess
-import json
+import orjson
+import requests
 import time
 import sys
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Callable, Optional, Dict, Any, List
+
+try:
+    import asyncssh  # Optional: pipelined SFTP downloads over one SSH session
+except ImportError:
+    asyncssh = None
+
+VAST_API_URL = "https://console.vast.ai/api/v0"
+
+# Upload compression by file suffix: zstd when installed locally (faster and smaller),
+# gzip otherwise. --rsyncable keeps re-uploads delta-friendly across small JSONL edits.
+UPLOAD_CODECS = {
+    ".zst": ["zstd", "-q", "-c", "-3", "-T0", "--rsyncable"],
+    ".gz": ["gzip", "-c", "-6", "--rsyncable"],
+}
+
+# Where the vastai CLI stores the key set by `vastai set api-key` (new and legacy locations)
+VAST_API_KEY_PATHS = [
+    Path.home() / ".config" / "vastai" / "vast_api_key",
+    Path.home() / ".vast_api_key",
+]
+
+# Offer searches are cached briefly: the vast.ai market moves on the order of minutes
+OFFERS_CACHE_PATH = Path.home() / ".cache" / "admin-rag" / "offers.json"
+OFFERS_CACHE_TTL = 60  # seconds
+
+# A successful API key check is trusted for a day (skipped on re-runs, see --force-check)
+PREREQ_SENTINEL_PATH = Path.home() / ".cache" / "admin-rag" / "prereq_ok"
+PREREQ_SENTINEL_TTL = 24 * 3600  # seconds
+
+# Offers requested per search (the API sorts server-side, best first)
+OFFERS_LIMIT = 10
+# Shared SSH connection socket (ControlMaster), reused by every ssh/rsync after wait_for_instance
+SSH_CONTROL_PATH = "/tmp/vastai-%r@%h:%p"
+# HuggingFace cache on the instance disk: survives re-runs on a kept-alive instance
+REMOTE_HF_HOME = "/workspace/hf_cache"
+# Output of scripts/remote_ingest.sh, fetched into logs/ when the run fails
+REMOTE_INGEST_LOG = "/workspace/remote_ingest.log"
+# rsync retries (resuming from the partial file) before a transfer is given up
+RSYNC_ATTEMPTS = 3
 
 
 def setup_logging() -> logging.Logger:
@@ -51,10 +103,11 @@ def setup_logging() -> logging.Logger:
     )
     file_handler.setFormatter(file_formatter)
 
-    # Console handler (INFO level - important stuff)
-    console_handler = logging.StreamHandler()
+    # Console handler (INFO level - important stuff): the script's user-facing
+    # output, so messages go to stdout as-is and are not printed separately
+    console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.INFO)
-    console_formatter = logging.Formatter('%(levelname)s: %(message)s')
+    console_formatter = logging.Formatter('%(message)s')
     console_handler.setFormatter(console_formatter)
 
     logger.addHandler(file_handler)
@@ -65,6 +118,48 @@ def setup_logging() -> logging.Logger:
     return logger
 
 
+def load_vast_api_key() -> Optional[str]:
+    """Read the vast.ai API key saved by the vastai CLI."""
+    for path in VAST_API_KEY_PATHS:
+        if path.exists():
+            return path.read_text().strip()
+    return None
+
+
+@lru_cache(maxsize=1)
+def vastai_api_key_valid(http: requests.Session) -> bool:
+    """Check the session's API key against the vast.ai API (once per process)."""
+    if "Authorization" not in http.headers:
+        return False
+    try:
+        http.get(f"{VAST_API_URL}/users/current/", timeout=10).raise_for_status()
+        return True
+    except requests.RequestException:
+        return False
+
+
+def load_cached_offers(query: str) -> Optional[list]:
+    """Return offers cached for this exact query if younger than OFFERS_CACHE_TTL."""
+    try:
+        entry = orjson.loads(OFFERS_CACHE_PATH.read_bytes()).get(query)
+    except (OSError, ValueError):
+        return None
+    if entry and time.time() - entry['cached_at'] <= OFFERS_CACHE_TTL:
+        return entry['offers']
+    return None
+
+
+def save_cached_offers(query: str, offers: list) -> None:
+    """Cache offers for this query (one entry per query, replaced on save)."""
+    try:
+        cache = orjson.loads(OFFERS_CACHE_PATH.read_bytes())
+    except (OSError, ValueError):
+        cache = {}
+    cache[query] = {'cached_at': time.time(), 'offers': offers}
+    OFFERS_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    OFFERS_CACHE_PATH.write_bytes(orjson.dumps(cache))
+
+
 class VastAIIngestion:
     """Automate ingestion on vast.ai GPU instance."""
 
@@ -74,349 +169,588 @@ class VastAIIngestion:
                  disk_size: int = 30,      # GB
                  min_download_speed: int = 100,  # Mbps (for downloading BGE-M3 model)
                  min_upload_speed: int = 50,     # Mbps (for uploading results)
-                 keep_alive: bool = False):      # Keep instance running after completion
+                 keep_alive: bool = False,       # Keep instance running after completion
+                 model_cache_url: Optional[str] = None):  # .tar.gz of the HF cache with BGE-M3
         self.max_price = max_price
         self.min_gpu_ram = min_gpu_ram
         self.disk_size = disk_size
         self.min_download_speed = min_download_speed
         self.min_upload_speed = min_upload_speed
         self.keep_alive = keep_alive
+        self.model_cache_url = model_cache_url
         self.instance_id: Optional[int] = None
         self.ssh_host: Optional[str] = None
         self.ssh_port: Optional[int] = None
+        self.setup_process: Optional[subprocess.Popen] = None
+        self.offers_from_cache = False  # Whether the last search was answered from OFFERS_CACHE_PATH
+        self.create_requested = False  # Whether this run sent a create request (see _cleanup_after_failure)
+
+        # One HTTPS session for vast.ai API calls (connection + TLS reuse across polls)
+        self.http = requests.Session()
+        # Instance/offer JSON compresses ~5x
+        self.http.headers["Accept-Encoding"] = "gzip"
+        api_key = load_vast_api_key()
+        if api_key:
+            self.http.headers["Authorization"] = f"Bearer {api_key}"
 
         # Paths
         self.project_root = Path(__file__).parent.parent
         self.code_travail_jsonl = self.project_root / "data" / "processed" / "code_travail_chunks.jsonl"
         self.kali_jsonl = self.project_root / "data" / "processed" / "kali_chunks.jsonl"
+        # Compressed copies of the inputs for upload (kept apart from the downloaded *.jsonl.gz results)
+        self.upload_cache_dir = self.project_root / "data" / "processed" / "upload_cache"
+        self.upload_suffix = ".zst" if shutil.which("zstd") else ".gz"
+        self.embed_script = self.project_root / "scripts" / "embed_chunks.py"
+        self.remote_script = self.project_root / "scripts" / "remote_ingest.sh"
+        # Imported by embed_chunks.py (sidecar naming), uploaded with its package markers
+        self.shared_modules = [self.project_root / "src" / "__init__.py",
+                               self.project_root / "src" / "retrieval" / "__init__.py",
+                               self.project_root / "src" / "retrieval" / "embedding_sidecars.py"]
+        # Instance ID of the current run, persisted as soon as it exists so an
+        # interrupted run can still clean up; cleared at the start and end of each run
+        self.instance_state_path = self.project_root / ".vast_instance.json"
+        # One stat() per local file, shared by the prerequisite check, compression cache and upload
+        self._file_stats: Dict[Path, os.stat_result] = {}
 
         # Setup logging
         self.logger = setup_logging()
 
+    def _ssh_opts(self, multiplex: bool = True) -> List[str]:
+        """
+        SSH options for the instance, as argv (also passed to rsync via -e).
+
+        With multiplex, the call rides the ControlMaster connection opened by
+        wait_for_instance, falling back to a fresh connection if it is gone.
+        """
+        opts = ["-p", str(self.ssh_port), "-o", "StrictHostKeyChecking=no", "-o", "UserKnownHostsFile=/dev/null"]
+        if multiplex:
+            opts += ["-o", f"ControlPath={SSH_CONTROL_PATH}"]
+        return opts
+
+    def _ssh_cmd(self, *remote_command: str, multiplex: bool = True, extra_opts: Optional[List[str]] = None) -> List[str]:
+        """argv for `ssh root@instance <remote_command>` (no local shell involved)."""
+        return ["ssh", *(extra_opts or []), *self._ssh_opts(multiplex=multiplex), f"root@{self.ssh_host}", *remote_command]
+
+    def open_ssh_master(self) -> None:
+        """Open a background ControlMaster connection that later ssh/rsync calls reuse."""
+        # The successful SSH readiness probe normally left one behind already
+        if subprocess.run(self._ssh_cmd(extra_opts=["-O", "check"]), capture_output=True).returncode == 0:
+            self.logger.info("SSH ControlMaster connection opened")
+            return
+        try:
+            # -f backgrounds after auth; stdio must not be captured or the persisted master holds the pipes open
+            subprocess.run(
+                self._ssh_cmd(extra_opts=["-MNf", "-o", "ControlMaster=yes", "-o", "ControlPersist=10m"]),
+                check=True, timeout=30,
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            self.logger.info("SSH ControlMaster connection opened")
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            # Not fatal: every call falls back to its own connection
+            self.logger.warning(f"Could not open SSH ControlMaster, using one connection per call: {e}")
+
+    def close_ssh_master(self) -> None:
+        """Close the ControlMaster connection if one is open."""
+        if not self.ssh_host:
+            return
+        subprocess.run(self._ssh_cmd(extra_opts=["-O", "exit"]), capture_output=True)
+
+    def _rsync(self, sources: List[str], dest: str, multiplex: bool = True, cwd: Optional[Path] = None,
+               extra_args: Optional[List[str]] = None) -> str:
+        """
+        rsync files to/from the instance, retrying with exponential backoff.
+
+        --partial keeps interrupted files so a retry only sends the missing
+        part (via the delta algorithm) instead of starting over.
+
+        Returns:
+            rsync's stdout (e.g. the --itemize-changes list)
+
+        Raises:
+            subprocess.CalledProcessError: If the last attempt fails
+        """
+        cmd = [
+            "rsync", "-a", "--partial", "--timeout=30",
+            "-e", shlex.join(["ssh", *self._ssh_opts(multiplex=multiplex)]),
+            *(extra_args or []), *sources, dest
+        ]
+        for attempt in range(1, RSYNC_ATTEMPTS + 1):
+            try:
+                return subprocess.run(cmd, cwd=cwd, check=True, capture_output=True, text=True).stdout
+            except subprocess.CalledProcessError as e:
+                if attempt == RSYNC_ATTEMPTS:
+                    raise
+                delay = 2 ** attempt
+                self.logger.warning(f"rsync failed (attempt {attempt}/{RSYNC_ATTEMPTS}), retrying in {delay}s: "
+                                    f"{(e.stderr or '').strip()}")
+                time.sleep(delay)
+
+    def _api(self, method: str, path: str, timeout: float = 30, **kwargs) -> Any:
+        """Call the vast.ai REST API and return the decoded JSON response."""
+        response = self.http.request(method, f"{VAST_API_URL}{path}", timeout=timeout, stream=False, **kwargs)
+        response.raise_for_status()
+        return orjson.loads(response.content)
+
+    def _stat(self, path: Path) -> Optional[os.stat_result]:
+        """stat() a local file once and cache the result (None if it does not exist)."""
+        if path not in self._file_stats:
+            try:
+                self._file_stats[path] = path.stat()
+            except FileNotFoundError:
+                return None
+        return self._file_stats[path]
+
     def check_prerequisites(self) -> bool:
         """Check if all prerequisites are met."""
-        print("🔍 Checking prerequisites...")
-        self.logger.info("Starting prerequisite checks")
+        self.logger.info("🔍 Checking prerequisites...")
 
-        # Check vast.ai CLI
+        # Check API key (all vast.ai calls go through its REST API, no CLI subprocesses)
         try:
-            result = subprocess.run(["vastai", "--version"],
-                                   capture_output=True, text=True, check=True)
-            version = result.stdout.strip()
-            print(f"   ✅ vast.ai CLI installed: {version}")
-            self.logger.info(f"vast.ai CLI version: {version}")
-        except (subprocess.CalledProcessError, FileNotFoundError) as e:
-            print("   ❌ vast.ai CLI not found")
-            print("      Install: pip install vastai")
-            self.logger.error(f"vast.ai CLI not found: {e}")
+            key_checked_recently = time.time() - PREREQ_SENTINEL_PATH.stat().st_mtime < PREREQ_SENTINEL_TTL
+        except FileNotFoundError:
+            key_checked_recently = False
+
+        if key_checked_recently and "Authorization" in self.http.headers:
+            self.logger.info("   ✅ vast.ai API key configured (checked within the last 24h)")
+        elif vastai_api_key_valid(self.http):
+            self.logger.info("   ✅ vast.ai API key configured")
+            PREREQ_SENTINEL_PATH.parent.mkdir(parents=True, exist_ok=True)
+            PREREQ_SENTINEL_PATH.touch()
+        else:
+            self.logger.error("   ❌ vast.ai API key not set or invalid\n"
+                              "      Set key: vastai set api-key YOUR_KEY\n"
+                              "      Get key from: https://cloud.vast.ai/account/")
             return False
 
-        # Check API key
-        try:
-            subprocess.run(["vastai", "show", "user"],
-                          capture_output=True, check=True)
-            print("   ✅ vast.ai API key configured")
-            self.logger.info("vast.ai API key is configured")
-        except subprocess.CalledProcessError as e:
-            print("   ❌ vast.ai API key not set")
-            print("      Set key: vastai set api-key YOUR_KEY")
-            print("      Get key from: https://cloud.vast.ai/account/")
-            self.logger.error(f"vast.ai API key not set: {e}")
-            return False
-
-        # Check JSONL files
-        if not self.code_travail_jsonl.exists():
-            print(f"   ❌ Missing: {self.code_travail_jsonl}")
-            self.logger.error(f"Missing file: {self.code_travail_jsonl}")
-            return False
-        if not self.kali_jsonl.exists():
-            print(f"   ❌ Missing: {self.kali_jsonl}")
-            self.logger.error(f"Missing file: {self.kali_jsonl}")
-            return False
+        # Check JSONL files and the scripts to upload
+        for path in [self.code_travail_jsonl, self.kali_jsonl, self.embed_script, self.remote_script,
+                     *self.shared_modules]:
+            st = self._stat(path)
+            if st is None or not stat.S_ISREG(st.st_mode):
+                self.logger.error(f"   ❌ Missing: {path}")
+                return False
 
-        code_travail_size = self.code_travail_jsonl.stat().st_size / 1024 / 1024
-        kali_size = self.kali_jsonl.stat().st_size / 1024 / 1024
-        print(f"   ✅ code_travail_chunks.jsonl ({code_travail_size:.1f}MB)")
-        print(f"   ✅ kali_chunks.jsonl ({kali_size:.1f}MB)")
-        self.logger.info(f"JSONL files found: code_travail={code_travail_size:.1f}MB, kali={kali_size:.1f}MB")
+        for path in [self.code_travail_jsonl, self.kali_jsonl]:
+            self.logger.info(f"   ✅ {path.name} ({self._file_stats[path].st_size / 1024 / 1024:.1f}MB)")
 
-        self.logger.info("All prerequisites met")
+        self.logger.debug("All prerequisites met")
         return True
 
+    def _fetch_offers(self, min_reliability: float) -> List[Dict[str, Any]]:
+        """Query vast.ai for matching offers, best score first (cached for OFFERS_CACHE_TTL)."""
+        # Search query - using dlperf (tested) instead of inet_down (self-reported).
+        # Same defaults as `vastai search offers` (verified, rentable, on-demand).
+        query = {
+            "gpu_ram": {"gte": self.min_gpu_ram * 1000},  # API expects MB
+            "reliability2": {"gt": min_reliability},
+            "num_gpus": {"eq": 1},
+            "dph_total": {"lte": self.max_price},
+            "cuda_max_good": {"gte": 12.0},
+            "dlperf": {"gte": self.min_download_speed},  # Actual tested download performance
+            "disk_space": {"gte": self.disk_size},
+            "verified": {"eq": True},
+            "external": {"eq": False},
+            "rentable": {"eq": True},
+            "rented": {"eq": False},
+            # Sort by score (ML workload performance) descending, best first.
+            # Score considers: reliability, bandwidth, compute capability
+            "order": [["score", "desc"]],
+            "type": "on-demand",
+            # Only the best offer is used and the top 3 shown; don't fetch/parse the tail
+            "limit": OFFERS_LIMIT,
+        }
+        query_json = orjson.dumps(query, option=orjson.OPT_SORT_KEYS).decode()
+
+        self.logger.debug(f"Searching instances with query: {query_json}")
+
+        offers = load_cached_offers(query_json)
+        self.offers_from_cache = offers is not None
+        if offers is not None:
+            self.logger.info(f"   Using offers cached within the last {OFFERS_CACHE_TTL}s")
+        else:
+            offers = self._api("GET", "/bundles/", params={"q": query_json})["offers"]
+            save_cached_offers(query_json, offers)
+        return offers
+
     def search_instances(self) -> Optional[int]:
         """Search for available GPU instances."""
-        print(f"\n🔎 Searching for GPU instances...")
-        print(f"   Filters:")
-        print(f"     - GPU RAM >= {self.min_gpu_ram}GB")
-        print(f"     - Price <= ${self.max_price}/hr")
-        print(f"     - Download perf >= {self.min_download_speed} Mbps")
-        print(f"     - Reliability > 0.95")
-
-        # Search query - using dlperf (tested) instead of inet_down (self-reported)
-        query = (
-            f"gpu_ram >= {self.min_gpu_ram} "
-            f"reliability > 0.95 "
-            f"num_gpus=1 "
-            f"dph_total <= {self.max_price} "
-            f"cuda_max_good >= 12.0 "
-            f"dlperf >= {self.min_download_speed} "  # Actual tested download performance
-            f"disk_space >= {self.disk_size}"
-        )
-
-        self.logger.info(f"Searching instances with query: {query}")
+        self.logger.info(f"\n🔎 Searching for GPU instances...\n"
+                         f"   Filters:\n"
+                         f"     - GPU RAM >= {self.min_gpu_ram}GB\n"
+                         f"     - Price <= ${self.max_price}/hr\n"
+                         f"     - Download perf >= {self.min_download_speed} Mbps\n"
+                         f"     - Reliability > 0.95 (0.90 if nothing matches)")
 
         try:
-            # Sort by score (ML workload performance) then price
-            # Score considers: reliability, bandwidth, compute capability
-            result = subprocess.run(
-                ["vastai", "search", "offers", query,
-                 "--order", "score-", "--raw"],  # Sort by score descending (best first)
-                capture_output=True, text=True, check=True
-            )
-
-            offers = json.loads(result.stdout)
+            offers = self._fetch_offers(min_reliability=0.95)
+            if not offers:
+                # One retry with a relaxed reliability floor before giving up
+                self.logger.info("   No offers with reliability > 0.95, retrying with > 0.90")
+                offers = self._fetch_offers(min_reliability=0.90)
 
             if not offers:
-                print("   ❌ No instances found matching criteria")
-                print(f"      Try increasing max_price (current: ${self.max_price}/hr)")
-                print(f"      Or lowering min_download_speed (current: {self.min_download_speed} Mbps)")
-                self.logger.warning(f"No instances found with criteria: max_price=${self.max_price}/hr, dlperf>={self.min_download_speed}")
+                self.logger.warning(f"   ❌ No instances found matching criteria\n"
+                                    f"      Try increasing max_price (current: ${self.max_price}/hr)\n"
+                                    f"      Or lowering min_download_speed (current: {self.min_download_speed} Mbps)")
                 return None
 
-            self.logger.info(f"Found {len(offers)} matching instances")
-
             # Show top 3 options
-            print(f"\n   Found {len(offers)} instances. Top 3 (by score):")
-            for i, offer in enumerate(offers[:3], 1):
+            self.logger.info(f"\n   Found {len(offers)} instances (limit {OFFERS_LIMIT}). Top 3 (by score):")
+            for i, offer in enumerate(islice(offers, 3), 1):
                 dlperf = offer.get('dlperf', 0)
                 score = offer.get('score', 0)
-                print(f"   {i}. ${offer['dph_total']:.3f}/hr | "
-                      f"{offer['gpu_name']} | "
-                      f"{offer['gpu_ram']/1024:.0f}GB VRAM | "
-                      f"DL: {dlperf:.0f}Mbps | "
-                      f"Score: {score:.1f} | "
-                      f"Reliability: {offer.get('reliability2', 0):.1%}")
-                self.logger.debug(f"Option {i}: {offer}")
+                reliability = offer.get('reliability2', 0)
+                self.logger.info(f"   {i}. ${offer['dph_total']:.3f}/hr | "
+                                 f"{offer['gpu_name']} | "
+                                 f"{offer['gpu_ram']/1024:.0f}GB VRAM | "
+                                 f"DL: {dlperf:.0f}Mbps | "
+                                 f"Score: {score:.1f} | "
+                                 f"Reliability: {reliability:.1%}")
 
             # Select best score
             best_offer = offers[0]
-            print(f"\n   ✅ Selected: {best_offer['gpu_name']} @ ${best_offer['dph_total']:.3f}/hr (score: {best_offer.get('score', 0):.1f})")
-            self.logger.info(f"Selected instance {best_offer['id']}: {best_offer['gpu_name']}, "
-                           f"${best_offer['dph_total']:.3f}/hr, "
-                           f"dlperf={best_offer.get('dlperf', 0):.0f}Mbps, score={best_offer.get('score', 0):.1f}")
+            self.logger.info(f"\n   ✅ Selected offer {best_offer['id']}: {best_offer['gpu_name']} @ "
+                             f"${best_offer['dph_total']:.3f}/hr (score: {best_offer.get('score', 0):.1f})")
 
             return best_offer['id']
 
-        except subprocess.CalledProcessError as e:
-            print(f"   ❌ Search failed: {e.stderr}")
-            self.logger.error(f"Instance search failed: {e.stderr}")
+        except requests.RequestException as e:
+            self.logger.error(f"   ❌ Search failed: {e}")
             return None
-        except json.JSONDecodeError as e:
-            print(f"   ❌ Failed to parse results: {e}")
-            self.logger.error(f"Failed to parse search results: {e}")
+        except (ValueError, KeyError) as e:
+            self.logger.error(f"   ❌ Failed to parse results: {e}")
             return None
 
     def create_instance(self, offer_id: int) -> bool:
         """Create instance from offer."""
-        print(f"\n🚀 Creating instance...")
-        self.logger.info(f"Creating instance from offer {offer_id}")
+        self.logger.info(f"\n🚀 Creating instance from offer {offer_id}...")
 
         # Use PyTorch image with all dependencies
         image = "pytorch/pytorch:2.1.0-cuda12.1-cudnn8-runtime"
         self.logger.debug(f"Using Docker image: {image}")
 
         try:
-            result = subprocess.run(
-                ["vastai", "create", "instance", str(offer_id),
-                 "--image", image,
-                 "--disk", str(self.disk_size),
-                 "--raw"],
-                capture_output=True, text=True, check=True
-            )
-
-            response = json.loads(result.stdout)
-            self.instance_id = response.get('new_contract')
-
-            if not self.instance_id:
-                print(f"   ❌ Failed to create instance: {response}")
-                self.logger.error(f"Instance creation failed: {response}")
+            self.create_requested = True
+            response = self._api("PUT", f"/asks/{offer_id}/", json={
+                "client_id": "me",
+                "image": image,
+                "disk": self.disk_size,
+                "runtype": "ssh",
+                "label": "admin-rag-ingestion",
+                "env": {"HF_HOME": REMOTE_HF_HOME},
+            })
+            instance_id = response.get('new_contract')
+
+            if not instance_id:
+                self.logger.error(f"   ❌ Failed to create instance: {response}")
                 return False
+            # Persisted before anything else: the instance is billed from now on
+            self.instance_state_path.write_bytes(orjson.dumps({"instance_id": instance_id}))
+            self.instance_id = instance_id
 
-            print(f"   ✅ Instance created: ID {self.instance_id}")
-            self.logger.info(f"Instance created successfully: ID {self.instance_id}")
+            self.logger.info(f"   ✅ Instance created: ID {self.instance_id}")
             return True
 
-        except (subprocess.CalledProcessError, json.JSONDecodeError) as e:
-            print(f"   ❌ Creation failed: {e}")
-            self.logger.error(f"Instance creation failed: {e}")
+        except (requests.RequestException, ValueError) as e:
+            self.logger.error(f"   ❌ Creation failed: {e}")
             return False
 
     def wait_for_instance(self, timeout: int = 300) -> bool:
-        """Wait for instance to be ready and SSH to be available."""
-        print(f"\n⏳ Waiting for instance to be ready (timeout: {timeout}s)...")
-        self.logger.info(f"Waiting for instance {self.instance_id} to be ready (timeout: {timeout}s)")
+        """
+        Wait for instance to be ready and SSH to be available.
+
+        Two phases: poll the vast.ai API at a slow cadence until the instance is
+        running, then probe SSH every second until sshd accepts connections.
+        """
+        self.logger.info(f"\n⏳ Waiting for instance {self.instance_id} to be ready (timeout: {timeout}s)...")
+
+        deadline = time.time() + timeout
+        if self._wait_until_running(deadline) and self._wait_until_ssh(deadline):
+            self.open_ssh_master()
+            return True
+
+        self.logger.error(f"\n   ❌ Timeout waiting for instance after {timeout}s")
+        return False
 
+    def _wait_until_running(self, deadline: float, max_poll_interval: float = 30.0) -> bool:
+        """
+        Poll the vast.ai API (no SSH) until the instance is running and has SSH details.
+
+        Polls start at ~1s and back off exponentially (x1.5, capped at
+        max_poll_interval): fast hosts are detected within seconds, slow
+        ones aren't hammered. The first poll is jittered.
+        """
         start_time = time.time()
-        ssh_ready = False
+        last_status = None
+        poll_interval = 1.0
+        time.sleep(random.uniform(0, poll_interval))
 
-        while time.time() - start_time < timeout:
+        while time.time() < deadline:
             try:
-                result = subprocess.run(
-                    ["vastai", "show", "instance", str(self.instance_id), "--raw"],
-                    capture_output=True, text=True, check=True
-                )
-
-                instance = json.loads(result.stdout)
+                # Short timeout: a slow poll is better retried than waited on
+                data = self._api("GET", f"/instances/{self.instance_id}/", timeout=5)
+                instance = data.get('instances', data)
                 status = instance.get('actual_status', 'unknown')
 
-                print(f"   Status: {status}", end='\r')
-                elapsed = int(time.time() - start_time)
-                self.logger.debug(f"Instance status: {status} (elapsed: {elapsed}s)")
+                # Report transitions only, not every poll
+                if status != last_status:
+                    self.logger.info(f"   Status: {status} (elapsed: {int(time.time() - start_time)}s)")
+                    last_status = status
 
-                if status == 'running' and not ssh_ready:
+                if status == 'running':
                     # Get SSH details - vast.ai uses SSH gateway
                     self.ssh_host = instance.get('ssh_host', 'ssh2.vast.ai')  # Gateway host
                     self.ssh_port = instance.get('ssh_port')  # Port on gateway
 
                     if self.ssh_host and self.ssh_port:
-                        print(f"\n   Instance running: {self.ssh_host}:{self.ssh_port}")
-                        print(f"   Testing SSH connectivity...")
-                        self.logger.info(f"Instance running, testing SSH: {self.ssh_host}:{self.ssh_port}")
-
-                        # Test SSH connectivity
-                        ssh_target = f"root@{self.ssh_host}"
-                        ssh_opts = f"-p {self.ssh_port} -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null -o ConnectTimeout=10"
-
-                        try:
-                            subprocess.run(
-                                f"ssh {ssh_opts} {ssh_target} 'echo SSH_OK'",
-                                shell=True, check=True, capture_output=True, timeout=15
-                            )
-                            print(f"   ✅ SSH ready!")
-                            self.logger.info(f"SSH connectivity confirmed: {self.ssh_host}:{self.ssh_port}")
-                            return True
-                        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as ssh_error:
-                            print(f"   SSH not ready yet, waiting...", end='\r')
-                            self.logger.debug(f"SSH test failed (will retry): {ssh_error}")
-                            ssh_ready = False
-
-                time.sleep(5)
-
-            except (subprocess.CalledProcessError, json.JSONDecodeError) as e:
-                print(f"\n   ❌ Status check failed: {e}")
-                self.logger.warning(f"Status check failed: {e}")
-                time.sleep(5)
-                continue
-
-        print(f"\n   ❌ Timeout waiting for instance")
-        self.logger.error(f"Timeout waiting for instance after {timeout}s")
+                        self.logger.info(f"   Instance running: {self.ssh_host}:{self.ssh_port}\n"
+                                         f"   Testing SSH connectivity...")
+                        return True
+
+            except (requests.RequestException, ValueError) as e:
+                self.logger.warning(f"   ❌ Status check failed: {e}")
+
+            time.sleep(max(0.0, min(poll_interval, deadline - time.time())))
+            poll_interval = min(poll_interval * 1.5, max_poll_interval)
+
+        return False
+
+    def _wait_until_ssh(self, deadline: float, poll_interval: int = 1) -> bool:
+        """
+        Probe SSH in a tight loop until sshd accepts a connection.
+
+        The probe runs with ControlMaster=auto, so the first connection that
+        succeeds persists as the master instead of being torn down and redone.
+        """
+        ssh_cmd = self._ssh_cmd("true", extra_opts=["-o", "ConnectTimeout=2", "-o", "BatchMode=yes",
+                                                    "-o", "ControlMaster=auto", "-o", "ControlPersist=10m"])
+
+        attempts = 0
+        while time.time() < deadline:
+            try:
+                attempts += 1
+                # stdio not captured: a persisted master would hold the pipes open
+                subprocess.run(ssh_cmd, check=True, timeout=5, stdin=subprocess.DEVNULL,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                self.logger.info(f"   ✅ SSH ready!")
+                return True
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as ssh_error:
+                if attempts == 1:
+                    self.logger.info(f"   SSH not ready yet, waiting...")
+                    self.logger.debug(f"SSH test failed (will retry): {ssh_error}")
+                time.sleep(poll_interval)
+
         return False
 
+    def compress_inputs(self) -> List[Path]:
+        """
+        Compress the input JSONL files for upload (see UPLOAD_CODECS), reusing cached copies.
+
+        A cached archive is rebuilt only when its JSONL is newer.
+
+        Returns:
+            Paths of the compressed inputs
+        """
+        self.upload_cache_dir.mkdir(exist_ok=True, parents=True)
+        archive_paths = []
+
+        for jsonl_path in [self.code_travail_jsonl, self.kali_jsonl]:
+            archive_path = self.upload_cache_dir / f"{jsonl_path.name}{self.upload_suffix}"
+            archive_stat = self._stat(archive_path)
+            if archive_stat is not None and archive_stat.st_mtime >= self._stat(jsonl_path).st_mtime:
+                self.logger.debug(f"Reusing cached {archive_path.name}")
+            else:
+                self.logger.info(f"   Compressing {jsonl_path.name} for upload")
+                tmp_path = archive_path.with_name(archive_path.name + ".tmp")
+                with open(tmp_path, 'wb') as out:
+                    subprocess.run([*UPLOAD_CODECS[self.upload_suffix], str(jsonl_path)], stdout=out, check=True)
+                tmp_path.replace(archive_path)
+                self._file_stats[archive_path] = archive_path.stat()
+            archive_paths.append(archive_path)
+
+        return archive_paths
+
     def upload_files(self) -> bool:
-        """Upload JSONL files and embedding script to instance."""
-        print(f"\n📤 Uploading files...")
-        self.logger.info(f"Starting file uploads to {self.ssh_host}:{self.ssh_port}")
+        """Upload JSONL files and embedding script to instance with concurrent resumable rsyncs."""
+        self.logger.info(f"\n📤 Uploading files to {self.ssh_host}:{self.ssh_port}...")
 
         ssh_target = f"root@{self.ssh_host}"
-        # Note: ssh uses -p (lowercase), scp uses -P (uppercase)
-        ssh_opts = f"-p {self.ssh_port} -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null"
-        scp_opts = f"-P {self.ssh_port} -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null"
 
-        # Create remote directories
+        # rsync must run on both ends, and zstd must be there to decompress .zst
+        # inputs; CUDA images don't always ship them. The check (and apt install,
+        # if needed) runs while any stale input is compressed.
+        tools = "rsync zstd" if self.upload_suffix == ".zst" else "rsync"
+        rsync_check = self._start_remote_script(
+            f"missing=; for tool in {tools}; do command -v $tool >/dev/null || missing=\"$missing $tool\"; done\n"
+            f"[ -z \"$missing\" ] || (apt-get update -qq && apt-get install -y -qq $missing)",
+            stderr=subprocess.PIPE
+        )
+
         try:
-            self.logger.debug("Creating remote directories")
-            subprocess.run(
-                f"ssh {ssh_opts} {ssh_target} 'mkdir -p /workspace/data/processed /workspace/scripts'",
-                shell=True, check=True, capture_output=True
-            )
-        except subprocess.CalledProcessError as e:
-            print(f"   ❌ Failed to create directories: {e.stderr.decode()}")
-            self.logger.error(f"Failed to create remote directories: {e.stderr.decode()}")
+            archive_paths = self.compress_inputs()
+        except (subprocess.CalledProcessError, OSError) as e:
+            self.logger.error(f"   ❌ Failed to compress inputs: {e}")
+            rsync_check.kill()
             return False
 
-        # Upload files
-        embed_script = self.project_root / "scripts" / "embed_chunks.py"
-        files = [
-            (self.code_travail_jsonl, "/workspace/data/processed/", "code_travail_chunks.jsonl"),
-            (self.kali_jsonl, "/workspace/data/processed/", "kali_chunks.jsonl"),
-            (embed_script, "/workspace/scripts/", "embed_chunks.py")
-        ]
+        # Paths relative to project root, recreated as-is under /workspace
+        files = [*archive_paths, self.embed_script, *self.shared_modules, self.remote_script]
+        relative_paths = [str(path.relative_to(self.project_root)) for path in files]
 
-        for local_path, remote_dir, filename in files:
-            print(f"   Uploading {filename}...")
-            size_mb = local_path.stat().st_size / 1024 / 1024
-            self.logger.info(f"Uploading {filename} ({size_mb:.1f}MB)")
+        total_mb = 0.0
+        for path, relative_path in zip(files, relative_paths):
+            size_mb = self._stat(path).st_size / 1024 / 1024
+            total_mb += size_mb
+            self.logger.info(f"   Uploading {relative_path} ({size_mb:.1f}MB)")
 
-            start_time = time.time()
+        _, rsync_check_error = rsync_check.communicate()
+        if rsync_check.returncode != 0:
+            self.logger.error(f"   ❌ Could not install {tools} on the instance: {rsync_check_error.strip()}")
+            return False
+
+        # One rsync per file, run concurrently; --relative recreates the paths
+        # under /workspace. The JSONL is already compressed (cached locally), so
+        # the stream itself is not compressed. On keep_alive re-runs the delta
+        # algorithm only sends what changed (--rsyncable keeps JSONL edits
+        # local in the archive); --inplace patches the remote files directly.
+        def upload_one(path: Path, relative_path: str) -> str:
+            # The compressed inputs get their own TCP connection each (a single
+            # stream is window-limited on high-RTT links); the scripts ride the master
+            return self._rsync([relative_path], f"{ssh_target}:/workspace/", cwd=self.project_root,
+                               multiplex=path not in archive_paths,
+                               extra_args=["--relative", "--inplace", "--itemize-changes"])
+
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=len(files)) as executor:
+            futures = [executor.submit(upload_one, path, relative_path)
+                       for path, relative_path in zip(files, relative_paths)]
             try:
-                subprocess.run(
-                    f"scp {scp_opts} {local_path} {ssh_target}:{remote_dir}",
-                    shell=True, check=True, capture_output=True
-                )
-                elapsed = time.time() - start_time
-                speed_mbps = (size_mb * 8) / elapsed if elapsed > 0 else 0
-                print(f"   ✅ {filename} uploaded ({elapsed:.1f}s, ~{speed_mbps:.0f} Mbps)")
-                self.logger.info(f"{filename} uploaded: {elapsed:.1f}s, ~{speed_mbps:.0f} Mbps")
+                changes = "".join(future.result() for future in as_completed(futures))
             except subprocess.CalledProcessError as e:
-                print(f"   ❌ Upload failed: {e.stderr.decode()}")
-                self.logger.error(f"Upload failed for {filename}: {e.stderr.decode()}")
+                for future in futures:
+                    future.cancel()
+                error = (e.stderr or "").strip() or f"rsync exited with {e.returncode}"
+                self.logger.error(f"   ❌ Upload failed: {error}")
                 return False
+        self.logger.debug(f"rsync changes:\n{changes.strip() or '(none, all files up to date)'}")
 
-        self.logger.info("All files uploaded successfully")
+        elapsed = time.time() - start_time
+        speed_mbps = (total_mb * 8) / elapsed if elapsed > 0 else 0
+        self.logger.info(f"   ✅ {len(files)} files uploaded ({total_mb:.1f}MB, {elapsed:.1f}s, ~{speed_mbps:.0f} Mbps)")
         return True
 
-    def run_ingestion(self) -> bool:
-        """Run embedding generation on remote instance."""
-        print(f"\n🔮 Generating embeddings on vast.ai instance...")
-        self.logger.info("Starting remote embedding generation")
+    @staticmethod
+    def _remote_script_input(script: str) -> str:
+        """stdin for `ssh ... bash -s`: the script, stopping at the first failing step."""
+        return f"set -e\n{script}\n"
 
-        ssh_target = f"root@{self.ssh_host}"
-        ssh_opts = f"-p {self.ssh_port} -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null"
+    def _start_remote_script(self, script: str, stderr: int) -> subprocess.Popen:
+        """
+        Start a remote script in the background (stdout piped); collect it with communicate().
 
-        commands = [
-            # Upgrade PyTorch and install dependencies (fix compatibility)
-            "pip install -q --upgrade torch torchvision torchaudio",
-            "pip install -q sentence-transformers tqdm",
+        stdin is left open after the script is written: communicate() closes it.
+        """
+        process = subprocess.Popen(
+            self._ssh_cmd("bash -s"),
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr, text=True
+        )
+        process.stdin.write(self._remote_script_input(script))
+        process.stdin.flush()
+        return process
+
+    def start_remote_setup(self) -> None:
+        """
+        Start installing remote dependencies in the background (overlaps with upload).
+
+        BGE-M3 is fetched into HF_HOME concurrently with the pip install: both
+        are network-bound and independent. The model comes from model_cache_url
+        if set, else from the Hub through a huggingface_hub installed apart
+        (--target) so it doesn't race the main install. A failed prefetch is
+        not fatal: embed_chunks.py downloads whatever is missing.
+        """
+        if self.model_cache_url:
+            fetch_model = f"curl -sSL {shlex.quote(self.model_cache_url)} | tar -xzf - -C \"$HF_HOME\""
+        else:
+            fetch_model = (
+                "pip install -q --target /tmp/hf_hub huggingface_hub && PYTHONPATH=/tmp/hf_hub python -c "
+                "\"from huggingface_hub import snapshot_download; "
+                "snapshot_download('BAAI/bge-m3', ignore_patterns=['onnx/*', 'imgs/*'])\""
+            )
+        script = "\n".join([
+            f"export HF_HOME={REMOTE_HF_HOME}",
+            'mkdir -p "$HF_HOME"',
+            'MODEL_PID=""',
+            f'[ -d "$HF_HOME/hub/models--BAAI--bge-m3" ] || {{ ({fetch_model}) & MODEL_PID=$!; }}',
+            # Upgrade PyTorch and install dependencies (fix compatibility) in one
+            # pip invocation so the resolver runs once
+            "pip install -q --upgrade torch torchvision torchaudio sentence-transformers tqdm orjson",
+            'if [ -n "$MODEL_PID" ]; then wait "$MODEL_PID" || echo "BGE-M3 prefetch failed, will download on first use"; fi',
+        ])
+        self.logger.info("   Installing remote dependencies and fetching BGE-M3 in the background")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"Remote setup script:\n{script}")
+
+        self.setup_process = self._start_remote_script(script, stderr=subprocess.STDOUT)
+
+    def wait_remote_setup(self) -> bool:
+        """Wait for the background dependency install to finish."""
+        if self.setup_process is None:
+            self.start_remote_setup()
+
+        self.logger.info(f"   Waiting for remote dependencies...")
+        output, _ = self.setup_process.communicate()
+        if self.setup_process.returncode != 0:
+            self.logger.error(f"   ❌ Remote dependency install failed:\n{output}")
+            return False
 
-            # Run embedding script
-            "cd /workspace && python scripts/embed_chunks.py",
+        self.logger.info(f"   ✅ Remote dependencies installed")
+        return True
 
-            # Compress output files
-            "gzip data/processed/code_travail_chunks.jsonl",
-            "gzip data/processed/kali_chunks.jsonl",
-        ]
+    def run_ingestion(self) -> bool:
+        """Run embedding generation on remote instance."""
+        self.logger.info(f"\n🔮 Generating embeddings on vast.ai instance...")
+
+        # Remote dependencies were installed in the background during upload
+        if not self.wait_remote_setup():
+            return False
 
-        full_command = " && ".join(commands)
-        self.logger.debug(f"Remote command: {full_command}")
+        # The steps live in scripts/remote_ingest.sh (uploaded with the inputs);
+        # its output is shown live and kept in a remote log for post-mortems
+        env = f"HF_HOME={REMOTE_HF_HOME}"
+        if self.model_cache_url:
+            env += f" MODEL_CACHE_URL={shlex.quote(self.model_cache_url)}"
+        remote_command = (f"set -o pipefail; {env} bash /workspace/scripts/remote_ingest.sh 2>&1 "
+                          f"| tee {REMOTE_INGEST_LOG}")
 
         try:
-            print("   This will take ~15-20 minutes (downloading model + embedding)...")
-            self.logger.info("Running embedding generation (this will take 15-20 minutes)")
+            self.logger.info("   This will take ~15-20 minutes (downloading model + embedding)...")
 
             start_time = time.time()
-            result = subprocess.run(
-                f"ssh {ssh_opts} {ssh_target} '{full_command}'",
-                shell=True, check=True, text=True, capture_output=False  # Show output
-            )
+            subprocess.run(self._ssh_cmd(remote_command), check=True)  # Output not captured: shown live
             elapsed = time.time() - start_time
 
-            print(f"\n   ✅ Embedding generation completed successfully")
-            self.logger.info(f"Embedding generation completed successfully in {elapsed/60:.1f} minutes")
+            self.logger.info(f"\n   ✅ Embedding generation completed successfully in {elapsed/60:.1f} minutes")
             return True
 
         except subprocess.CalledProcessError as e:
-            print(f"\n   ❌ Embedding generation failed")
-            self.logger.error(f"Embedding generation failed: {e}")
+            self.logger.error(f"\n   ❌ Embedding generation failed: {e}")
+            self.fetch_remote_log()
             return False
 
+    def fetch_remote_log(self) -> None:
+        """Download the remote ingestion log into logs/ after a failed run."""
+        local_log = self.project_root / "logs" / f"remote_ingest_{self.instance_id}.log"
+        try:
+            self._rsync([f"root@{self.ssh_host}:{REMOTE_INGEST_LOG}"], str(local_log))
+            self.logger.info(f"   Remote log saved to: {local_log}")
+        except subprocess.CalledProcessError as e:
+            self.logger.warning(f"   Could not fetch remote log: {(e.stderr or '').strip()}")
+
     def download_results(self) -> bool:
-        """Download embedded JSONL files from instance."""
-        print(f"\n📥 Downloading embedded JSONL files...")
-        self.logger.info(f"Downloading embedded JSONL files")
+        """Download chunk JSONL files and embedding sidecars from instance."""
+        self.logger.info(f"\n📥 Downloading chunk JSONL and embedding files...")
 
         ssh_target = f"root@{self.ssh_host}"
-        # Note: scp uses -P (uppercase) for port
-        scp_opts = f"-P {self.ssh_port} -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null"
 
         # Download directory
         download_dir = self.project_root / "data" / "processed"
@@ -424,71 +758,102 @@ class VastAIIngestion:
 
         files_to_download = [
             "code_travail_chunks.jsonl.gz",
-            "kali_chunks.jsonl.gz"
+            "kali_chunks.jsonl.gz",
+            "code_travail_embeddings.f16.npy",
+            "kali_embeddings.f16.npy",
+            # Row hashes + model signature, so a later local run can reuse unchanged rows
+            "code_travail_embeddings.hashes.npy",
+            "kali_embeddings.hashes.npy",
+            "code_travail_embeddings.meta.json",
+            "kali_embeddings.meta.json"
         ]
 
+        def report(filename: str, start_time: float) -> None:
+            elapsed = time.time() - start_time
+            # Get file size for speed calculation
+            local_file = download_dir / filename
+            size_mb = local_file.stat().st_size / 1024 / 1024
+            speed_mbps = (size_mb * 8) / elapsed if elapsed > 0 else 0
+
+            self.logger.info(f"   ✅ {filename} downloaded ({size_mb:.1f}MB, {elapsed:.1f}s, ~{speed_mbps:.0f} Mbps)")
+
+        def download_one(filename: str) -> None:
+            self.logger.info(f"   Downloading {filename}...")
+            start_time = time.time()
+
+            # Not multiplexed: parallel downloads need their own TCP connections to add throughput
+            self._rsync([f"{ssh_target}:/workspace/data/processed/{filename}"], f"{download_dir}/", multiplex=False)
+            report(filename, start_time)
+
+        if asyncssh is not None:
+            try:
+                self._download_sftp(files_to_download, download_dir, report)
+                self.logger.info(f"\n   📦 Files saved to: {download_dir}/")
+                return True
+            except (asyncssh.Error, OSError) as e:
+                # rsync picks up from whatever the SFTP session left behind
+                self.logger.warning(f"   SFTP download failed ({e}), falling back to rsync")
+
         try:
-            for filename in files_to_download:
-                print(f"   Downloading {filename}...")
-                start_time = time.time()
-
-                subprocess.run(
-                    f"scp {scp_opts} {ssh_target}:/workspace/data/processed/{filename} {download_dir}/",
-                    shell=True, check=True
-                )
-
-                elapsed = time.time() - start_time
-                # Get file size for speed calculation
-                local_file = download_dir / filename
-                size_mb = local_file.stat().st_size / 1024 / 1024
-                speed_mbps = (size_mb * 8) / elapsed if elapsed > 0 else 0
-
-                print(f"   ✅ {filename} downloaded ({size_mb:.1f}MB, {elapsed:.1f}s, ~{speed_mbps:.0f} Mbps)")
-                self.logger.info(f"{filename} downloaded: {size_mb:.1f}MB, {elapsed:.1f}s, ~{speed_mbps:.0f} Mbps")
-
-            print(f"\n   📦 Files saved to: {download_dir}/")
-            print(f"   Next steps:")
-            print(f"     1. Decompress: gunzip {download_dir}/*.jsonl.gz")
-            print(f"     2. Index locally: make ingest-only")
-            self.logger.info("All files downloaded successfully")
+            # One stream per file: a single SSH stream is window-limited on high-RTT links
+            with ThreadPoolExecutor(max_workers=len(files_to_download)) as executor:
+                list(executor.map(download_one, files_to_download))
+
+            self.logger.info(f"\n   📦 Files saved to: {download_dir}/")
             return True
 
         except subprocess.CalledProcessError as e:
-            print(f"   ❌ Download failed: {e}")
-            self.logger.error(f"Download failed: {e}")
+            self.logger.error(f"   ❌ Download failed: {e}")
             return False
 
+    def _download_sftp(self, filenames: List[str], download_dir: Path,
+                       report: Callable[[str, float], None]) -> None:
+        """
+        Download files over a single asyncssh SFTP session.
+
+        All transfers share one connection; asyncssh keeps many read requests
+        in flight per file, which fills high-RTT links without opening one
+        TCP connection per file.
+
+        Raises:
+            asyncssh.Error, OSError: If the connection or a transfer fails
+        """
+        async def download_all() -> None:
+            async with asyncssh.connect(self.ssh_host, port=self.ssh_port, username="root",
+                                        known_hosts=None) as conn:
+                async with conn.start_sftp_client() as sftp:
+                    async def download_one(filename: str) -> None:
+                        self.logger.info(f"   Downloading {filename} (SFTP)...")
+                        start_time = time.time()
+                        await sftp.get(f"/workspace/data/processed/{filename}", download_dir / filename)
+                        report(filename, start_time)
+
+                    await asyncio.gather(*(download_one(filename) for filename in filenames))
+
+        asyncio.run(download_all())
+
     def destroy_instance(self) -> bool:
         """Destroy the instance."""
         if not self.instance_id:
             return True
 
-        print(f"\n🗑️  Destroying instance {self.instance_id}...")
-        self.logger.info(f"Destroying instance {self.instance_id}")
+        self.logger.info(f"\n🗑️  Destroying instance {self.instance_id}...")
+        self.close_ssh_master()
 
         try:
-            subprocess.run(
-                ["vastai", "destroy", "instance", str(self.instance_id)],
-                check=True, capture_output=True
-            )
-            print(f"   ✅ Instance destroyed")
-            self.logger.info(f"Instance {self.instance_id} destroyed successfully")
+            self._api("DELETE", f"/instances/{self.instance_id}/")
+            self.instance_state_path.unlink(missing_ok=True)
+            self.logger.info(f"   ✅ Instance destroyed")
             return True
 
-        except subprocess.CalledProcessError as e:
-            print(f"   ❌ Destruction failed: {e.stderr.decode()}")
-            self.logger.error(f"Instance destruction failed: {e.stderr.decode()}")
+        except requests.RequestException as e:
+            self.logger.error(f"   ❌ Destruction failed: {e}")
             return False
 
     def run(self) -> bool:
         """Run the complete workflow."""
-        print("="*80)
-        print("Vast.ai Automated Ingestion")
-        print("="*80)
-
-        self.logger.info("="*60)
-        self.logger.info("Starting Vast.ai Automated Ingestion")
-        self.logger.info("="*60)
+        self.logger.info("="*80 + "\nVast.ai Automated Ingestion\n" + "="*80)
+        self._clear_stale_instance_state()
 
         try:
             # Prerequisites
@@ -501,14 +866,28 @@ class VastAIIngestion:
                 return False
 
             if not self.create_instance(offer_id):
-                return False
-
-            # Wait for ready
-            if not self.wait_for_instance():
+                if not self.offers_from_cache:
+                    return False
+                # The cached offer may have been rented since: search afresh and retry once
+                self.logger.info("   Cached offer unavailable, refreshing offers")
+                OFFERS_CACHE_PATH.unlink(missing_ok=True)
+                offer_id = self.search_instances()
+                if not offer_id or not self.create_instance(offer_id):
+                    return False
+
+            # Wait for ready, compressing the inputs locally meanwhile (upload_files
+            # then finds them cached, or retries and reports the error)
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                executor.submit(self.compress_inputs)
+                ready = self.wait_for_instance()
+            if not ready:
                 if not self.keep_alive:
                     self.destroy_instance()
                 return False
 
+            # Install remote dependencies while the files upload
+            self.start_remote_setup()
+
             # Upload files
             if not self.upload_files():
                 if not self.keep_alive:
@@ -529,63 +908,91 @@ class VastAIIngestion:
 
             # Cleanup
             if self.keep_alive:
-                print("\n" + "="*80)
-                print("⚠️  Instance kept alive for testing")
-                print("="*80)
-                print(f"Instance ID: {self.instance_id}")
-                print(f"SSH: ssh -p {self.ssh_port} root@{self.ssh_host}")
-                print(f"\n⚠️  REMEMBER TO DESTROY MANUALLY:")
-                print(f"  vastai destroy instance {self.instance_id}")
-                self.logger.warning(f"Instance {self.instance_id} kept alive - destroy manually!")
+                self.logger.warning("\n" + "="*80 + "\n⚠️  Instance kept alive for testing\n" + "="*80 + "\n"
+                                    f"Instance ID: {self.instance_id}\n"
+                                    f"SSH: ssh -p {self.ssh_port} root@{self.ssh_host}\n"
+                                    f"\n⚠️  REMEMBER TO DESTROY MANUALLY:\n"
+                                    f"  vastai destroy instance {self.instance_id}")
             else:
                 self.destroy_instance()
 
             # Success!
-            print("\n" + "="*80)
-            print("✅ SUCCESS!")
-            print("="*80)
-            print(f"Files downloaded to: data/processed/*.jsonl.gz")
-            print(f"\nNext steps:")
-            print(f"  1. Decompress: gunzip data/processed/*.jsonl.gz")
-            print(f"  2. Index locally: make ingest-only")
-
-            self.logger.info("="*60)
-            self.logger.info("Ingestion workflow completed successfully!")
-            self.logger.info("="*60)
+            self.logger.info("\n" + "="*80 + "\n✅ SUCCESS!\n" + "="*80 + "\n"
+                             "Files downloaded to: data/processed/ (*.jsonl.gz, *_embeddings.f16.npy)\n"
+                             "\nNext steps:\n"
+                             "  1. Decompress: gunzip -f data/processed/*.jsonl.gz\n"
+                             "  2. Index locally: make ingest-only")
 
             return True
 
         except KeyboardInterrupt:
-            print("\n\n⚠️  Interrupted by user")
-            self.logger.warning("Workflow interrupted by user")
-            if self.instance_id and not self.keep_alive:
-                print("Cleaning up...")
-                self.destroy_instance()
-            elif self.instance_id and self.keep_alive:
-                print(f"\n⚠️  Instance {self.instance_id} kept alive")
-                print(f"Destroy manually: vastai destroy instance {self.instance_id}")
+            self.logger.warning("\n\n⚠️  Interrupted by user")
+            self._cleanup_after_failure()
             return False
         except Exception as e:
-            print(f"\n❌ Unexpected error: {e}")
-            self.logger.exception(f"Unexpected error: {e}")
-            if self.instance_id and not self.keep_alive:
-                print("Cleaning up...")
-                self.destroy_instance()
-            elif self.instance_id and self.keep_alive:
-                print(f"\n⚠️  Instance {self.instance_id} kept alive")
-                print(f"Destroy manually: vastai destroy instance {self.instance_id}")
+            self.logger.exception(f"\n❌ Unexpected error: {e}")
+            self._cleanup_after_failure()
             return False
+        finally:
+            if self.keep_alive:
+                # The kept instance is reported in the log; a later run must not destroy it
+                self.instance_state_path.unlink(missing_ok=True)
+
+    def _clear_stale_instance_state(self) -> None:
+        """Drop the instance ID left by an earlier run, so it can never be destroyed by this one."""
+        try:
+            stale_id = orjson.loads(self.instance_state_path.read_bytes())["instance_id"]
+        except (OSError, ValueError, KeyError):
+            return
+        self.logger.warning(f"⚠️  {self.instance_state_path.name} from an earlier run names instance {stale_id}; "
+                            f"if it is still running, destroy it manually: vastai destroy instance {stale_id}")
+        self.instance_state_path.unlink(missing_ok=True)
+
+    def _cleanup_after_failure(self) -> None:
+        """Destroy the instance after an aborted run, unless keep_alive is set."""
+        if not self.instance_id and self.create_requested:
+            # Interrupted while the create request was in flight: the state file
+            # (cleared at the start of the run) can only hold this run's instance
+            try:
+                self.instance_id = orjson.loads(self.instance_state_path.read_bytes())["instance_id"]
+            except (OSError, ValueError, KeyError):
+                pass
+        if self.instance_id and not self.keep_alive:
+            self.logger.info("Cleaning up...")
+            self.destroy_instance()
+        elif self.instance_id and self.keep_alive:
+            self.logger.warning(f"\n⚠️  Instance {self.instance_id} kept alive\n"
+                                f"Destroy manually: vastai destroy instance {self.instance_id}")
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Generate BGE-M3 embeddings on a vast.ai GPU instance")
+    parser.add_argument("--force-check", action="store_true",
+                        help="Re-validate the vast.ai API key even if it was checked in the last 24h")
+    parser.add_argument("--refresh-offers", action="store_true",
+                        help=f"Search vast.ai offers even if a search was cached in the last {OFFERS_CACHE_TTL}s")
+    return parser.parse_args()
 
 
 def main():
     """Main entry point."""
+    args = parse_args()
+    if args.force_check:
+        PREREQ_SENTINEL_PATH.unlink(missing_ok=True)
+    if args.refresh_offers:
+        OFFERS_CACHE_PATH.unlink(missing_ok=True)
+
     ingestion = VastAIIngestion(
         max_price=0.50,           # Max $/hour
-        min_gpu_ram=24,           # Minimum 24GB VRAM for BGE-M3 with batch processing
+        min_gpu_ram=12,           # BGE-M3 in BF16 fits 12GB VRAM with batch processing
         disk_size=30,             # GB
         min_download_speed=100,   # Mbps (for downloading BGE-M3 model ~2.7GB)
         min_upload_speed=50,      # Mbps (for uploading results ~50-70MB)
-        keep_alive=True           # Keep instance running for testing (destroy manually)
+        keep_alive=True,          # Keep instance running for testing (destroy manually)
+        # Optional tarball of the local HF cache, built with:
+        #   tar -C ~/.cache/huggingface -czf bge-m3.tar.gz hub/models--BAAI--bge-m3
+        model_cache_url=os.environ.get("MODEL_CACHE_URL")
     )
 
     success = ingestion.run()
@@ -1,5 +1,6 @@
 import time
 import os
+import onnxruntime
 from huggingface_hub import snapshot_download
 from optimum.onnxruntime import ORTModelForCustomTasks
 
@@ -7,6 +8,15 @@ from optimum.onnxruntime import ORTModelForCustomTasks
 MODEL_PATH = "./model"
 MODEL_REPO = "gpahal/bge-m3-onnx-int8"
 MODEL_FILENAME = "model_quantized.onnx"
+OPTIMIZED_MODEL_FILENAME = "model_quantized.opt.onnx"  # from scripts/optimize_onnx_model.py
+
+def session_options():
+    """CPU session options shared by both loads, so only `file_name` differs."""
+    so = onnxruntime.SessionOptions()
+    so.intra_op_num_threads = os.cpu_count() or 1
+    so.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    so.enable_mem_pattern = True
+    return so
 
 def setup_local_model():
     """Download model if it doesn't exist locally."""
@@ -19,28 +29,33 @@ def setup_local_model():
 def test_loading_without_filename():
     """Test model loading performance WITHOUT the file_name parameter."""
     print(f"\n--- Testing: Loading from '{MODEL_PATH}' WITHOUT `file_name` ---")
-    start_time = time.time()
+    start_time = time.perf_counter()
     try:
-        model = ORTModelForCustomTasks.from_pretrained(MODEL_PATH)
-        end_time = time.time()
+        model = ORTModelForCustomTasks.from_pretrained(
+            MODEL_PATH, provider="CPUExecutionProvider", session_options=session_options()
+        )
+        end_time = time.perf_counter()
         print(f"✅ Success! Time taken: {end_time - start_time:.2f} seconds")
         return model is not None
     except Exception as e:
-        end_time = time.time()
+        end_time = time.perf_counter()
         print(f"❌ Failed after {end_time - start_time:.2f} seconds. Error: {e}")
         return False
 
-def test_loading_with_filename():
+def test_loading_with_filename(file_name=MODEL_FILENAME):
     """Test model loading performance WITH the file_name parameter."""
-    print(f"\n--- Testing: Loading from '{MODEL_PATH}' WITH `file_name='{MODEL_FILENAME}'` ---")
-    start_time = time.time()
+    print(f"\n--- Testing: Loading from '{MODEL_PATH}' WITH `file_name='{file_name}'` ---")
+    start_time = time.perf_counter()
     try:
-        model = ORTModelForCustomTasks.from_pretrained(MODEL_PATH, file_name=MODEL_FILENAME)
-        end_time = time.time()
+        model = ORTModelForCustomTasks.from_pretrained(
+            MODEL_PATH, file_name=file_name,
+            provider="CPUExecutionProvider", session_options=session_options()
+        )
+        end_time = time.perf_counter()
         print(f"✅ Success! Time taken: {end_time - start_time:.2f} seconds")
         return model is not None
     except Exception as e:
-        end_time = time.time()
+        end_time = time.perf_counter()
         print(f"❌ Failed after {end_time - start_time:.2f} seconds. Error: {e}")
         return False
 
@@ -58,6 +73,12 @@ if __name__ == "__main__":
     # Run the test with the explicit filename
     test_loading_with_filename()
 
+    # Run the test on the pre-optimized graph, if it was built
+    if os.path.exists(os.path.join(MODEL_PATH, OPTIMIZED_MODEL_FILENAME)):
+        test_loading_with_filename(OPTIMIZED_MODEL_FILENAME)
+    else:
+        print(f"\n(No {OPTIMIZED_MODEL_FILENAME}: run scripts/optimize_onnx_model.py {MODEL_PATH} to compare)")
+
     print("\n---")
     print("Conclusion: This test measures the time taken by `from_pretrained`.")
     print("A significant difference in time would confirm that providing the `file_name`")
@@ -0,0 +1,186 @@
+"""
+Semantic cache of generated answers, keyed on query embeddings.
+
+Near-duplicate questions ("durée du préavis" / "quelle durée de préavis")
+reuse a stored answer instead of a new LLM generation.
+"""
+
+import hashlib
+import logging
+import os
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+
+import numpy as np
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# (strategy, idcc): Syntec and general-law answers to the same question must not collide
+Namespace = Tuple[str, Optional[str]]
+
+# Unit vectors are stored as int8 (x * 127): 4x smaller than float32, and the
+# dot product of two quantized vectors times 1/127² approximates their cosine
+INT8_SCALE = 127
+
+
+def source_key(result: Dict) -> str:
+    """Stable identity of a retrieved result, to re-resolve citations on a cache hit."""
+    return hashlib.sha1(f"{result['_collection']}\0{result['content']}".encode()).hexdigest()
+
+
+class _Shard:
+    """Quantized unit embeddings (one row per entry) of one namespace, with LRU ticks."""
+
+    def __init__(self, dim: int, capacity: int):
+        self.embeddings = np.zeros((capacity, dim), dtype=np.int8)
+        self.last_used = np.zeros(capacity, dtype=np.int64)
+        self.answers: List[BaseModel] = []
+        self.sources: List[List[str]] = []  # source_key of each cited result
+
+    def __len__(self) -> int:
+        return len(self.answers)
+
+
+class SemanticAnswerCache:
+    """
+    Answers keyed on query embedding, looked up by cosine similarity.
+
+    Answers are pydantic models with a `citation_indices` field (indices into
+    the results they were generated from). Each namespace holds up to
+    max_entries rows; when full, the least recently used row is overwritten.
+    """
+
+    def __init__(self, answer_model: Type[BaseModel], threshold: float = 0.92, max_entries: int = 1024):
+        self.answer_model = answer_model
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._shards: Dict[Namespace, _Shard] = {}
+        self._tick = 0
+
+    @staticmethod
+    def _quantize(embedding: Sequence[float]) -> np.ndarray:
+        """L2-normalize, then scale to int8."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+        return np.round(vector * INT8_SCALE).astype(np.int8)
+
+    def get(self, namespace: Namespace, embedding: Sequence[float],
+            results: List[Dict]) -> Optional[BaseModel]:
+        """
+        Cached answer for a similar query, with citations remapped onto `results`.
+
+        Returns None on a miss, or when a cited source is not among the
+        current results (the stored answer no longer matches what is shown).
+        """
+        shard = self._shards.get(namespace)
+        if not shard:
+            return None
+
+        # Exact scan: a shard holds at most max_entries rows, so this stays well
+        # under a millisecond. einsum accumulates in int32 (a 1024-dim int8 dot
+        # product overflows int16) without copying the matrix to int32 first
+        dots = np.einsum("ij,j->i", shard.embeddings[:len(shard)], self._quantize(embedding), dtype=np.int32)
+        sims = dots / float(INT8_SCALE * INT8_SCALE)
+        row = int(np.argmax(sims))
+        if sims[row] < self.threshold:
+            return None
+
+        positions = {source_key(result): i for i, result in enumerate(results)}
+        cited = [positions.get(key) for key in shard.sources[row]]
+        if None in cited:
+            return None
+
+        self._tick += 1
+        shard.last_used[row] = self._tick
+        logger.info("♻️  Semantic cache hit (similarity %.3f)", sims[row])
+        return shard.answers[row].model_copy(update={"citation_indices": cited})
+
+    def put(self, namespace: Namespace, embedding: Sequence[float], answer: BaseModel,
+            results: List[Dict]) -> None:
+        """Store an answer generated from `results` for this query embedding."""
+        vector = self._quantize(embedding)
+        shard = self._shards.get(namespace)
+        if shard is None:
+            shard = self._shards[namespace] = _Shard(len(vector), self.max_entries)
+
+        sources = [source_key(results[i]) for i in answer.citation_indices]
+        if len(shard) < self.max_entries:
+            row = len(shard)
+            shard.answers.append(answer)
+            shard.sources.append(sources)
+        else:
+            row = int(np.argmin(shard.last_used))
+            shard.answers[row] = answer
+            shard.sources[row] = sources
+
+        self._tick += 1
+        shard.embeddings[row] = vector
+        shard.last_used[row] = self._tick
+
+    def snapshot(self) -> Optional[Dict[str, np.ndarray]]:
+        """Copy of all entries as the arrays save() writes (None when empty)."""
+        rows = [(namespace, shard, row) for namespace, shard in self._shards.items() for row in range(len(shard))]
+        if not rows:
+            return None
+        return {
+            "embeddings": np.stack([shard.embeddings[row] for _, shard, row in rows]),
+            "strategies": np.array([namespace[0] for namespace, _, _ in rows]),
+            "idccs": np.array([namespace[1] or "" for namespace, _, _ in rows]),
+            "answers": np.array([shard.answers[row].model_dump_json() for _, shard, row in rows]),
+            "sources": np.array([",".join(shard.sources[row]) for _, shard, row in rows]),
+        }
+
+    @staticmethod
+    def write(path: Path, arrays: Dict[str, np.ndarray]) -> None:
+        """
+        Write a snapshot() to a .npz file, replaced atomically.
+
+        Touches no cache state, so it can run in a worker thread while the
+        cache keeps serving.
+        """
+        # Written next to the target then renamed: a crash mid-write never leaves a truncated cache
+        tmp_path = Path(f"{path}.tmp")
+        with open(tmp_path, "wb") as f:  # file object: np.savez would append .npz to a bare path
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    def save(self, path: Path) -> None:
+        """Persist all entries to a single .npz file, replaced atomically."""
+        arrays = self.snapshot()
+        if arrays is not None:
+            self.write(path, arrays)
+
+    def load(self, path: Path) -> None:
+        """
+        Add the entries saved by save().
+
+        No-op if the file is missing; an unreadable file is logged and
+        ignored, so a damaged cache never keeps the app from starting.
+        """
+        if not Path(path).exists():
+            return
+        try:
+            with np.load(path) as data:
+                rows = list(zip(data["embeddings"], data["strategies"], data["idccs"],
+                                data["answers"], data["sources"]))
+            entries = [
+                ((str(strategy), str(idcc) or None), embedding,
+                 self.answer_model.model_validate_json(str(answer)), str(sources))
+                for embedding, strategy, idcc, answer, sources in rows
+            ]
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            logger.warning("Ignoring unreadable semantic answer cache %s: %s", path, e)
+            return
+
+        for namespace, embedding, answer, sources in entries:
+            shard = self._shards.get(namespace)
+            if shard is None:
+                shard = self._shards[namespace] = _Shard(len(embedding), self.max_entries)
+            if len(shard) >= self.max_entries:
+                continue
+            shard.embeddings[len(shard)] = embedding
+            shard.sources.append(sources.split(",") if sources else [])
+            shard.answers.append(answer)
+        logger.info(f"Loaded semantic answer cache from {path}")
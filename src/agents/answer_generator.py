@@ -1,13 +1,42 @@
 """Answer generation from retrieved context with citations."""
 
+import asyncio
+import hashlib
+import json
 import logging
-from typing import List, Dict, Optional
-from openai import OpenAI
+from typing import AsyncIterator, Dict, List, Optional, Type, Union
 from pydantic import BaseModel, Field
-from src.config.constants import LLM_CONFIG
+from src.agents.answer_cache import SemanticAnswerCache, source_key
+from src.agents.routing_agent import RoutingDecision
+from src.config.clients import get_openai_client
+from src.config.constants import ANSWER_CACHE_PATH, LLM_CONFIG
 
 logger = logging.getLogger(__name__)
 
+# The answer cache is written to ANSWER_CACHE_PATH at most this often (seconds)
+# while answers are generated, and once more on shutdown
+CACHE_SAVE_DELAY = 60.0
+
+# System prompt (constant, shared by every generation)
+ANSWER_SYSTEM_PROMPT = """Tu es un expert en droit du travail français.
+Ta tâche est de fournir des réponses claires et précises aux questions sur le droit du travail français.
+
+RÈGLES IMPORTANTES:
+1. Réponds en français
+2. Utilise UNIQUEMENT les informations du contexte fourni
+3. Si tu cites plusieurs sources, indique lequel(s) support(s) chaque affirmation (ex: "selon la Source 1")
+4. Sois précis et cite les articles pertinents
+5. Reconnaître l'incertitude ou les sources conflictuelles
+6. Garde ta réponse concise mais complète (2-4 phrases max)
+7. Fournis un score de confiance (0-1):
+   - 0.9-1.0: Réponse définitive clairement soutenue
+   - 0.7-0.9: Réponse claire avec bon support
+   - 0.5-0.7: Réponse raisonnable, mais une certaine incertitude
+   - <0.5: Information insuffisante ou conflictuelle
+
+IMPORTANT: Pour les indices de citation, utilise les numéros de source (1, 2, 3) du contexte fourni.
+Ne cite QUE les sources que tu utilises réellement dans ta réponse."""
+
 
 class AnswerWithCitations(BaseModel):
     """Generated answer with citation tracking."""
@@ -34,31 +63,217 @@ class AnswerGenerator:
     """
 
     def __init__(self):
-        """Initialize answer generator with OpenAI client."""
-        config = LLM_CONFIG
-        provider = config.get("provider", "openai")
+        """Initialize answer generator with the shared async OpenAI client."""
+        provider = LLM_CONFIG.provider
 
         if provider == "openai":
-            api_config = config["openai"]
-            self.client = OpenAI(api_key=api_config["api_key"])
-            self.model = api_config["model"]
+            self.client = get_openai_client()
+            self.model = LLM_CONFIG.openai_model
         else:
             raise ValueError(f"Unsupported LLM provider: {provider}")
 
         self.provider = provider
+        self.cache = SemanticAnswerCache(AnswerWithCitations)
+        # Generations in flight, by _inflight_key: concurrent identical requests
+        # (e.g. a burst on the same question) share one LLM call
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Pending delayed save of the cache (see _schedule_cache_save)
+        self._cache_save: Optional[asyncio.Task] = None
+        if ANSWER_CACHE_PATH:
+            self.cache.load(ANSWER_CACHE_PATH)
         logger.info(f"Initialized AnswerGenerator with {provider} ({self.model})")
 
-    def generate(self, query: str, results: List[Dict]) -> AnswerWithCitations:
+    async def generate(
+        self,
+        query: str,
+        results: List[Dict],
+        decision: Optional[RoutingDecision] = None,
+        query_embedding: Optional[List[float]] = None,
+    ) -> AnswerWithCitations:
         """
         Generate answer from retrieved context.
 
         Args:
             query: User's question
             results: List of retrieved results from multi_retriever
+            decision: Routing decision, namespacing the semantic cache
+            query_embedding: Query embedding; enables the semantic cache when given
 
         Returns:
             AnswerWithCitations with answer, confidence, citation_indices, and reasoning
         """
+        namespace = self._namespace(decision)
+        answer = self._answer_without_llm(results, namespace, query_embedding)
+        if answer is not None:
+            return answer
+
+        # An identical generation already running: share its answer
+        key = self._inflight_key(query, results)
+        answer = await self._join_inflight(key)
+        if answer is not None:
+            return answer
+
+        future = self._lead_inflight(key)
+        try:
+            try:
+                response = await self.client.beta.chat.completions.parse(**self._request(query, results))
+                answer = self._finalize(response.choices[0].message.parsed, results, namespace, query_embedding)
+            except Exception as e:
+                answer = self._error_answer(e)
+            future.set_result(answer)
+            return answer
+        finally:
+            self._release_inflight(key, future)
+
+    async def stream(
+        self,
+        query: str,
+        results: List[Dict],
+        decision: Optional[RoutingDecision] = None,
+        query_embedding: Optional[List[float]] = None,
+    ) -> AsyncIterator[Union[str, AnswerWithCitations]]:
+        """
+        Generate like generate(), streaming the answer text while it is produced.
+
+        Yields the answer text so far (str) each time it grows, then the final
+        validated AnswerWithCitations. On a cache hit, when joining an identical
+        generation in flight, without results or on error, only the final
+        AnswerWithCitations is yielded.
+        """
+        namespace = self._namespace(decision)
+        answer = self._answer_without_llm(results, namespace, query_embedding)
+        if answer is None:
+            key = self._inflight_key(query, results)
+            answer = await self._join_inflight(key)
+        if answer is not None:
+            yield answer
+            return
+
+        future = self._lead_inflight(key)
+        try:
+            partial = ""
+            async with self.client.beta.chat.completions.stream(**self._request(query, results)) as stream:
+                async for event in stream:
+                    # event.parsed is the JSON object parsed so far
+                    if event.type == "content.delta" and event.parsed:
+                        text = event.parsed.get("answer") or ""
+                        if text != partial:
+                            partial = text
+                            yield partial
+                completion = await stream.get_final_completion()
+            answer = self._finalize(completion.choices[0].message.parsed, results, namespace, query_embedding)
+        except Exception as e:
+            answer = self._error_answer(e)
+        finally:
+            # Resolved before the final yield: followers need not wait for this consumer
+            if answer is not None:
+                future.set_result(answer)
+            self._release_inflight(key, future)
+        yield answer
+
+    async def generate_batch(
+        self,
+        queries: List[str],
+        results_per_query: List[List[Dict]],
+        poll_interval: float = 30.0,
+    ) -> List[AnswerWithCitations]:
+        """
+        Generate answers for many queries through the OpenAI Batch API.
+
+        For offline evaluation runs: batch requests cost half as much and do
+        not count against the online rate limits, but complete asynchronously
+        (up to 24h). Polls until the batch is done.
+
+        Args:
+            queries: Questions to answer
+            results_per_query: Retrieved results for each question
+            poll_interval: Seconds between batch status checks
+
+        Returns:
+            One AnswerWithCitations per query, in order (fallback answer for
+            requests that failed)
+        """
+        answers: List[Optional[AnswerWithCitations]] = [
+            self._answer_without_llm(results, ("", None), None) for results in results_per_query
+        ]
+
+        lines = []
+        for i, (query, results) in enumerate(zip(queries, results_per_query)):
+            if answers[i] is not None:
+                continue
+            body = self._request(query, results)
+            body["response_format"] = _json_schema_response_format(AnswerWithCitations)
+            lines.append(json.dumps({"custom_id": str(i), "method": "POST", "url": "/v1/chat/completions", "body": body}))
+
+        if not lines:
+            return answers
+
+        input_file = await self.client.files.create(
+            file=("answers.jsonl", "\n".join(lines).encode()), purpose="batch"
+        )
+        batch = await self.client.batches.create(
+            input_file_id=input_file.id, endpoint="/v1/chat/completions", completion_window="24h"
+        )
+        logger.info("Submitted answer batch %s (%d requests)", batch.id, len(lines))
+
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            await asyncio.sleep(poll_interval)
+            batch = await self.client.batches.retrieve(batch.id)
+        logger.info("Answer batch %s %s", batch.id, batch.status)
+
+        if batch.output_file_id:
+            output = await self.client.files.content(batch.output_file_id)
+            for line in output.text.splitlines():
+                record = json.loads(line)
+                i = int(record["custom_id"])
+                try:
+                    message = record["response"]["body"]["choices"][0]["message"]
+                    answer = AnswerWithCitations.model_validate_json(message["content"])
+                    answers[i] = self._finalize(answer, results_per_query[i], ("", None), None)
+                except Exception as e:
+                    answers[i] = self._error_answer(e)
+
+        missing = RuntimeError(f"Batch {batch.id} {batch.status} without a response")
+        return [answer if answer is not None else self._error_answer(missing) for answer in answers]
+
+    @staticmethod
+    def _inflight_key(query: str, results: List[Dict]) -> str:
+        """Identity of a generation request: the query and the context sources."""
+        return hashlib.sha256("\0".join([query, *map(source_key, results[:3])]).encode()).hexdigest()
+
+    async def _join_inflight(self, key: str) -> Optional[AnswerWithCitations]:
+        """Await the answer of an identical generation in flight, if any."""
+        pending = self._inflight.get(key)
+        if pending is None:
+            return None
+        logger.info("🔗 Joining identical in-flight generation")
+        try:
+            # Shielded: cancelling this caller must not cancel the shared generation
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            if pending.cancelled():  # its leader went away: generate ourselves
+                return None
+            raise
+
+    def _lead_inflight(self, key: str) -> asyncio.Future:
+        """Register this call as the generation identical requests will join."""
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        return future
+
+    def _release_inflight(self, key: str, future: asyncio.Future) -> None:
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.done():  # leader cancelled before answering
+            future.cancel()
+
+    @staticmethod
+    def _namespace(decision: Optional[RoutingDecision]):
+        return (decision.strategy, decision.idcc) if decision else ("", None)
+
+    def _answer_without_llm(self, results: List[Dict], namespace,
+                            query_embedding: Optional[List[float]]) -> Optional[AnswerWithCitations]:
+        """Answer when there is nothing to generate from, or from the semantic cache."""
         if not results:
             logger.warning("No results provided for answer generation")
             return AnswerWithCitations(
@@ -68,54 +283,85 @@ class AnswerGenerator:
                 reasoning="Pas de résultats de recherche fournis"
             )
 
+        if query_embedding is not None:
+            return self.cache.get(namespace, query_embedding, results)
+        return None
+
+    def _request(self, query: str, results: List[Dict]) -> Dict:
+        """Chat completion arguments for a structured answer over the top 3 results."""
         # Build context from top 3 results only
         context = self._build_context(results[:3])
 
-        logger.info(f"\n{'='*80}\nANSWER GENERATION\n{'='*80}")
-        logger.info(f"📥 Question: \"{query}\"")
-        logger.info(f"📚 Context from {len(results[:3])} sources")
+        logger.info("📥 Generating answer to %r from %d sources", query, len(results[:3]))
 
         system_prompt = self._get_system_prompt()
         user_prompt = f"Question: {query}\n\nContexte:\n{context}"
 
-        try:
-            response = self.client.beta.chat.completions.parse(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                response_format=AnswerWithCitations,
-                temperature=0.7,  # Some creativity for natural language
-            )
-
-            answer = response.choices[0].message.parsed
-
-            # Validate citation indices
-            valid_indices = [idx for idx in answer.citation_indices if 0 <= idx < len(results)]
-            if len(valid_indices) != len(answer.citation_indices):
-                logger.warning(
-                    f"Invalid citation indices: {answer.citation_indices}, "
-                    f"valid: {valid_indices}, total results: {len(results)}"
-                )
-                answer.citation_indices = valid_indices
-
-            logger.info(f"✅ Generated answer with confidence {answer.confidence:.2f}")
-            logger.info(f"📌 Cited sources: {answer.citation_indices}")
-            logger.info(f"💡 Reasoning: {answer.reasoning}")
-            logger.info(f"{'='*80}\n")
-
-            return answer
-
-        except Exception as e:
-            logger.error(f"Failed to generate answer: {e}", exc_info=True)
-            # Fallback answer
-            return AnswerWithCitations(
-                answer="Je n'ai pas pu générer une réponse à cette question.",
-                confidence=0.0,
-                citation_indices=[],
-                reasoning=f"Erreur lors de la génération: {str(e)[:100]}"
+        return dict(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            response_format=AnswerWithCitations,
+            temperature=0.7,  # Some creativity for natural language
+        )
+
+    def _finalize(self, answer: AnswerWithCitations, results: List[Dict], namespace,
+                  query_embedding: Optional[List[float]]) -> AnswerWithCitations:
+        """Validate citation indices of a generated answer and store it in the cache."""
+        n_results = len(results)
+        valid_indices = [idx for idx in answer.citation_indices if 0 <= idx < n_results]
+        dropped = len(answer.citation_indices) - len(valid_indices)
+        if dropped:
+            logger.warning(
+                "Dropped %d invalid citation indices: %s, valid: %s, total results: %d",
+                dropped, answer.citation_indices, valid_indices, n_results
             )
+            answer.citation_indices = valid_indices
+
+        logger.info("✅ Generated answer with confidence %.2f | 📌 Cited sources: %s | 💡 Reasoning: %s",
+                    answer.confidence, answer.citation_indices, answer.reasoning)
+
+        if query_embedding is not None:
+            self.cache.put(namespace, query_embedding, answer, results)
+            self._schedule_cache_save()
+
+        return answer
+
+    def _schedule_cache_save(self) -> None:
+        """Save the cache CACHE_SAVE_DELAY seconds from now, with every answer stored meanwhile."""
+        if not ANSWER_CACHE_PATH or (self._cache_save is not None and not self._cache_save.done()):
+            return
+        self._cache_save = asyncio.get_running_loop().create_task(self._save_cache_later())
+
+    async def _save_cache_later(self) -> None:
+        await asyncio.sleep(CACHE_SAVE_DELAY)
+        await self.save_cache()
+
+    async def save_cache(self) -> None:
+        """Write the answer cache to ANSWER_CACHE_PATH without blocking the event loop."""
+        if not ANSWER_CACHE_PATH:
+            return
+        # Snapshot on the loop (consistent with concurrent puts), file I/O in a thread
+        arrays = self.cache.snapshot()
+        if arrays is None:
+            return
+        try:
+            await asyncio.to_thread(SemanticAnswerCache.write, ANSWER_CACHE_PATH, arrays)
+        except OSError as e:
+            logger.warning("Could not save the semantic answer cache: %s", e)
+
+    @staticmethod
+    def _error_answer(error: Exception) -> AnswerWithCitations:
+        logger.error("Failed to generate answer: %s", error, exc_info=error)
+        # Fallback answer
+        return AnswerWithCitations(
+            answer="Je n'ai pas pu générer une réponse à cette question.",
+            confidence=0.0,
+            citation_indices=[],
+            reasoning=f"Erreur lors de la génération: {str(error)[:100]}"
+        )
 
     def _build_context(self, results: List[Dict]) -> str:
         """
@@ -127,47 +373,42 @@ class AnswerGenerator:
         Returns:
             Formatted context string with source labels
         """
-        top_3 = results[:3]
-        context = ""
+        parts = []
+        for i, result in enumerate(results[:3], 1):
+            article = result["metadata"].get("article_num", "unknown")
+            format_label = _SOURCE_LABELS.get(result["_collection"], _code_label)
+            parts.append(f"[Source {i}] {format_label(article, result['metadata'])}:\n{result['content']}\n\n")
 
-        for i, result in enumerate(top_3, 1):
-            meta = result["metadata"]
-            article = meta.get("article_num", "unknown")
-            source = result["_collection"]
-            content = result["content"]
+        return "".join(parts)
 
-            # Format source label
-            if source == "kali":
-                convention = meta.get("convention_name", "")
-                idcc = meta.get("idcc", "")
-                source_label = f"{article} (Convention {convention} - IDCC {idcc})"
-            else:
-                source_label = f"{article} (Code du travail)"
+    def _get_system_prompt(self) -> str:
+        """System prompt for answer generation."""
+        return ANSWER_SYSTEM_PROMPT
 
-            context += f"[Source {i}] {source_label}:\n{content}\n\n"
 
-        return context
+def _kali_label(article: str, meta: Dict) -> str:
+    return f"{article} (Convention {meta.get('convention_name', '')} - IDCC {meta.get('idcc', '')})"
 
-    def _get_system_prompt(self) -> str:
-        """System prompt for answer generation."""
-        return """Tu es un expert en droit du travail français.
-Ta tâche est de fournir des réponses claires et précises aux questions sur le droit du travail français.
 
-RÈGLES IMPORTANTES:
-1. Réponds en français
-2. Utilise UNIQUEMENT les informations du contexte fourni
-3. Si tu cites plusieurs sources, indique lequel(s) support(s) chaque affirmation (ex: "selon la Source 1")
-4. Sois précis et cite les articles pertinents
-5. Reconnaître l'incertitude ou les sources conflictuelles
-6. Garde ta réponse concise mais complète (2-4 phrases max)
-7. Fournis un score de confiance (0-1):
-   - 0.9-1.0: Réponse définitive clairement soutenue
-   - 0.7-0.9: Réponse claire avec bon support
-   - 0.5-0.7: Réponse raisonnable, mais une certaine incertitude
-   - <0.5: Information insuffisante ou conflictuelle
+def _code_label(article: str, meta: Dict) -> str:
+    return f"{article} (Code du travail)"
 
-IMPORTANT: Pour les indices de citation, utilise les numéros de source (1, 2, 3) du contexte fourni.
-Ne cite QUE les sources que tu utilises réellement dans ta réponse."""
+
+def _json_schema_response_format(model: Type[BaseModel]) -> Dict:
+    """
+    Structured-output response_format for a pydantic model, as a raw request body.
+
+    Strict mode needs every property required and no extra properties. Same
+    format as chat.completions.parse() sends for online calls.
+    """
+    schema = model.model_json_schema()
+    schema["required"] = list(schema["properties"])
+    schema["additionalProperties"] = False
+    return {"type": "json_schema", "json_schema": {"name": model.__name__, "schema": schema, "strict": True}}
+
+
+# Source label per collection (anything else is labelled as Code du travail)
+_SOURCE_LABELS = {"kali": _kali_label}
 
 
 # Singleton instance
@@ -2,34 +2,55 @@
 Multi-collection retrieval with intelligent result merging.
 """
 
+import asyncio
+import heapq
 import logging
-from typing import List, Dict
+from operator import itemgetter
+from typing import List, Dict, Optional
 from qdrant_client.models import Filter, FieldCondition, MatchValue
-from src.retrieval.retrieve import retrieve
+from src.retrieval.retrieve import retrieve, encode_query, get_embedder
 from src.agents.routing_agent import RoutingDecision
 
 logger = logging.getLogger(__name__)
 
+# A hit this close in the primary (first-routed) collection is not going to be
+# outranked by the secondary one: its results are returned without waiting
+SHORT_CIRCUIT_SCORE = 0.85
 
-def retrieve_with_routing(query: str, decision: RoutingDecision, top_k: int = 10) -> List[Dict]:
+
+async def retrieve_with_routing(query: str, decision: RoutingDecision, top_k: int = 10,
+                                query_vector: Optional[List[float]] = None) -> List[Dict]:
     """
     Execute retrieval based on routing decision.
 
+    Collections are queried concurrently (each blocking retrieve() call runs in
+    a worker thread), so latency is that of the slowest collection rather than
+    the sum. For both_* strategies, a primary-collection hit scoring at least
+    SHORT_CIRCUIT_SCORE returns without waiting for the secondary collection.
+
     Args:
         query: User query
         decision: RoutingDecision from routing agent
         top_k: Number of results per collection
+        query_vector: Precomputed query embedding (encoded here otherwise)
 
     Returns:
         List of results with collection source tagged
     """
     all_results = []
 
-    logger.info(f"\n{'='*80}\nMULTI-COLLECTION RETRIEVAL\n{'='*80}")
-    logger.info(f"Query: \"{query}\"")
-    logger.info(f"Collections to query: {decision.collections}")
-    logger.info(f"Top-K: {top_k}")
+    # Lazy %-formatting: nothing is formatted when INFO is disabled
+    logger.info("Multi-collection retrieval: query=%r collections=%s top_k=%d",
+                query, decision.collections, top_k)
 
+    # Encode once, shared by every collection
+    if query_vector is None:
+        query_vector = await asyncio.to_thread(encode_query, query, get_embedder())
+
+    # Qdrant's batch endpoints (query_batch_points / search_batch) take a single
+    # collection, and each routed collection gets exactly one search, so there
+    # is nothing to batch: concurrent single searches already overlap the RTTs
+    lookups = []
     for idx, collection in enumerate(decision.collections, 1):
         # Build filters for KALI
         filters = None
@@ -37,40 +58,50 @@ def retrieve_with_routing(query: str, decision: RoutingDecision, top_k: int = 10
             filters = Filter(
                 must=[FieldCondition(key="meta.idcc", match=MatchValue(value=decision.idcc))]
             )
-            logger.info(f"\n[{idx}/{len(decision.collections)}] Querying {collection} with filter IDCC={decision.idcc}")
-            logger.info(f"DEBUG: Filter object: {filters}")
-            logger.info(f"DEBUG: IDCC type: {type(decision.idcc)}, value: {repr(decision.idcc)}")
+            logger.info("[%d/%d] Querying %s with filter IDCC=%s",
+                        idx, len(decision.collections), collection, decision.idcc)
+            logger.debug("Filter object: %s", filters)
         else:
-            logger.info(f"\n[{idx}/{len(decision.collections)}] Querying {collection} (no filter)")
-
-        try:
-            results = retrieve(
-                query=query,
-                collection_name=collection,
-                top_k=top_k,
-                filters=filters
-            )
-
-            logger.info(f"✅ Got {len(results)} results from {collection}")
-
-            # Tag results with collection source
-            for result in results:
-                result['_collection'] = collection
-                if collection == "kali" and decision.idcc:
-                    result['_convention'] = decision.idcc
+            logger.info("[%d/%d] Querying %s (no filter)", idx, len(decision.collections), collection)
+
+        lookups.append(asyncio.ensure_future(asyncio.to_thread(
+            retrieve,
+            query=query,
+            collection_name=collection,
+            top_k=top_k,
+            filters=filters,
+            query_vector=query_vector
+        )))
+
+    # One failing collection must not drop the others' results
+    outcomes = await asyncio.gather(lookups[0], return_exceptions=True)
+    primary = outcomes[0]
+    if (len(lookups) > 1 and not isinstance(primary, Exception) and primary
+            and max(result['score'] for result in primary) >= SHORT_CIRCUIT_SCORE):
+        logger.info("⏭️  Primary %s hit >= %.2f, skipping %s",
+                    decision.collections[0], SHORT_CIRCUIT_SCORE, decision.collections[1:])
+        for lookup in lookups[1:]:
+            lookup.cancel()
+    else:
+        outcomes += await asyncio.gather(*lookups[1:], return_exceptions=True)
+
+    for collection, results in zip(decision.collections, outcomes):
+        if isinstance(results, Exception):
+            logger.error("❌ Error retrieving from %s: %.200s", collection, results)
+            continue
 
-            all_results.extend(results)
+        logger.info("✅ Got %d results from %s", len(results), collection)
 
-        except Exception as e:
-            logger.error(f"❌ Error retrieving from {collection}: {str(e)[:200]}")
-            continue
+        # Tag results with collection source
+        for result in results:
+            result['_collection'] = collection
+            if collection == "kali" and decision.idcc:
+                result['_convention'] = decision.idcc
 
-    # Sort by score (descending)
-    all_results.sort(key=lambda x: x['score'], reverse=True)
+        all_results.extend(results)
 
-    # Take top-k from merged results
-    final_results = all_results[:top_k]
-    logger.info(f"\n📊 Merged results: {len(all_results)} total, returning top {len(final_results)}")
-    logger.info(f"{'='*80}\n")
+    # Top-k of the merged results by score (descending)
+    final_results = heapq.nlargest(top_k, all_results, key=itemgetter('score'))
+    logger.info("📊 Merged results: %d total, returning top %d", len(all_results), len(final_results))
 
     return final_results
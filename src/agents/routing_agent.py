@@ -5,9 +5,11 @@ Decides which Qdrant collection(s) to query and extracts IDCC if needed.
 """
 
 import logging
+import re
+import unicodedata
 from typing import Dict, List, Optional, Literal
-from openai import OpenAI
 from pydantic import BaseModel, Field
+from src.config.clients import get_openai_client
 from src.config.constants import LLM_CONFIG
 
 logger = logging.getLogger(__name__)
@@ -23,6 +25,96 @@ CONVENTION_MAPPING = {
     "2120": {"name": "Banque", "keywords": ["banque", "bancaire", "conseiller", "guichet", "finance"]}
 }
 
+# Words that point at a collective agreement without naming an industry
+CONVENTION_HINTS = ["convention", "idcc", "accord", "branche"]
+
+# Stems of keywords whose feminine, inflected or derived forms are not
+# prefixed by the keyword itself (serveuse, restauration, informaticien,
+# banquier, garagiste, développeuse, consultant, cuisinière, caissière, ouvrière)
+CONVENTION_STEMS = ["serveu", "restaur", "informati", "banq", "garag", "developpe",
+                    "consult", "cuisin", "caissi", "ouvri"]
+
+
+def normalize(text: str) -> str:
+    """Lowercase and strip accents, for keyword matching."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _trie_pattern(words) -> str:
+    """
+    Regex matching any of `words` as a prefix trie: shared prefixes are tested
+    once instead of once per alternative.
+
+    There is no end anchor, so a word that extends another ("metallurgie" /
+    "metal") never changes whether there is a match and is pruned.
+    """
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        if "" in node:
+            return ""
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items())]
+        return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+    return build(trie)
+
+
+# Any convention name, keyword, hint or stem, matched as a word prefix on
+# normalized text, in one pass. No match means a general-law question: routed
+# to code_only without an LLM call, so a form missing here is misrouted.
+_CONVENTION_PATTERN = re.compile(r"\b" + _trie_pattern({
+    normalize(word)
+    for info in CONVENTION_MAPPING.values()
+    for word in [info["name"], *info["keywords"]]
+} | set(CONVENTION_HINTS) | set(CONVENTION_STEMS)))
+
+
+# System prompt, built once at import (CONVENTION_MAPPING is static)
+_CONVENTIONS_LIST = "\n".join([
+    f"- IDCC {idcc}: {info['name']} (keywords: {', '.join(info['keywords'][:5])})"
+    for idcc, info in CONVENTION_MAPPING.items()
+])
+
+ROUTING_SYSTEM_PROMPT = f"""You are a routing agent for a French labor law RAG system with two knowledge bases:
+
+1. **Code du travail**: General French labor law (applies to all workers)
+2. **KALI conventions**: Industry-specific collective bargaining agreements (override Code du travail when more favorable)
+
+Available conventions:
+{_CONVENTIONS_LIST}
+
+**Decision rules:**
+- code_only: General labor law questions (e.g., "durée légale du travail", "congés payés légaux")
+- kali_only: Query explicitly mentions a convention/industry AND asks about convention-specific rules
+- both_code_first: Query could apply to both (check general law first, then convention)
+- both_kali_first: Convention-specific question where convention rules are primary
+
+**IDCC detection:**
+- Extract job role or industry from query
+- Map to IDCC using keywords (e.g., "ingénieur informatique" → "1486")
+- If ambiguous or no clear match: null
+
+Examples:
+- "Quelle est la durée du préavis de démission?" → code_only, idcc: null (general legal question)
+- "Quel est le préavis de démission pour un ingénieur informatique?" → both_kali_first, idcc: "1486" (IT engineer = Syntec)
+- "Convention Syntec période d'essai" → kali_only, idcc: "1486" (explicitly asks about Syntec)
+
+Be concise and deterministic."""
+
+
+_STRATEGY_TO_COLLECTIONS = {
+    "code_only": ("code_travail",),
+    "kali_only": ("kali",),
+    "both_code_first": ("code_travail", "kali"),
+    "both_kali_first": ("kali", "code_travail"),
+}
+
 
 class RoutingDecision(BaseModel):
     """Routing decision output with Pydantic validation."""
@@ -39,18 +131,8 @@ class RoutingDecision(BaseModel):
 
     @property
     def collections(self) -> List[str]:
-        """Derive collections list from strategy."""
-        if self.strategy == "code_only":
-            return ["code_travail"]
-        elif self.strategy == "kali_only":
-            return ["kali"]
-        elif self.strategy == "both_code_first":
-            return ["code_travail", "kali"]
-        elif self.strategy == "both_kali_first":
-            return ["kali", "code_travail"]
-        else:
-            logger.warning(f"Unknown strategy '{self.strategy}', defaulting to code_only")
-            return ["code_travail"]
+        """Collections to query, in order (always follows strategy)."""
+        return list(_STRATEGY_TO_COLLECTIONS[self.strategy])
 
 
 class RoutingAgent:
@@ -65,46 +147,46 @@ class RoutingAgent:
 
     def __init__(self):
         self.config = LLM_CONFIG
-        provider = self.config.get("provider", "openai")
+        provider = self.config.provider
 
         if provider == "openai":
-            api_config = self.config["openai"]
-            self.client = OpenAI(api_key=api_config["api_key"])
-            self.model = api_config["model"]
+            self.client = get_openai_client()
+            self.model = self.config.openai_model
         else:
             raise ValueError(f"Unsupported LLM provider: {provider}")
 
         self.provider = provider
         logger.info(f"Initialized RoutingAgent with {provider} ({self.model})")
 
-    def route(self, query: str) -> RoutingDecision:
+    async def route(self, query: str) -> RoutingDecision:
         """
         Analyze query and decide routing strategy.
 
         Returns:
             RoutingDecision with strategy, collections, and optional IDCC
         """
-        logger.info(f"\n{'='*80}\nROUTING AGENT\n{'='*80}")
-        logger.info(f"📥 Input query: \"{query}\"")
+        logger.info("📥 Routing query: %r", query)
+
+        # Fast path: nothing hints at a convention, skip the LLM round-trip
+        if not _CONVENTION_PATTERN.search(normalize(query)):
+            decision = RoutingDecision(strategy="code_only", idcc=None, reasoning="keyword fast-path")
+            logger.info("⚡ No convention keyword, routing to %s", decision.collections)
+            return decision
 
         # Call LLM for routing decision
         try:
-            decision = self._llm_route(query)
-            logger.info(f"📊 Strategy: {decision.strategy}")
-            logger.info(f"📦 Collections: {decision.collections}")
-            logger.info(f"🏢 IDCC: {decision.idcc}")
-            logger.info(f"💡 Reasoning: {decision.reasoning}")
-            logger.info(f"{'='*80}\n")
+            decision = await self._llm_route(query)
+            logger.info("📊 Strategy: %s | 📦 Collections: %s | 🏢 IDCC: %s | 💡 Reasoning: %s",
+                        decision.strategy, decision.collections, decision.idcc, decision.reasoning)
             return decision
         except Exception as e:
-            logger.error(f"LLM routing failed: {e}, falling back to code_travail only")
+            logger.error("LLM routing failed: %s, falling back to code_travail only", e)
             return RoutingDecision(
                 strategy="code_only",
-                collections=["code_travail"],
                 reasoning="Fallback: LLM error"
             )
 
-    def _llm_route(self, query: str) -> RoutingDecision:
+    async def _llm_route(self, query: str) -> RoutingDecision:
         """Call LLM to make routing decision with structured output."""
 
         system_prompt = self._get_system_prompt()
@@ -112,7 +194,7 @@ class RoutingAgent:
 
 Analyze this French labor law query and decide routing strategy."""
 
-        response = self.client.beta.chat.completions.parse(
+        response = await self.client.beta.chat.completions.parse(
             model=self.model,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -127,36 +209,7 @@ Analyze this French labor law query and decide routing strategy."""
 
     def _get_system_prompt(self) -> str:
         """System prompt for routing decisions."""
-        conventions_list = "\n".join([
-            f"- IDCC {idcc}: {info['name']} (keywords: {', '.join(info['keywords'][:5])})"
-            for idcc, info in CONVENTION_MAPPING.items()
-        ])
-
-        return f"""You are a routing agent for a French labor law RAG system with two knowledge bases:
-
-1. **Code du travail**: General French labor law (applies to all workers)
-2. **KALI conventions**: Industry-specific collective bargaining agreements (override Code du travail when more favorable)
-
-Available conventions:
-{conventions_list}
-
-**Decision rules:**
-- code_only: General labor law questions (e.g., "durée légale du travail", "congés payés légaux")
-- kali_only: Query explicitly mentions a convention/industry AND asks about convention-specific rules
-- both_code_first: Query could apply to both (check general law first, then convention)
-- both_kali_first: Convention-specific question where convention rules are primary
-
-**IDCC detection:**
-- Extract job role or industry from query
-- Map to IDCC using keywords (e.g., "ingénieur informatique" → "1486")
-- If ambiguous or no clear match: null
-
-Examples:
-- "Quelle est la durée du préavis de démission?" → code_only, idcc: null (general legal question)
-- "Quel est le préavis de démission pour un ingénieur informatique?" → both_kali_first, idcc: "1486" (IT engineer = Syntec)
-- "Convention Syntec période d'essai" → kali_only, idcc: "1486" (explicitly asks about Syntec)
-
-Be concise and deterministic."""
+        return ROUTING_SYSTEM_PROMPT
 
 
 # Singleton instance
@@ -0,0 +1,52 @@
+"""
+Shared API clients, created once per process.
+
+The routing agent and the answer generator both call OpenAI on every query:
+one client means one connection pool whose warm connections serve both.
+Nothing is created at import, so scripts that never call the LLM don't open
+a client; the web app closes them on shutdown (close_llm_clients).
+"""
+
+import importlib.util
+
+import httpx
+from openai import AsyncOpenAI
+from src.config.constants import LLM_CONFIG
+
+_llm_http_client = None
+_openai_client = None
+
+
+def get_llm_http_client() -> httpx.AsyncClient:
+    """
+    Get or create the shared HTTP client for the LLM clients.
+
+    TCP/TLS setup is paid once per process and, over HTTP/2, concurrent calls
+    are multiplexed over one connection. Falls back to HTTP/1.1 when the h2
+    package (httpx[http2]) is not installed.
+    """
+    global _llm_http_client
+    if _llm_http_client is None:
+        _llm_http_client = httpx.AsyncClient(
+            http2=importlib.util.find_spec("h2") is not None,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            timeout=60,
+        )
+    return _llm_http_client
+
+
+def get_openai_client() -> AsyncOpenAI:
+    """Get or create the shared AsyncOpenAI client (over get_llm_http_client)."""
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = AsyncOpenAI(api_key=LLM_CONFIG.openai_api_key, http_client=get_llm_http_client())
+    return _openai_client
+
+
+async def close_llm_clients() -> None:
+    """Close the shared clients, if they were created; the next get_* call creates new ones."""
+    global _llm_http_client, _openai_client
+    if _llm_http_client is not None:
+        # AsyncOpenAI has no connections of its own: closing its HTTP client closes it
+        await _llm_http_client.aclose()
+    _llm_http_client = _openai_client = None
@@ -6,17 +6,18 @@ Usage:
 
     # Access Qdrant configuration
     config = QDRANT_CONFIG
-    if config["type"] == "cloud":
-        url = config["cloud"]["url"]
-        api_key = config["cloud"]["api_key"]
+    if config.type == "cloud":
+        url = config.cloud.url
+        api_key = config.cloud.api_key
 
     # Access LLM configuration
-    llm_config = LLM_CONFIG
-    provider = llm_config["provider"]
+    provider = LLM_CONFIG.provider
 """
 
 import os
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 
 # Load .env file from project root
@@ -25,57 +26,82 @@ dotenv_path = project_root / ".env"
 load_dotenv(dotenv_path)
 
 
-def get_qdrant_config() -> dict:
-    """
-    Get Qdrant configuration from environment variables.
+@dataclass(frozen=True, slots=True)
+class QdrantConnection:
+    """URL and API key of one Qdrant deployment."""
+    url: Optional[str]
+    api_key: Optional[str] = None
 
-    Returns:
-        dict: Configuration with cloud and local settings
-    """
-    qdrant_type = os.getenv("QDRANT_TYPE", "local")
 
-    config = {
-        "type": qdrant_type,
-        "cloud": {
-            "url": os.getenv("QDRANT_CLOUD_URL"),
-            "api_key": os.getenv("QDRANT_CLOUD_API_KEY"),
-        },
-        "local": {
-            "url": os.getenv("QDRANT_LOCAL_URL", "http://localhost:6333"),
-            "api_key": None,
-        }
-    }
+@dataclass(frozen=True, slots=True)
+class QdrantConfig:
+    """Qdrant settings: which deployment to use, and client options."""
+    type: str
+    prefer_grpc: bool
+    timeout: int
+    cloud: QdrantConnection
+    local: QdrantConnection
 
-    return config
+    @property
+    def connection(self) -> QdrantConnection:
+        """The deployment selected by `type`."""
+        return self.cloud if self.type == "cloud" else self.local
 
 
-# Export Qdrant configuration
-QDRANT_CONFIG = get_qdrant_config()
+@dataclass(frozen=True, slots=True)
+class LLMConfig:
+    """LLM provider and its API settings."""
+    provider: str
+    openai_api_key: Optional[str]
+    openai_model: str
 
 
-def get_llm_config() -> dict:
+def get_qdrant_config() -> QdrantConfig:
     """
-    Get LLM configuration from environment variables.
+    Get Qdrant configuration from environment variables.
 
     Returns:
-        dict: Configuration with provider and API settings
+        QdrantConfig: Configuration with cloud and local settings
     """
-    provider = os.getenv("LLM_PROVIDER", "openai")
+    return QdrantConfig(
+        type=os.getenv("QDRANT_TYPE", "local"),
+        # gRPC (port 6334) multiplexes concurrent searches over one HTTP/2 channel
+        prefer_grpc=os.getenv("QDRANT_PREFER_GRPC", "true").lower() == "true",
+        timeout=int(os.getenv("QDRANT_TIMEOUT", "30")),
+        cloud=QdrantConnection(
+            url=os.getenv("QDRANT_CLOUD_URL"),
+            api_key=os.getenv("QDRANT_CLOUD_API_KEY"),
+        ),
+        local=QdrantConnection(
+            url=os.getenv("QDRANT_LOCAL_URL", "http://localhost:6333"),
+        ),
+    )
+
+
+# Export Qdrant configuration (built once, immutable)
+QDRANT_CONFIG = get_qdrant_config()
 
-    config = {
-        "provider": provider,
-        "openai": {
-            "api_key": os.getenv("OPENAI_API_KEY"),
-            "model": os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-        }
-    }
 
-    return config
+def get_llm_config() -> LLMConfig:
+    """
+    Get LLM configuration from environment variables.
+
+    Returns:
+        LLMConfig: Configuration with provider and API settings
+    """
+    return LLMConfig(
+        provider=os.getenv("LLM_PROVIDER", "openai"),
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        openai_model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+    )
 
 
-# Export LLM configuration
+# Export LLM configuration (built once, immutable)
 LLM_CONFIG = get_llm_config()
 
+# Optional .npz file persisting the semantic answer cache across restarts
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH")
+
 # Export API Gateway stage, if available
 # This allows the app to be aware of its path prefix (e.g., /prod)
 API_STAGE = os.getenv("API_STAGE", "")
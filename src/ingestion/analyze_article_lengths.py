@@ -2,10 +2,13 @@
 Analyze article text lengths to inform chunking strategy.
 """
 
-import json
+import numpy as np
+import orjson
 from pathlib import Path
 from collections import Counter
 
+from chunkers.article_chunker import iter_jsonl
+
 
 def count_tokens_simple(text: str) -> int:
     """Simple token count approximation (words)."""
@@ -21,22 +24,23 @@ def analyze_lengths():
 
     print("Analyzing article lengths...")
 
-    with open(input_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            article = json.loads(line)
+    with open(input_path, 'rb') as f:
+        for line in iter_jsonl(f):
+            article = orjson.loads(line)
             text = article.get('text', '')
             token_count = count_tokens_simple(text)
             lengths.append(token_count)
 
     # Statistics
+    lengths = np.array(lengths, dtype=np.int64)
     total = len(lengths)
-    under_500 = sum(1 for l in lengths if l < 500)
-    between_500_1000 = sum(1 for l in lengths if 500 <= l < 1000)
-    over_1000 = sum(1 for l in lengths if l >= 1000)
+    under_500 = int(np.count_nonzero(lengths < 500))
+    over_1000 = int(np.count_nonzero(lengths >= 1000))
+    between_500_1000 = total - under_500 - over_1000
 
-    avg_length = sum(lengths) / len(lengths) if lengths else 0
-    max_length = max(lengths) if lengths else 0
-    min_length = min(lengths) if lengths else 0
+    avg_length = float(lengths.mean()) if total else 0
+    max_length = int(lengths.max()) if total else 0
+    min_length = int(lengths.min()) if total else 0
 
     print("\n" + "="*60)
     print("ARTICLE LENGTH ANALYSIS")
@@ -57,10 +61,10 @@ def analyze_lengths():
     print("SAMPLE LONG ARTICLES (>1000 tokens)")
     print("="*60)
 
-    with open(input_path, 'r', encoding='utf-8') as f:
+    with open(input_path, 'rb') as f:
         count = 0
-        for line in f:
-            article = json.loads(line)
+        for line in iter_jsonl(f):
+            article = orjson.loads(line)
             text = article.get('text', '')
             token_count = count_tokens_simple(text)
 
@@ -3,16 +3,33 @@ Parser for Code du travail XML files from Legifrance.
 Filters out obsolete (ABROGE) articles and extracts relevant metadata.
 """
 
-import xml.etree.ElementTree as ET
 from pathlib import Path
 from typing import Optional, Dict, Any
 import json
 from datetime import datetime
 
+from lxml import etree
+
+# Relative when imported as parsers.*, plain when this file is run directly
+try:
+    from .xml_utils import HEAD_BYTES, first_text, is_obsolete_raw, iter_xml_files, parse_files, parse_until_text_end, write_jsonl
+except ImportError:
+    from xml_utils import HEAD_BYTES, first_text, is_obsolete_raw, iter_xml_files, parse_files, parse_until_text_end, write_jsonl
+
 
 class CodeTravailParser:
     """Parse Code du travail XML articles and filter obsolete ones."""
 
+    # Compiled once, evaluated on every article
+    _XP_ID = etree.XPath('.//ID')
+    _XP_NUM = etree.XPath('.//NUM')
+    _XP_ETAT = etree.XPath('.//ETAT')
+    _XP_DATE_DEBUT = etree.XPath('.//DATE_DEBUT')
+    _XP_DATE_FIN = etree.XPath('.//DATE_FIN')
+    _XP_CONTENU = etree.XPath('.//BLOC_TEXTUEL/CONTENU')
+    _XP_CONTEXTE = etree.XPath('.//CONTEXTE')
+    _XP_TITRE_TM = etree.XPath('.//TITRE_TM')
+
     def __init__(self, articles_dir: Path, section_mapping: Optional[Dict[str, str]] = None):
         """
         Initialize parser with path to articles directory.
@@ -38,21 +55,24 @@ class CodeTravailParser:
         - hierarchy: Structural context (partie, livre, titre, chapitre)
         """
         try:
-            tree = ET.parse(xml_path)
-            root = tree.getroot()
+            with open(xml_path, 'rb') as f:
+                head = f.read(HEAD_BYTES)
+                if is_obsolete_raw(head):
+                    return None
+                root = parse_until_text_end(head + f.read())
 
             # Extract basic metadata
-            article_id = root.find('.//ID').text if root.find('.//ID') is not None else None
-            article_num = root.find('.//NUM').text if root.find('.//NUM') is not None else None
-            etat = root.find('.//ETAT').text if root.find('.//ETAT') is not None else None
+            article_id = first_text(self._XP_ID, root)
+            article_num = first_text(self._XP_NUM, root)
+            etat = first_text(self._XP_ETAT, root)
 
             # Filter out obsolete articles
             if etat == "ABROGE":
                 return None
 
             # Extract dates
-            date_debut = root.find('.//DATE_DEBUT').text if root.find('.//DATE_DEBUT') is not None else None
-            date_fin = root.find('.//DATE_FIN').text if root.find('.//DATE_FIN') is not None else None
+            date_debut = first_text(self._XP_DATE_DEBUT, root)
+            date_fin = first_text(self._XP_DATE_FIN, root)
 
             # Filter out historical versions - keep only currently valid articles
             # date_fin = "2999-01-01" means "currently valid, no end date"
@@ -61,11 +81,10 @@ class CodeTravailParser:
 
             # Extract article text
             text_content = ""
-            bloc_textuel = root.find('.//BLOC_TEXTUEL/CONTENU')
-            if bloc_textuel is not None:
+            bloc_textuel = self._XP_CONTENU(root)
+            if bloc_textuel:
                 # Get all text content, stripping HTML tags
-                text_content = ET.tostring(bloc_textuel, encoding='unicode', method='text')
-                text_content = text_content.strip()
+                text_content = etree.tostring(bloc_textuel[0], encoding='unicode', method='text').strip()
 
             # Extract hierarchical context
             hierarchy = self._extract_hierarchy(root)
@@ -94,12 +113,12 @@ class CodeTravailParser:
         """Extract hierarchical structure from CONTEXTE section."""
         hierarchy = {}
 
-        contexte = root.find('.//CONTEXTE')
-        if contexte is None:
+        contexte = self._XP_CONTEXTE(root)
+        if not contexte:
             return hierarchy
 
         # Look for nested TITRE_TM elements (they represent: Partie, Livre, Titre, Chapitre, Section)
-        titre_elements = contexte.findall('.//TITRE_TM')
+        titre_elements = self._XP_TITRE_TM(contexte[0])
 
         for i, titre in enumerate(titre_elements):
             level_name = f"level_{i}"
@@ -121,12 +140,13 @@ class CodeTravailParser:
 
         return hierarchy
 
-    def parse_all_articles(self, output_path: Optional[Path] = None) -> list[Dict[str, Any]]:
+    def parse_all_articles(self, output_path: Optional[Path] = None, max_workers: Optional[int] = None) -> list[Dict[str, Any]]:
         """
         Parse all article XML files and filter obsolete ones.
 
         Args:
             output_path: If provided, save results as JSONL to this path
+            max_workers: Parsing processes (defaults to one per CPU)
 
         Returns:
             List of valid (non-obsolete) articles
@@ -136,18 +156,17 @@ class CodeTravailParser:
         error_count = 0
 
         # Find all XML files in articles directory
-        xml_files = list(self.articles_dir.rglob("*.xml"))
+        xml_files = list(iter_xml_files(self.articles_dir))
         total_files = len(xml_files)
 
         print(f"Found {total_files} article XML files")
         print("Parsing articles...")
 
-        for i, xml_file in enumerate(xml_files):
+        # Files are independent: parse them across processes, in input order
+        for i, article in enumerate(parse_files(self, xml_files, max_workers)):
             if (i + 1) % 5000 == 0:
                 print(f"Processed {i + 1}/{total_files} files...")
 
-            article = self.parse_article(xml_file)
-
             if article is None:
                 obsolete_count += 1
             elif article:
@@ -165,9 +184,7 @@ class CodeTravailParser:
             output_path = Path(output_path)
             output_path.parent.mkdir(parents=True, exist_ok=True)
 
-            with open(output_path, 'w', encoding='utf-8') as f:
-                for article in all_articles:
-                    f.write(json.dumps(article, ensure_ascii=False) + '\n')
+            write_jsonl(all_articles, output_path)
 
             print(f"Saved to {output_path}")
 
@@ -3,11 +3,19 @@ Parser for KALI corpus (conventions collectives).
 Extracts articles from top 10 conventions by IDCC code.
 """
 
-import xml.etree.ElementTree as ET
+import re
 from pathlib import Path
 from typing import Optional, Dict, List, Any
 import json
 
+from lxml import etree
+
+# Relative when imported as parsers.*, plain when this file is run directly
+try:
+    from .xml_utils import HEAD_BYTES, first_text, is_obsolete_raw, iter_xml_files, parse_files, parse_until_text_end, write_jsonl
+except ImportError:
+    from xml_utils import HEAD_BYTES, first_text, is_obsolete_raw, iter_xml_files, parse_files, parse_until_text_end, write_jsonl
+
 
 # Top 10 conventions collectives by sector importance
 TOP_10_CONVENTIONS = {
@@ -23,10 +31,27 @@ TOP_10_CONVENTIONS = {
     "0573": "Commerces de gros"
 }
 
+# ETAT values that mark a KALI article as no longer in force
+_OBSOLETE_STATES = (b'ABROGE', b'PERIME')
+
+# Opening tag of the first CONTENEUR with nature="IDCC", whatever the attribute order
+_RAW_IDCC_CONTENEUR = re.compile(rb'<CONTENEUR\b(?=[^>]*\snature="IDCC")[^>]*>')
+
 
 class KaliParser:
     """Parse KALI articles from top 10 conventions collectives."""
 
+    # Compiled once, evaluated on every article
+    _XP_ID = etree.XPath('.//ID')
+    _XP_NUM = etree.XPath('.//NUM')
+    _XP_ETAT = etree.XPath('.//ETAT')
+    _XP_DATE_DEBUT = etree.XPath('.//DATE_DEBUT')
+    _XP_DATE_FIN = etree.XPath('.//DATE_FIN')
+    _XP_CONTENU = etree.XPath('.//BLOC_TEXTUEL/CONTENU')
+    _XP_TITRE_TXT = etree.XPath('(.//CONTEXTE/TEXTE)[1]//TITRE_TXT')
+    _XP_CONTEXTE = etree.XPath('.//CONTEXTE')
+    _XP_TITRE_TM = etree.XPath('.//TITRE_TM')
+
     def __init__(self, articles_dir: Path, section_mapping: Optional[Dict[str, str]] = None):
         """
         Initialize parser with path to articles directory.
@@ -38,6 +63,10 @@ class KaliParser:
         self.articles_dir = Path(articles_dir)
         self.section_mapping = section_mapping or {}
         self.target_idcc = set(TOP_10_CONVENTIONS.keys())
+        # One alternation over the target codes, matched inside the IDCC CONTENEUR tag
+        self._idcc_re = re.compile(
+            ('\\snum="(' + '|'.join(map(re.escape, sorted(self.target_idcc))) + ')"').encode()
+        )
 
     def parse_article(self, xml_path: Path) -> Optional[Dict[str, Any]]:
         """
@@ -46,33 +75,37 @@ class KaliParser:
         Returns None if article doesn't belong to target conventions or is obsolete.
         """
         try:
-            tree = ET.parse(xml_path)
-            root = tree.getroot()
-
-            # Extract IDCC number from CONTENEUR to filter conventions
-            conteneur = root.find('.//CONTENEUR[@nature="IDCC"]')
-            if conteneur is None:
+            with open(xml_path, 'rb') as f:
+                head = f.read(HEAD_BYTES)
+                if is_obsolete_raw(head, _OBSOLETE_STATES):
+                    return None
+                data = head + f.read()
+
+            # Filter conventions on the raw IDCC CONTENEUR tag: most files are
+            # rejected here without building a tree
+            conteneur = _RAW_IDCC_CONTENEUR.search(data)
+            idcc = self._idcc_re.search(conteneur.group()) if conteneur else None
+            if idcc is None:
                 return None
+            idcc_num = idcc.group(1).decode()
 
-            idcc_num = conteneur.get('num')
-            if not idcc_num or idcc_num not in self.target_idcc:
-                return None
+            root = parse_until_text_end(data)
 
             # Get convention name
             convention_name = TOP_10_CONVENTIONS.get(idcc_num, f"IDCC {idcc_num}")
 
             # Extract basic metadata
-            article_id = root.find('.//ID').text if root.find('.//ID') is not None else None
-            article_num = root.find('.//NUM').text if root.find('.//NUM') is not None else None
-            etat = root.find('.//ETAT').text if root.find('.//ETAT') is not None else None
+            article_id = first_text(self._XP_ID, root)
+            article_num = first_text(self._XP_NUM, root)
+            etat = first_text(self._XP_ETAT, root)
 
             # Filter out obsolete articles (similar states as Code du travail)
             if etat in ["ABROGE", "PERIME"]:
                 return None
 
             # Extract dates
-            date_debut = root.find('.//DATE_DEBUT').text if root.find('.//DATE_DEBUT') is not None else None
-            date_fin = root.find('.//DATE_FIN').text if root.find('.//DATE_FIN') is not None else None
+            date_debut = first_text(self._XP_DATE_DEBUT, root)
+            date_fin = first_text(self._XP_DATE_FIN, root)
 
             # Filter out historical versions - keep only currently valid articles
             if date_fin and date_fin != "2999-01-01":
@@ -80,21 +113,15 @@ class KaliParser:
 
             # Extract article text
             text_content = ""
-            bloc_textuel = root.find('.//BLOC_TEXTUEL/CONTENU')
-            if bloc_textuel is not None:
-                text_content = ET.tostring(bloc_textuel, encoding='unicode', method='text')
-                text_content = text_content.strip()
+            bloc_textuel = self._XP_CONTENU(root)
+            if bloc_textuel:
+                text_content = etree.tostring(bloc_textuel[0], encoding='unicode', method='text').strip()
 
             # Extract hierarchical context (similar to Code du travail)
             hierarchy = self._extract_hierarchy(root)
 
             # Get convention title from CONTEXTE/TEXTE
-            convention_title = None
-            texte = root.find('.//CONTEXTE/TEXTE')
-            if texte is not None:
-                titre_txt = texte.find('.//TITRE_TXT')
-                if titre_txt is not None:
-                    convention_title = titre_txt.text
+            convention_title = first_text(self._XP_TITRE_TXT, root)
 
             # Add section title if available
             section_title = self.section_mapping.get(article_id, None)
@@ -123,12 +150,12 @@ class KaliParser:
         """Extract hierarchical structure from CONTEXTE section."""
         hierarchy = {}
 
-        contexte = root.find('.//CONTEXTE')
-        if contexte is None:
+        contexte = self._XP_CONTEXTE(root)
+        if not contexte:
             return hierarchy
 
         # KALI uses TITRE_TM elements for structure
-        titre_elements = contexte.findall('.//TITRE_TM')
+        titre_elements = self._XP_TITRE_TM(contexte[0])
 
         for i, titre in enumerate(titre_elements):
             if titre.text:
@@ -138,12 +165,13 @@ class KaliParser:
 
         return hierarchy
 
-    def parse_all_articles(self, output_path: Optional[Path] = None) -> List[Dict[str, Any]]:
+    def parse_all_articles(self, output_path: Optional[Path] = None, max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Parse all KALI articles from target conventions.
 
         Args:
             output_path: If provided, save results as JSONL to this path
+            max_workers: Parsing processes (defaults to one per CPU)
 
         Returns:
             List of valid articles from top 10 conventions
@@ -154,19 +182,18 @@ class KaliParser:
         idcc_counts = {idcc: 0 for idcc in self.target_idcc}
 
         # Find all XML files
-        xml_files = list(self.articles_dir.rglob("*.xml"))
+        xml_files = list(iter_xml_files(self.articles_dir))
         total_files = len(xml_files)
 
         print(f"Found {total_files} KALI article XML files")
         print(f"Filtering for top 10 conventions: {', '.join(TOP_10_CONVENTIONS.keys())}")
         print("Parsing articles...")
 
-        for i, xml_file in enumerate(xml_files):
+        # Files are independent: parse them across processes, in input order
+        for i, article in enumerate(parse_files(self, xml_files, max_workers)):
             if (i + 1) % 10000 == 0:
                 print(f"Processed {i + 1}/{total_files} files...")
 
-            article = self.parse_article(xml_file)
-
             if article is None:
                 filtered_count += 1
             elif article:
@@ -191,9 +218,7 @@ class KaliParser:
             output_path = Path(output_path)
             output_path.parent.mkdir(parents=True, exist_ok=True)
 
-            with open(output_path, 'w', encoding='utf-8') as f:
-                for article in all_articles:
-                    f.write(json.dumps(article, ensure_ascii=False) + '\n')
+            write_jsonl(all_articles, output_path)
 
             print(f"\nSaved to {output_path}")
 
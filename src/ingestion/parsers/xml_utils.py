@@ -0,0 +1,111 @@
+"""
+XML helpers shared by the Legifrance article parsers (Code du travail, KALI).
+"""
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Tuple
+
+import orjson
+from lxml import etree
+
+# Comments and processing instructions are dropped, as ElementTree does
+XML_PARSER = etree.XMLParser(remove_comments=True, remove_pis=True)
+
+
+def first_text(xpath: etree.XPath, root) -> Optional[str]:
+    """Text of the first element matched by a compiled XPath, or None."""
+    nodes = xpath(root)
+    return nodes[0].text if nodes else None
+
+
+def iter_xml_files(directory: str) -> Iterator[str]:
+    """
+    Paths of the .xml files under directory, as strings.
+
+    Walks with os.scandir in the same order as Path.rglob (a directory's own
+    files, then its subdirectories depth-first) without building Path objects.
+    """
+    with os.scandir(directory) as it:
+        entries = list(it)
+    for entry in entries:
+        if entry.name.endswith('.xml') and entry.is_file():
+            yield entry.path
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from iter_xml_files(entry.path)
+
+
+# Everything parse_article reads (META, CONTEXTE, the article text) comes
+# before this tag; what follows (LIENS, ...) is never built
+_TEXT_END = b'</BLOC_TEXTUEL>'
+
+
+def parse_until_text_end(data: bytes):
+    """Root element of the article, with the tree built only up to the end of BLOC_TEXTUEL."""
+    end = data.find(_TEXT_END)
+    if end == -1:
+        return etree.fromstring(data, XML_PARSER)
+    parser = etree.XMLPullParser(events=('start',), remove_comments=True, remove_pis=True)
+    parser.feed(data[:end + len(_TEXT_END)])
+    return next(parser.read_events())[1]
+
+
+# ETAT and DATE_FIN sit in META, at the top of the file: their first
+# occurrence in the raw head is enough to drop an obsolete article unparsed
+HEAD_BYTES = 4096
+_RAW_ETAT = re.compile(rb'<ETAT>([^<]*)</ETAT>')
+_RAW_DATE_FIN = re.compile(rb'<DATE_FIN>([^<]*)</DATE_FIN>')
+
+
+def is_obsolete_raw(head: bytes, obsolete_states: Tuple[bytes, ...] = (b'ABROGE',)) -> bool:
+    """Same ETAT / DATE_FIN filter as the parsers' parse_article, on the undecoded file head."""
+    etat = _RAW_ETAT.search(head)
+    if etat and etat.group(1) in obsolete_states:
+        return True
+    date_fin = _RAW_DATE_FIN.search(head)
+    return bool(date_fin and date_fin.group(1) and date_fin.group(1) != b'2999-01-01')
+
+
+# JSONL output is written in blocks of about this size
+WRITE_BUFFER_BYTES = 4 << 20
+
+
+def write_jsonl(records: Iterable[Dict[str, Any]], output_path: Path) -> None:
+    """Write records as JSONL, serialized with orjson and written in large blocks."""
+    with open(output_path, 'wb') as f:
+        buf = bytearray()
+        for record in records:
+            buf += orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+            if len(buf) >= WRITE_BUFFER_BYTES:
+                f.write(buf)
+                buf.clear()
+        f.write(buf)
+
+
+def parse_files(parser, xml_files: List[str], max_workers: Optional[int] = None) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    parser.parse_article over xml_files across processes, yielded in input order.
+
+    Files are independent; the parser is sent once per worker process (see
+    _init_worker) and results come back in chunks of 256 files.
+    """
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                             initializer=_init_worker, initargs=(parser,)) as pool:
+        yield from pool.map(_parse_one, xml_files, chunksize=256)
+
+
+# Set once per worker process by the pool initializer, so the section mapping
+# is pickled per process rather than per file
+_worker_parser = None
+
+
+def _init_worker(parser) -> None:
+    global _worker_parser
+    _worker_parser = parser
+
+
+def _parse_one(xml_path: str) -> Optional[Dict[str, Any]]:
+    return _worker_parser.parse_article(xml_path)
@@ -2,18 +2,21 @@
 FastHTML web UI for testing retrieval pipeline with answer generation.
 """
 
+import asyncio
 import logging
 import os
+from urllib.parse import urlencode
 from fasthtml.common import *
-from src.retrieval.retrieve import retrieve
+from src.retrieval.retrieve import retrieve, encode_query, get_embedder, warm_document_stores
 from src.agents.routing_agent import get_routing_agent
 from src.agents.multi_retriever import retrieve_with_routing
 from src.agents.answer_generator import get_answer_generator
 from src.config.constants import API_STAGE
+from src.config.clients import close_llm_clients
 
 # Configure logging
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.getenv("LOG_LEVEL", "INFO"),  # e.g. WARNING in production
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
@@ -22,7 +25,30 @@ logger = logging.getLogger(__name__)
 root_path = f"/{API_STAGE}" if API_STAGE else ""
 print(f"INFO: Application starting with root_path: '{root_path}'")
 
-app, rt = fast_app()
+
+
+async def warm_qdrant():
+    """Open the Qdrant connections at startup instead of on the first query."""
+    try:
+        await asyncio.to_thread(warm_document_stores, ["code_travail", "kali"])
+    except Exception as e:
+        logger.warning(f"Qdrant warm-up failed, connecting on first query: {e}")
+
+
+async def save_answer_cache():
+    """Persist the semantic answer cache on shutdown (it is otherwise saved on a timer)."""
+    await get_answer_generator().save_cache()
+
+
+# htmx SSE extension (sse-close needs >= 2.2), pinned to an exact version.
+# SRI hash of that file, e.g.:
+#   curl -s <SSE_SCRIPT_URL> | openssl dgst -sha384 -binary | openssl base64 -A
+SSE_SCRIPT_URL = "https://unpkg.com/htmx-ext-sse@2.2.3/sse.js"
+SSE_SCRIPT_INTEGRITY = os.getenv("SSE_SCRIPT_INTEGRITY")  # "sha384-..."
+SSE_SCRIPT = (Script(src=SSE_SCRIPT_URL, integrity=SSE_SCRIPT_INTEGRITY, crossorigin="anonymous")
+              if SSE_SCRIPT_INTEGRITY else Script(src=SSE_SCRIPT_URL, crossorigin="anonymous"))
+
+app, rt = fast_app(hdrs=(SSE_SCRIPT,), on_startup=[warm_qdrant], on_shutdown=[save_answer_cache, close_llm_clients])
 
 
 def format_metadata(meta):
@@ -77,19 +103,28 @@ def result_card(result, rank, highlighted=False):
     )
 
 
+ANSWER_STYLE = "background: #f9f9f9; padding: 20px; border-left: 4px solid #007bff; margin-bottom: 24px; border-radius: 4px;"
+ANSWER_TEXT_STYLE = "font-size: 16px; line-height: 1.6; color: #333; margin-bottom: 12px;"
+
+
 def answer_section(answer):
     """Display generated answer with reasoning."""
     return Div(
         H2("Réponse"),
-        P(answer.answer, style="font-size: 16px; line-height: 1.6; color: #333; margin-bottom: 12px;"),
+        P(answer.answer, style=ANSWER_TEXT_STYLE),
         P(
             f"Raisonnement: {answer.reasoning}",
             style="color: #666; font-size: 14px; font-style: italic;"
         ),
-        style="background: #f9f9f9; padding: 20px; border-left: 4px solid #007bff; margin-bottom: 24px; border-radius: 4px;"
+        style=ANSWER_STYLE
     )
 
 
+def partial_answer_section(text):
+    """Display the answer text while it is being generated."""
+    return Div(H2("Réponse"), P(text, style=ANSWER_TEXT_STYLE), style=ANSWER_STYLE)
+
+
 def confidence_badge(confidence):
     """Display confidence score with color coding."""
     if confidence >= 0.8:
@@ -185,76 +220,109 @@ def get():
     )
 
 
+def sources_section(query, decision, results, citation_indices=()):
+    """Routing info and retrieved sources, highlighting the cited ones."""
+    routing_info = f"Strategy: {decision.strategy}"
+    if decision.idcc:
+        routing_info += f" | Convention: IDCC {decision.idcc}"
+
+    return Div(
+        # Query and routing info
+        P(f"Requête: \"{query}\"", style="color: #666; margin-bottom: 4px; font-size: 0.9em;"),
+        P(f"Décision agent: {routing_info}", style="color: #0066cc; margin-bottom: 16px; font-size: 0.9em;"),
+
+        # Sources header
+        H3(f"Sources ({len(results)} résultats)"),
+
+        # Results with citation highlighting
+        *[
+            result_card(
+                r, i,
+                highlighted=(i - 1) in citation_indices
+            )
+            for i, r in enumerate(results, 1)
+        ]
+    )
+
+
 @rt(f"{root_path}/search")
 def post(query: str, top_k: int = 10):
-    """Handle search request with intelligent routing."""
-    logger.info(f"\n{'='*80}\nWEB UI /search REQUEST\n{'='*80}")
-    logger.info(f"Query: \"{query}\" | Top-K: {top_k}")
+    """Open the answer stream for a search request."""
     if not query or not query.strip():
         return Div(
             P("Please enter a search query.", style="color: red;"),
             style="padding: 16px;"
         )
 
+    # The browser closes the stream on the "done" event (it would reconnect,
+    # re-running the search, otherwise)
+    return Div(
+        Div(id="answer", sse_swap="answer"),
+        Div(id="sources", sse_swap="sources"),
+        hx_ext="sse",
+        sse_connect=f"{root_path}/search/stream?{urlencode({'query': query.strip(), 'top_k': top_k})}",
+        sse_close="done",
+    )
+
+
+@rt(f"{root_path}/search/stream")
+async def get(query: str, top_k: int = 10):
+    """Stream a search as server-sent events: sources first, then the answer as it is generated."""
+    return EventStream(search_events(query.strip(), int(top_k)))
+
+
+async def search_events(query: str, top_k: int):
+    """Route, retrieve and generate, yielding "sources" / "answer" / "done" events."""
+    logger.info("/search request: query=%r top_k=%d", query, top_k)
+
     try:
         # Step 1: Route query
         routing_agent = get_routing_agent()
-        decision = routing_agent.route(query.strip())
+        decision = await routing_agent.route(query)
 
-        logger.info(f"Routing decision: {decision}")
+        logger.info("Routing decision: %s", decision)
 
-        # Step 2: Retrieve from routed collections
-        results = retrieve_with_routing(query.strip(), decision, top_k=int(top_k))
+        # Step 2: Retrieve from routed collections (queried concurrently). The query
+        # is encoded once, for every collection and for the answer cache
+        query_embedding = await asyncio.to_thread(encode_query, query, get_embedder())
+        results = await retrieve_with_routing(query, decision, top_k=top_k,
+                                              query_vector=query_embedding)
 
         if not results:
-            return Div(
+            yield sse_message(Div(
                 H3("No results found"),
                 P(f"No matches for: \"{query}\"", style="color: #666;"),
                 style="padding: 16px;"
-            )
+            ), event="answer")
+            yield sse_message("", event="done")
+            return
 
-        # Step 3: Generate answer from retrieved context
-        answer_gen = get_answer_generator()
-        answer = answer_gen.generate(query.strip(), results)
+        # Sources are shown while the answer is being generated
+        yield sse_message(sources_section(query, decision, results), event="sources")
 
-        # Step 4: Format results with routing info
-        routing_info = f"Strategy: {decision.strategy}"
-        if decision.idcc:
-            routing_info += f" | Convention: IDCC {decision.idcc}"
+        # Step 3: Stream the answer from retrieved context (a near-duplicate earlier
+        # question with the same routing reuses its answer)
+        answer_gen = get_answer_generator()
+        async for answer in answer_gen.stream(query, results, decision=decision,
+                                              query_embedding=query_embedding):
+            if isinstance(answer, str):
+                yield sse_message(partial_answer_section(answer), event="answer")
 
-        logger.info(f"\n✅ FINAL RESULT: {len(results)} results returned with answer")
-        logger.info(f"{'='*80}\n")
+        # Step 4: Final answer with confidence, and cited sources highlighted
+        yield sse_message(Div(answer_section(answer), confidence_badge(answer.confidence)), event="answer")
+        yield sse_message(sources_section(query, decision, results, answer.citation_indices), event="sources")
 
-        # Build response with answer + sources
-        return Div(
-            # Answer section
-            answer_section(answer),
-            confidence_badge(answer.confidence),
-
-            # Query and routing info
-            P(f"Requête: \"{query}\"", style="color: #666; margin-bottom: 4px; font-size: 0.9em;"),
-            P(f"Décision agent: {routing_info}", style="color: #0066cc; margin-bottom: 16px; font-size: 0.9em;"),
-
-            # Sources header
-            H3(f"Sources ({len(results)} résultats)"),
-
-            # Results with citation highlighting
-            *[
-                result_card(
-                    r, i,
-                    highlighted=(i - 1) in answer.citation_indices
-                )
-                for i, r in enumerate(results, 1)
-            ]
-        )
+        logger.info("✅ FINAL RESULT: %d results returned with answer", len(results))
 
     except Exception as e:
-        logger.error(f"Search failed: {e}", exc_info=True)
-        return Div(
+        logger.error("Search failed: %s", e, exc_info=True)
+        yield sse_message(Div(
             H3("Error", style="color: red;"),
             P(str(e)),
             style="padding: 16px;"
-        )
+        ), event="answer")
+
+    yield sse_message("", event="done")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,32 @@
+"""
+Naming and loading of the embedding sidecars written next to a chunks JSONL.
+
+scripts/embed_chunks.py writes X_embeddings.f16.npy (plus its hashes/meta
+files) for X_chunks.jsonl; the ingest scripts read it back. Kept free of
+heavy imports (numpy only): it is uploaded to the vast.ai instance with
+embed_chunks.py.
+"""
+
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+
+def sidecar_path(jsonl_path: Path, suffix: str) -> Path:
+    """Sidecar file of a chunks JSONL (x_chunks.jsonl -> x_<suffix>)."""
+    prefix = jsonl_path.stem.removesuffix('_chunks')
+    return jsonl_path.with_name(f"{prefix}_{suffix}")
+
+
+def embeddings_path(jsonl_path: Path) -> Path:
+    """Float16 embeddings sidecar, one row per chunk (x_chunks.jsonl -> x_embeddings.f16.npy)."""
+    return sidecar_path(jsonl_path, "embeddings.f16.npy")
+
+
+def load_embeddings(jsonl_path: Path) -> Optional[np.ndarray]:
+    """Memory-map the float16 embeddings sidecar of a chunks JSONL, if present."""
+    npy_path = embeddings_path(jsonl_path)
+    if not npy_path.exists():
+        return None
+    return np.load(npy_path, mmap_mode='r')
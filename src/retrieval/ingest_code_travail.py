@@ -10,6 +10,7 @@ Supports both local Qdrant and Qdrant Cloud (configured via .env file)
 """
 
 import json
+import numpy as np
 import torch
 from pathlib import Path
 from typing import List, Dict
@@ -21,6 +22,7 @@ from haystack.components.writers import DocumentWriter
 from haystack.utils.device import ComponentDevice
 from haystack_integrations.document_stores.qdrant import QdrantDocumentStore
 from src.config.constants import QDRANT_CONFIG
+from src.retrieval.embedding_sidecars import load_embeddings
 
 
 def load_chunks(jsonl_path: Path) -> tuple[List[Document], bool]:
@@ -32,14 +34,17 @@ def load_chunks(jsonl_path: Path) -> tuple[List[Document], bool]:
     """
     documents = []
     has_embeddings = False
+    embeddings = load_embeddings(jsonl_path)
 
     with open(jsonl_path, 'r', encoding='utf-8') as f:
         for line_num, line in enumerate(f, 1):
             try:
                 chunk = json.loads(line)
 
-                # Check if embeddings are present
+                # Check if embeddings are present (sidecar .npy row, or legacy inline list)
                 embedding = chunk.get('embedding')
+                if embedding is None and embeddings is not None and 'row_index' in chunk:
+                    embedding = embeddings[chunk['row_index']].astype(np.float32).tolist()
                 if line_num == 1:
                     has_embeddings = embedding is not None
                     if has_embeddings:
@@ -80,18 +85,18 @@ def load_chunks(jsonl_path: Path) -> tuple[List[Document], bool]:
 def create_qdrant_store(collection_name: str, embedding_dim: int = 1024) -> QdrantDocumentStore:
     """Create and configure Qdrant document store (local or cloud)."""
     config = QDRANT_CONFIG
-    qdrant_type = config.get("type", "local")
+    qdrant_type = config.type
 
     if qdrant_type == "cloud":
-        conn_config = config["cloud"]
-        url = conn_config["url"]
-        api_key = conn_config["api_key"]
+        conn_config = config.cloud
+        url = conn_config.url
+        api_key = conn_config.api_key
         print(f"Using Qdrant Cloud: {url}")
         # Wrap API key in Secret for cloud
         api_key_secret = Secret.from_token(api_key) if api_key else None
     else:
-        conn_config = config["local"]
-        url = conn_config["url"]
+        conn_config = config.local
+        url = conn_config.url
         api_key_secret = None  # No API key needed for local
         print(f"Using Local Qdrant: {url}")
 
@@ -212,8 +217,7 @@ def main():
     print("\n" + "="*80)
     print("Ingestion Complete!")
     print("="*80)
-    config = load_qdrant_config()
-    qdrant_url = config[config.get("type", "local")]["url"]
+    qdrant_url = QDRANT_CONFIG.connection.url
     print(f"Collection: code_travail")
     print(f"Documents indexed: {len(documents)}")
     print(f"Embedding model: BAAI/bge-m3 (1024 dims)")
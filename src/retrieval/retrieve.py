@@ -11,6 +11,8 @@ This script:
 """
 
 import json
+import logging
+import threading
 from pathlib import Path
 from typing import List, Dict, Optional
 from qdrant_client.models import Filter, FieldCondition, MatchValue
@@ -22,16 +24,23 @@ from optimum.onnxruntime import ORTModelForCustomTasks
 from transformers import AutoTokenizer
 from src.config.constants import QDRANT_CONFIG
 
+logger = logging.getLogger(__name__)
 
 # Global document stores and embedder (cached after first load)
 _document_stores = {}
 _embedder = None
+# Collections are queried from concurrent threads: load the model once, and
+# serialize encoding (fast tokenizers raise "Already borrowed" when shared)
+_embedder_lock = threading.Lock()
+_encode_lock = threading.Lock()
 
 
 def get_embedder():
     """Get or initialize the BGE-M3 ONNX int8 quantized embedder (700MB, 60ms latency)."""
     global _embedder
-    if _embedder is None:
+    with _embedder_lock:
+        if _embedder is not None:
+            return _embedder
         print("Loading BGE-M3 ONNX int8 quantized model (first load only)...")
         _embedder = {
             # Load model and tokenizer from the local paths defined in the Dockerfile
@@ -41,7 +50,7 @@ def get_embedder():
             ),
             "tokenizer": AutoTokenizer.from_pretrained("/app/tokenizer"),
         }
-    return _embedder
+        return _embedder
 
 
 def encode_query(query: str, embedder: dict) -> list:
@@ -52,17 +61,15 @@ def encode_query(query: str, embedder: dict) -> list:
     - sparse_vecs: Sparse embeddings (for hybrid search)
     - colbert_vecs: ColBERT-style embeddings
     """
-    import logging
-    logger = logging.getLogger(__name__)
-
     try:
-        inputs = embedder["tokenizer"]([query], padding=True, truncation=True, return_tensors="np")
-        outputs = embedder["model"](**inputs)
+        with _encode_lock:
+            inputs = embedder["tokenizer"]([query], padding=True, truncation=True, return_tensors="np")
+            outputs = embedder["model"](**inputs)
 
         # BGE-M3 ONNX model outputs dense_vecs directly
         if isinstance(outputs, dict) and 'dense_vecs' in outputs:
             embedding = outputs['dense_vecs'][0]  # First (and only) item in batch
-            logger.debug(f"Encoded query to {len(embedding)}-dim embedding")
+            logger.debug("Encoded query to %d-dim embedding", len(embedding))
             return embedding.tolist()
         else:
             available_keys = outputs.keys() if isinstance(outputs, dict) else type(outputs)
@@ -70,7 +77,7 @@ def encode_query(query: str, embedder: dict) -> list:
             logger.error(error_msg)
             raise ValueError(error_msg)
     except Exception as e:
-        logger.error(f"Failed to encode query: {e}", exc_info=True)
+        logger.error("Failed to encode query: %s", e, exc_info=True)
         raise
 
 
@@ -81,18 +88,18 @@ def get_document_store(collection_name: str) -> QdrantDocumentStore:
 
     # Get config from environment
     config = QDRANT_CONFIG
-    qdrant_type = config.get("type", "local")
+    qdrant_type = config.type
 
     if qdrant_type == "cloud":
-        conn_config = config["cloud"]
-        url = conn_config["url"]
-        api_key = conn_config["api_key"]
+        conn_config = config.cloud
+        url = conn_config.url
+        api_key = conn_config.api_key
         print(f"Connecting to Qdrant Cloud: {url}")
         # Wrap API key in Secret for cloud
         api_key_secret = Secret.from_token(api_key) if api_key else None
     else:
-        conn_config = config["local"]
-        url = conn_config["url"]
+        conn_config = config.local
+        url = conn_config.url
         api_key_secret = None  # No API key needed for local
         print(f"Connecting to Local Qdrant: {url}")
 
@@ -103,12 +110,21 @@ def get_document_store(collection_name: str) -> QdrantDocumentStore:
         index=collection_name,
         embedding_dim=1024,  # BGE-M3 dimension
         return_embedding=True,
+        prefer_grpc=config.prefer_grpc,
+        timeout=config.timeout,
     )
 
     _document_stores[collection_name] = document_store
     return document_store
 
 
+def warm_document_stores(collection_names: List[str]) -> None:
+    """Open the Qdrant connections ahead of the first query (the client is created lazily)."""
+    for collection_name in collection_names:
+        document_store = get_document_store(collection_name)
+        print(f"Warmed Qdrant connection for {collection_name}: {document_store.count_documents()} documents")
+
+
 def build_retrieval_pipeline(document_store: QdrantDocumentStore) -> Pipeline:
     """Build Haystack semantic search retrieval pipeline."""
 
@@ -130,6 +146,7 @@ def retrieve(
     collection_name: str = "code_travail",
     top_k: int = 10,
     filters: Optional[Dict] = None,
+    query_vector: Optional[List[float]] = None,
 ) -> List[Dict]:
     """
     Retrieve relevant chunks for a query using semantic search with embeddings.
@@ -139,30 +156,23 @@ def retrieve(
         collection_name: Collection to search ('code_travail' or 'kali')
         top_k: Number of results to return
         filters: Optional metadata filters
+        query_vector: Precomputed query embedding (skips encoding, e.g. when the
+            same query is run against several collections)
 
     Returns:
         List of result dictionaries with content, metadata, and similarity scores
     """
-    # Get document store and embedder
+    # Get document store
     document_store = get_document_store(collection_name)
-    embedder = get_embedder()
 
     # Build pipeline
     pipeline, _ = build_retrieval_pipeline(document_store)
 
     # Encode query
-    print(f"\nQuerying collection: {collection_name}")
-    print(f"Query: {query}")
-    print(f"Top-k: {top_k}")
-    print(f"Filters: {filters}")
-    print(f"Method: Semantic search (BGE-M3 ONNX int8 embeddings)")
-
-    query_embedding = encode_query(query, embedder)
+    logger.debug("Querying collection %s: query=%r top_k=%d filters=%s", collection_name, query, top_k, filters)
+    query_embedding = query_vector if query_vector is not None else encode_query(query, get_embedder())
 
     # Run retrieval
-    import logging
-    logger = logging.getLogger(__name__)
-    logger.info(f"DEBUG: Running retrieval with filters={filters}")
     result = pipeline.run({
         "retriever": {"query_embedding": query_embedding, "top_k": top_k, "filters": filters}
     })
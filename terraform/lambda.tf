@@ -28,6 +28,8 @@ resource "aws_lambda_function" "main" {
       LLM_PROVIDER           = var.llm_provider
       OPENAI_API_KEY         = var.openai_api_key
       OPENAI_MODEL           = var.openai_model
+      SSE_SCRIPT_INTEGRITY   = var.sse_script_integrity
+      AWS_LWA_INVOKE_MODE    = "response_stream"  # Lambda Web Adapter forwards the SSE body as it is written
     }
   }
 }
@@ -54,6 +56,7 @@ resource "aws_lambda_permission" "function_url_invoke_function" {
 resource "aws_lambda_function_url" "main" {
   function_name      = aws_lambda_function.main.function_name
   authorization_type = "NONE"  # Public access without authentication
+  invoke_mode        = "RESPONSE_STREAM"  # /search/stream is SSE; BUFFERED would hold events until the end
 
   depends_on = [
     aws_lambda_permission.function_url_invoke_url,
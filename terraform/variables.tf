@@ -54,3 +54,9 @@ variable "openai_model" {
   type        = string
   default     = "gpt-4o-mini"
 }
+
+variable "sse_script_integrity" {
+  description = "SRI hash (sha384-...) of the pinned htmx-ext-sse script; empty disables the check"
+  type        = string
+  default     = ""
+}
@@ -0,0 +1,170 @@
+"""Tests for the semantic answer cache."""
+
+import asyncio
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+from src.agents.answer_cache import SemanticAnswerCache
+from src.agents.answer_generator import AnswerGenerator, AnswerWithCitations
+from src.agents.routing_agent import RoutingDecision
+
+
+def make_result(content: str, collection: str = "code_travail") -> dict:
+    return {"content": content, "metadata": {"article_num": "L1"}, "score": 0.8, "_collection": collection}
+
+
+@pytest.fixture
+def results():
+    return [make_result("Article A"), make_result("Article B"), make_result("Article C", "kali")]
+
+
+@pytest.fixture
+def answer():
+    return AnswerWithCitations(answer="Réponse", confidence=0.8, citation_indices=[1], reasoning="Source B")
+
+
+CODE_ONLY = ("code_only", None)
+
+
+class TestSemanticAnswerCache:
+    """Test SemanticAnswerCache lookups, eviction and persistence."""
+
+    def test_hit_on_similar_embedding(self, results, answer):
+        """Test a near-identical embedding returns the cached answer."""
+        cache = SemanticAnswerCache(AnswerWithCitations)
+        cache.put(CODE_ONLY, [1.0, 0.0, 0.0], answer, results)
+
+        cached = cache.get(CODE_ONLY, [0.99, 0.05, 0.0], results)
+        assert cached is not None
+        assert cached.answer == "Réponse"
+
+    def test_miss_below_threshold(self, results, answer):
+        """Test a dissimilar embedding misses."""
+        cache = SemanticAnswerCache(AnswerWithCitations)
+        cache.put(CODE_ONLY, [1.0, 0.0, 0.0], answer, results)
+
+        assert cache.get(CODE_ONLY, [0.0, 1.0, 0.0], results) is None
+
+    def test_namespaces_do_not_collide(self, results, answer):
+        """Test the same query under another routing decision misses."""
+        cache = SemanticAnswerCache(AnswerWithCitations)
+        cache.put(CODE_ONLY, [1.0, 0.0, 0.0], answer, results)
+
+        assert cache.get(("both_kali_first", "1486"), [1.0, 0.0, 0.0], results) is None
+
+    def test_citations_remapped_to_current_results(self, results, answer):
+        """Test cited sources are re-resolved against the current result order."""
+        cache = SemanticAnswerCache(AnswerWithCitations)
+        cache.put(CODE_ONLY, [1.0, 0.0, 0.0], answer, results)
+
+        reordered = [results[2], results[0], results[1]]
+        cached = cache.get(CODE_ONLY, [1.0, 0.0, 0.0], reordered)
+        assert cached.citation_indices == [2]
+
+    def test_miss_when_cited_source_missing(self, results, answer):
+        """Test a hit is rejected when a cited source is no longer retrieved."""
+        cache = SemanticAnswerCache(AnswerWithCitations)
+        cache.put(CODE_ONLY, [1.0, 0.0, 0.0], answer, results)
+
+        assert cache.get(CODE_ONLY, [1.0, 0.0, 0.0], [results[0], results[2]]) is None
+
+    def test_lru_eviction(self, results, answer):
+        """Test the least recently used entry is overwritten when full."""
+        cache = SemanticAnswerCache(AnswerWithCitations, max_entries=2)
+        cache.put(CODE_ONLY, [1.0, 0.0, 0.0], answer, results)
+        cache.put(CODE_ONLY, [0.0, 1.0, 0.0], answer, results)
+        cache.get(CODE_ONLY, [1.0, 0.0, 0.0], results)  # refresh the first entry
+        cache.put(CODE_ONLY, [0.0, 0.0, 1.0], answer, results)
+
+        assert cache.get(CODE_ONLY, [1.0, 0.0, 0.0], results) is not None
+        assert cache.get(CODE_ONLY, [0.0, 1.0, 0.0], results) is None
+        assert cache.get(CODE_ONLY, [0.0, 0.0, 1.0], results) is not None
+
+    def test_int8_similarity_close_to_cosine(self, results, answer):
+        """Test quantized embeddings keep the cosine within threshold precision."""
+        rng = np.random.default_rng(0)
+        stored = rng.normal(size=1024)
+        query = stored + rng.normal(scale=0.35, size=1024)
+        cosine = stored @ query / (np.linalg.norm(stored) * np.linalg.norm(query))
+
+        cache = SemanticAnswerCache(AnswerWithCitations, threshold=cosine - 0.01)
+        cache.put(CODE_ONLY, stored, answer, results)
+        assert cache._shards[CODE_ONLY].embeddings.dtype == np.int8
+        assert cache.get(CODE_ONLY, query, results) is not None
+
+        cache.threshold = cosine + 0.01
+        assert cache.get(CODE_ONLY, query, results) is None
+
+    def test_save_and_load(self, tmp_path, results, answer):
+        """Test entries survive a save/load round-trip."""
+        cache = SemanticAnswerCache(AnswerWithCitations)
+        cache.put(("kali_only", "1486"), [1.0, 0.0, 0.0], answer, results)
+        cache.save(tmp_path / "answers.cache")
+
+        restored = SemanticAnswerCache(AnswerWithCitations)
+        restored.load(tmp_path / "answers.cache")
+        cached = restored.get(("kali_only", "1486"), [1.0, 0.0, 0.0], results)
+        assert cached == answer
+
+    def test_load_ignores_corrupt_file(self, tmp_path, results, answer):
+        """Test a truncated cache file is skipped instead of raising."""
+        cache = SemanticAnswerCache(AnswerWithCitations)
+        cache.put(CODE_ONLY, [1.0, 0.0, 0.0], answer, results)
+        path = tmp_path / "answers.cache"
+        cache.save(path)
+        path.write_bytes(path.read_bytes()[:100])
+
+        restored = SemanticAnswerCache(AnswerWithCitations)
+        restored.load(path)
+        assert restored.get(CODE_ONLY, [1.0, 0.0, 0.0], results) is None
+
+
+class TestAnswerGeneratorCache:
+    """Test AnswerGenerator goes through the semantic cache."""
+
+    def test_second_similar_query_skips_llm(self, results, answer):
+        """Test a repeated query with an embedding is answered from the cache."""
+        with patch('src.agents.answer_generator.get_openai_client') as mock_openai:
+            mock_response = Mock()
+            mock_response.choices = [Mock()]
+            mock_response.choices[0].message.parsed = answer
+            parse = AsyncMock(return_value=mock_response)
+            mock_openai.return_value.beta.chat.completions.parse = parse
+
+            agent = AnswerGenerator()
+            decision = RoutingDecision(strategy="code_only", reasoning="Test")
+            embedding = np.random.default_rng(0).normal(size=8).tolist()
+
+            first = asyncio.run(agent.generate("Durée du préavis", results, decision, embedding))
+            second = asyncio.run(agent.generate("Quelle durée de préavis", results, decision, embedding))
+
+            assert parse.await_count == 1
+            assert second.answer == first.answer
+
+    def test_no_cache_without_embedding(self, results, answer):
+        """Test generation without a query embedding always calls the LLM."""
+        with patch('src.agents.answer_generator.get_openai_client') as mock_openai:
+            mock_response = Mock()
+            mock_response.choices = [Mock()]
+            mock_response.choices[0].message.parsed = answer
+            parse = AsyncMock(return_value=mock_response)
+            mock_openai.return_value.beta.chat.completions.parse = parse
+
+            agent = AnswerGenerator()
+            asyncio.run(agent.generate("Durée du préavis", results))
+            asyncio.run(agent.generate("Durée du préavis", results))
+
+            assert parse.await_count == 2
+
+    def test_save_cache_writes_file(self, tmp_path, results, answer):
+        """Test save_cache persists generated answers to ANSWER_CACHE_PATH."""
+        path = tmp_path / "answers.cache"
+        with patch('src.agents.answer_generator.get_openai_client'), \
+             patch('src.agents.answer_generator.ANSWER_CACHE_PATH', str(path)):
+            agent = AnswerGenerator()
+            agent.cache.put(CODE_ONLY, [1.0, 0.0, 0.0], answer, results)
+            asyncio.run(agent.save_cache())
+
+        restored = SemanticAnswerCache(AnswerWithCitations)
+        restored.load(path)
+        assert restored.get(CODE_ONLY, [1.0, 0.0, 0.0], results) == answer
@@ -1,7 +1,9 @@
 """Tests for answer generation with citations."""
 
+import asyncio
+import json
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 from src.agents.answer_generator import (
     AnswerGenerator,
     AnswerWithCitations,
@@ -9,6 +11,33 @@ from src.agents.answer_generator import (
 )
 
 
+class FakeCompletionStream:
+    """Stands in for client.beta.chat.completions.stream(...): partial JSON events, then the parsed answer."""
+
+    def __init__(self, partials, final):
+        self.events = [Mock(type="content.delta", parsed=partial) for partial in partials]
+        self.final = Mock()
+        self.final.choices = [Mock()]
+        self.final.choices[0].message.parsed = final
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        for event in self.events:
+            yield event
+
+    async def get_final_completion(self):
+        return self.final
+
+
+async def collect(stream):
+    return [item async for item in stream]
+
+
 class TestAnswerWithCitations:
     """Test AnswerWithCitations Pydantic model."""
 
@@ -102,7 +131,7 @@ class TestAnswerGenerator:
         with patch.object(AnswerGenerator, '_get_system_prompt') as mock_prompt:
             mock_prompt.return_value = "System prompt"
 
-            with patch('src.agents.answer_generator.OpenAI') as mock_openai:
+            with patch('src.agents.answer_generator.get_openai_client') as mock_openai:
                 # Mock the response
                 mock_response = Mock()
                 mock_response.choices = [Mock()]
@@ -112,10 +141,10 @@ class TestAnswerGenerator:
                     citation_indices=[0],
                     reasoning="Cité par Source 1"
                 )
-                mock_openai.return_value.beta.chat.completions.parse.return_value = mock_response
+                mock_openai.return_value.beta.chat.completions.parse = AsyncMock(return_value=mock_response)
 
                 agent = AnswerGenerator()
-                answer = agent.generate("Quelle est la durée de la période d'essai?", sample_results)
+                answer = asyncio.run(agent.generate("Quelle est la durée de la période d'essai?", sample_results))
 
                 assert answer.answer == "La période d'essai dure un mois selon le code du travail."
                 assert answer.confidence == 0.85
@@ -123,9 +152,9 @@ class TestAnswerGenerator:
 
     def test_handles_empty_results(self):
         """Test graceful handling of empty results."""
-        with patch('src.agents.answer_generator.OpenAI'):
+        with patch('src.agents.answer_generator.get_openai_client'):
             agent = AnswerGenerator()
-            answer = agent.generate("Test query", [])
+            answer = asyncio.run(agent.generate("Test query", []))
 
             assert answer.answer == "Aucune information disponible pour répondre à cette question."
             assert answer.confidence == 0.0
@@ -136,7 +165,7 @@ class TestAnswerGenerator:
         with patch.object(AnswerGenerator, '_get_system_prompt') as mock_prompt:
             mock_prompt.return_value = "System prompt"
 
-            with patch('src.agents.answer_generator.OpenAI') as mock_openai:
+            with patch('src.agents.answer_generator.get_openai_client') as mock_openai:
                 # Mock response with invalid citation index
                 mock_response = Mock()
                 mock_response.choices = [Mock()]
@@ -146,10 +175,10 @@ class TestAnswerGenerator:
                     citation_indices=[0, 5, 10],  # 5 and 10 are invalid (only 3 results)
                     reasoning="Test"
                 )
-                mock_openai.return_value.beta.chat.completions.parse.return_value = mock_response
+                mock_openai.return_value.beta.chat.completions.parse = AsyncMock(return_value=mock_response)
 
                 agent = AnswerGenerator()
-                answer = agent.generate("Test", sample_results)
+                answer = asyncio.run(agent.generate("Test", sample_results))
 
                 # Only valid indices should remain
                 assert answer.citation_indices == [0]
@@ -159,7 +188,7 @@ class TestAnswerGenerator:
         with patch.object(AnswerGenerator, '_build_context') as mock_context:
             mock_context.return_value = "Context"
 
-            with patch('src.agents.answer_generator.OpenAI') as mock_openai:
+            with patch('src.agents.answer_generator.get_openai_client') as mock_openai:
                 mock_response = Mock()
                 mock_response.choices = [Mock()]
                 mock_response.choices[0].message.parsed = AnswerWithCitations(
@@ -168,12 +197,12 @@ class TestAnswerGenerator:
                     citation_indices=[],
                     reasoning="Test"
                 )
-                mock_openai.return_value.beta.chat.completions.parse.return_value = mock_response
+                mock_openai.return_value.beta.chat.completions.parse = AsyncMock(return_value=mock_response)
 
                 agent = AnswerGenerator()
                 # Pass 5 results (more than 3)
                 results = sample_results + [sample_results[0], sample_results[1]]
-                agent.generate("Test", results)
+                asyncio.run(agent.generate("Test", results))
 
                 # _build_context should be called with top 3
                 mock_context.assert_called_once()
@@ -182,7 +211,7 @@ class TestAnswerGenerator:
 
     def test_context_building(self, sample_results):
         """Test context building from results."""
-        with patch('src.agents.answer_generator.OpenAI'):
+        with patch('src.agents.answer_generator.get_openai_client'):
             agent = AnswerGenerator()
             context = agent._build_context(sample_results[:3])
 
@@ -201,7 +230,7 @@ class TestAnswerGenerator:
 
     def test_context_building_with_convention_info(self, sample_results):
         """Test context building includes convention information."""
-        with patch('src.agents.answer_generator.OpenAI'):
+        with patch('src.agents.answer_generator.get_openai_client'):
             agent = AnswerGenerator()
             context = agent._build_context([sample_results[1]])  # KALI result
 
@@ -211,11 +240,11 @@ class TestAnswerGenerator:
 
     def test_answer_generation_error_handling(self, sample_results):
         """Test graceful error handling when LLM fails."""
-        with patch('src.agents.answer_generator.OpenAI') as mock_openai:
-            mock_openai.return_value.beta.chat.completions.parse.side_effect = Exception("API Error")
+        with patch('src.agents.answer_generator.get_openai_client') as mock_openai:
+            mock_openai.return_value.beta.chat.completions.parse = AsyncMock(side_effect=Exception("API Error"))
 
             agent = AnswerGenerator()
-            answer = agent.generate("Test query", sample_results)
+            answer = asyncio.run(agent.generate("Test query", sample_results))
 
             # Should return fallback answer
             assert answer.answer == "Je n'ai pas pu générer une réponse à cette question."
@@ -224,7 +253,7 @@ class TestAnswerGenerator:
 
     def test_singleton_pattern(self):
         """Test get_answer_generator returns same instance."""
-        with patch('src.agents.answer_generator.OpenAI'):
+        with patch('src.agents.answer_generator.get_openai_client'):
             gen1 = get_answer_generator()
             gen2 = get_answer_generator()
             assert gen1 is gen2
@@ -234,7 +263,7 @@ class TestAnswerGenerator:
         with patch.object(AnswerGenerator, '_get_system_prompt') as mock_prompt:
             mock_prompt.return_value = "System prompt"
 
-            with patch('src.agents.answer_generator.OpenAI') as mock_openai:
+            with patch('src.agents.answer_generator.get_openai_client') as mock_openai:
                 mock_response = Mock()
                 mock_response.choices = [Mock()]
                 mock_response.choices[0].message.parsed = AnswerWithCitations(
@@ -243,10 +272,10 @@ class TestAnswerGenerator:
                     citation_indices=[0, 1],
                     reasoning="Both sources support this"
                 )
-                mock_openai.return_value.beta.chat.completions.parse.return_value = mock_response
+                mock_openai.return_value.beta.chat.completions.parse = AsyncMock(return_value=mock_response)
 
                 agent = AnswerGenerator()
-                answer = agent.generate("Test", sample_results)
+                answer = asyncio.run(agent.generate("Test", sample_results))
 
                 assert len(answer.citation_indices) == 2
                 assert answer.confidence == 0.9
@@ -256,7 +285,7 @@ class TestAnswerGenerator:
         with patch.object(AnswerGenerator, '_get_system_prompt') as mock_prompt:
             mock_prompt.return_value = "System prompt"
 
-            with patch('src.agents.answer_generator.OpenAI') as mock_openai:
+            with patch('src.agents.answer_generator.get_openai_client') as mock_openai:
                 mock_response = Mock()
                 mock_response.choices = [Mock()]
                 mock_response.choices[0].message.parsed = AnswerWithCitations(
@@ -265,10 +294,10 @@ class TestAnswerGenerator:
                     citation_indices=[0],
                     reasoning="Clearly supported"
                 )
-                mock_openai.return_value.beta.chat.completions.parse.return_value = mock_response
+                mock_openai.return_value.beta.chat.completions.parse = AsyncMock(return_value=mock_response)
 
                 agent = AnswerGenerator()
-                answer = agent.generate("Test", sample_results)
+                answer = asyncio.run(agent.generate("Test", sample_results))
 
                 assert answer.confidence >= 0.9
 
@@ -277,7 +306,7 @@ class TestAnswerGenerator:
         with patch.object(AnswerGenerator, '_get_system_prompt') as mock_prompt:
             mock_prompt.return_value = "System prompt"
 
-            with patch('src.agents.answer_generator.OpenAI') as mock_openai:
+            with patch('src.agents.answer_generator.get_openai_client') as mock_openai:
                 mock_response = Mock()
                 mock_response.choices = [Mock()]
                 mock_response.choices[0].message.parsed = AnswerWithCitations(
@@ -286,13 +315,112 @@ class TestAnswerGenerator:
                     citation_indices=[],
                     reasoning="Insufficient information"
                 )
-                mock_openai.return_value.beta.chat.completions.parse.return_value = mock_response
+                mock_openai.return_value.beta.chat.completions.parse = AsyncMock(return_value=mock_response)
 
                 agent = AnswerGenerator()
-                answer = agent.generate("Test", sample_results)
+                answer = asyncio.run(agent.generate("Test", sample_results))
 
                 assert answer.confidence <= 0.5
 
+    def test_stream_yields_partial_text_then_answer(self, sample_results):
+        """Test streaming yields the growing answer text, then the validated answer."""
+        final = AnswerWithCitations(answer="La période dure un mois.", confidence=0.9,
+                                    citation_indices=[0, 7], reasoning="Source 1")
+        partials = [{"answer": "La période"}, {"answer": "La période dure un mois."},
+                    {"answer": "La période dure un mois.", "confidence": 0.9}]
+
+        with patch('src.agents.answer_generator.get_openai_client') as mock_openai:
+            mock_openai.return_value.beta.chat.completions.stream = Mock(
+                return_value=FakeCompletionStream(partials, final)
+            )
+
+            agent = AnswerGenerator()
+            items = asyncio.run(collect(agent.stream("Test", sample_results)))
+
+            assert items[:-1] == ["La période", "La période dure un mois."]
+            assert items[-1].confidence == 0.9
+            assert items[-1].citation_indices == [0]  # out-of-range index dropped
+
+    def test_stream_error_yields_fallback(self, sample_results):
+        """Test a failing stream yields only the fallback answer."""
+        with patch('src.agents.answer_generator.get_openai_client') as mock_openai:
+            mock_openai.return_value.beta.chat.completions.stream = Mock(side_effect=Exception("API Error"))
+
+            agent = AnswerGenerator()
+            items = asyncio.run(collect(agent.stream("Test", sample_results)))
+
+            assert len(items) == 1
+            assert items[0].confidence == 0.0
+
+    def test_concurrent_identical_requests_share_one_call(self, sample_results):
+        """Test identical generations in flight are coalesced into one LLM call."""
+        async def slow_parse(**kwargs):
+            await asyncio.sleep(0.01)
+            response = Mock()
+            response.choices = [Mock()]
+            response.choices[0].message.parsed = AnswerWithCitations(
+                answer="Un mois.", confidence=0.9, citation_indices=[0], reasoning="Source 1"
+            )
+            return response
+
+        async def burst(agent):
+            return await asyncio.gather(
+                *(agent.generate("Durée d'essai ?", sample_results) for _ in range(3)),
+                agent.generate("Autre question ?", sample_results),
+            )
+
+        with patch('src.agents.answer_generator.get_openai_client') as mock_openai:
+            parse = AsyncMock(side_effect=slow_parse)
+            mock_openai.return_value.beta.chat.completions.parse = parse
+
+            agent = AnswerGenerator()
+            answers = asyncio.run(burst(agent))
+
+            assert parse.await_count == 2  # one per distinct question
+            assert all(answer.answer == "Un mois." for answer in answers)
+            assert agent._inflight == {}
+
+    def test_generate_batch(self, sample_results):
+        """Test batch generation submits one request per query and maps answers back in order."""
+        answers = [
+            AnswerWithCitations(answer="Un mois.", confidence=0.9, citation_indices=[0], reasoning="Source 1"),
+            AnswerWithCitations(answer="Deux mois.", confidence=0.8, citation_indices=[1, 9], reasoning="Source 2"),
+        ]
+        # Batch output lines come back in any order
+        output = "\n".join(json.dumps({
+            "custom_id": custom_id,
+            "response": {"body": {"choices": [{"message": {"content": answers[int(custom_id)].model_dump_json()}}]}},
+        }) for custom_id in ("1", "0"))
+
+        with patch('src.agents.answer_generator.get_openai_client') as mock_openai:
+            client = mock_openai.return_value
+            client.files.create = AsyncMock(return_value=Mock(id="file-in"))
+            client.batches.create = AsyncMock(return_value=Mock(id="batch-1", status="in_progress"))
+            client.batches.retrieve = AsyncMock(
+                return_value=Mock(id="batch-1", status="completed", output_file_id="file-out")
+            )
+            client.files.content = AsyncMock(return_value=Mock(text=output))
+
+            agent = AnswerGenerator()
+            results = asyncio.run(agent.generate_batch(
+                ["Durée d'essai ?", "Durée Syntec ?", "Sans résultats"],
+                [sample_results, sample_results, []],
+                poll_interval=0,
+            ))
+
+            submitted = client.files.create.await_args.kwargs["file"][1].decode().splitlines()
+            assert [json.loads(line)["custom_id"] for line in submitted] == ["0", "1"]
+            response_format = json.loads(submitted[0])["body"]["response_format"]
+            assert response_format["type"] == "json_schema"
+            assert response_format["json_schema"]["strict"] is True
+            schema = response_format["json_schema"]["schema"]
+            assert schema["required"] == ["answer", "confidence", "citation_indices", "reasoning"]
+            assert schema["additionalProperties"] is False
+
+            assert [r.answer for r in results[:2]] == ["Un mois.", "Deux mois."]
+            assert results[1].citation_indices == [1]  # out-of-range index dropped
+            assert results[2].confidence == 0.0  # no results: not submitted
+
 
 @pytest.mark.integration
 class TestAnswerGeneratorIntegration:
@@ -311,7 +439,7 @@ class TestAnswerGeneratorIntegration:
         ]
 
         agent = get_answer_generator()
-        answer = agent.generate("Quelle est la durée de la période d'essai?", sample_results)
+        answer = asyncio.run(agent.generate("Quelle est la durée de la période d'essai?", sample_results))
 
         # Verify answer structure
         assert answer.answer  # Non-empty answer
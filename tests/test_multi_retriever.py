@@ -1,5 +1,6 @@
 """Tests for multi-collection retrieval with intelligent routing."""
 
+import asyncio
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 from qdrant_client.models import Filter, FieldCondition, MatchValue
@@ -7,9 +8,25 @@ from src.agents.routing_agent import RoutingDecision
 from src.agents.multi_retriever import retrieve_with_routing
 
 
+def by_collection(**results):
+    """side_effect for a mocked retrieve(): collections are queried concurrently, in no fixed order."""
+    return lambda **kwargs: results[kwargs["collection_name"]]
+
+
+def calls_by_collection(mock_retrieve):
+    return {call[1]["collection_name"]: call for call in mock_retrieve.call_args_list}
+
+
 class TestRetrieveWithRouting:
     """Test retrieve_with_routing function."""
 
+    @pytest.fixture(autouse=True)
+    def mock_encode_query(self):
+        """Avoid loading the ONNX embedder: queries encode to a fixed vector."""
+        with patch('src.agents.multi_retriever.get_embedder'), \
+                patch('src.agents.multi_retriever.encode_query', return_value=[0.1, 0.2]) as mock_encode:
+            yield mock_encode
+
     @pytest.fixture
     def sample_results(self):
         """Sample retrieval results from collections."""
@@ -52,7 +69,7 @@ class TestRetrieveWithRouting:
             # Only return kali results for kali query
             mock_retrieve.return_value = sample_results["kali"]
 
-            results = retrieve_with_routing("Convention Syntec", decision, top_k=5)
+            results = asyncio.run(retrieve_with_routing("Convention Syntec", decision, top_k=5))
 
             # Verify retrieve was called once (only kali)
             assert mock_retrieve.call_count == 1
@@ -86,7 +103,7 @@ class TestRetrieveWithRouting:
         with patch('src.agents.multi_retriever.retrieve') as mock_retrieve:
             mock_retrieve.return_value = sample_results["code_travail"]
 
-            results = retrieve_with_routing("Préavis démission", decision, top_k=5)
+            results = asyncio.run(retrieve_with_routing("Préavis démission", decision, top_k=5))
 
             # Verify retrieve was called once (only code_travail)
             assert mock_retrieve.call_count == 1
@@ -108,26 +125,17 @@ class TestRetrieveWithRouting:
         )
 
         with patch('src.agents.multi_retriever.retrieve') as mock_retrieve:
-            # Return kali results first, then code_travail
-            mock_retrieve.side_effect = [
-                sample_results["kali"],  # First call for kali
-                sample_results["code_travail"],  # Second call for code_travail
-            ]
+            mock_retrieve.side_effect = by_collection(**sample_results)
 
-            results = retrieve_with_routing("Ingénieur informatique", decision, top_k=3)
+            results = asyncio.run(retrieve_with_routing("Ingénieur informatique", decision, top_k=3))
 
-            # Verify retrieve was called twice (kali, then code_travail)
+            # Verify retrieve was called once per collection
             assert mock_retrieve.call_count == 2
+            calls = calls_by_collection(mock_retrieve)
 
-            # First call should be kali with filter
-            first_call = mock_retrieve.call_args_list[0]
-            assert first_call[1]["collection_name"] == "kali"
-            assert first_call[1]["filters"] is not None
-
-            # Second call should be code_travail without filter
-            second_call = mock_retrieve.call_args_list[1]
-            assert second_call[1]["collection_name"] == "code_travail"
-            assert second_call[1]["filters"] is None
+            # kali is queried with the convention filter, code_travail without
+            assert calls["kali"][1]["filters"] is not None
+            assert calls["code_travail"][1]["filters"] is None
 
             # Results should be merged, sorted by score, and top-k returned
             assert len(results) == 3  # top_k=3
@@ -148,23 +156,16 @@ class TestRetrieveWithRouting:
         )
 
         with patch('src.agents.multi_retriever.retrieve') as mock_retrieve:
-            # Return code_travail first, then kali
-            mock_retrieve.side_effect = [
-                sample_results["code_travail"],  # First call for code_travail
-                sample_results["kali"],  # Second call for kali
-            ]
+            mock_retrieve.side_effect = by_collection(**sample_results)
 
-            results = retrieve_with_routing("Serveur restaurant", decision, top_k=4)
+            results = asyncio.run(retrieve_with_routing("Serveur restaurant", decision, top_k=4))
 
-            # Verify retrieve was called twice in correct order
+            # Verify retrieve was called once per collection
             assert mock_retrieve.call_count == 2
+            calls = calls_by_collection(mock_retrieve)
 
-            first_call = mock_retrieve.call_args_list[0]
-            assert first_call[1]["collection_name"] == "code_travail"
-
-            second_call = mock_retrieve.call_args_list[1]
-            assert second_call[1]["collection_name"] == "kali"
-            assert second_call[1]["filters"] is not None
+            assert calls["code_travail"][1]["filters"] is None
+            assert calls["kali"][1]["filters"] is not None
 
     def test_result_tagging_with_convention(self, sample_results):
         """Test results are tagged with collection and convention info."""
@@ -175,12 +176,9 @@ class TestRetrieveWithRouting:
         )
 
         with patch('src.agents.multi_retriever.retrieve') as mock_retrieve:
-            mock_retrieve.side_effect = [
-                sample_results["kali"],
-                sample_results["code_travail"],
-            ]
+            mock_retrieve.side_effect = by_collection(**sample_results)
 
-            results = retrieve_with_routing("Métallurgie", decision, top_k=10)
+            results = asyncio.run(retrieve_with_routing("Métallurgie", decision, top_k=10))
 
             # Verify kali results have convention tag
             kali_results = [r for r in results if r.get("_collection") == "kali"]
@@ -200,18 +198,18 @@ class TestRetrieveWithRouting:
 
         with patch('src.agents.multi_retriever.retrieve') as mock_retrieve:
             # Kali returns results, code_travail returns empty
-            mock_retrieve.side_effect = [
-                [
+            mock_retrieve.side_effect = by_collection(
+                kali=[
                     {
                         "content": "Test",
                         "metadata": {"idcc": "1486"},
                         "score": 0.8,
                     }
                 ],
-                []  # Empty results from code_travail
-            ]
+                code_travail=[],  # Empty results from code_travail
+            )
 
-            results = retrieve_with_routing("Test query", decision, top_k=5)
+            results = asyncio.run(retrieve_with_routing("Test query", decision, top_k=5))
 
             # Should have 1 result (only from kali)
             assert len(results) == 1
@@ -226,13 +224,10 @@ class TestRetrieveWithRouting:
         )
 
         with patch('src.agents.multi_retriever.retrieve') as mock_retrieve:
-            mock_retrieve.side_effect = [
-                sample_results["kali"],
-                sample_results["code_travail"],
-            ]
+            mock_retrieve.side_effect = by_collection(**sample_results)
 
             # Request top_k=2
-            results = retrieve_with_routing("Test", decision, top_k=2)
+            results = asyncio.run(retrieve_with_routing("Test", decision, top_k=2))
 
             # Should return exactly 2 results (total of 4 available)
             assert len(results) == 2
@@ -249,18 +244,18 @@ class TestRetrieveWithRouting:
             {"content": "Low score from kali", "metadata": {}, "score": 0.50}
         ]
         code_high_score = [
-            {"content": "High score from code", "metadata": {}, "score": 0.90},
+            {"content": "High score from code", "metadata": {}, "score": 0.80},  # below SHORT_CIRCUIT_SCORE
             {"content": "Medium score from code", "metadata": {}, "score": 0.70},
         ]
 
         with patch('src.agents.multi_retriever.retrieve') as mock_retrieve:
-            mock_retrieve.side_effect = [code_high_score, kali_low_score]
+            mock_retrieve.side_effect = by_collection(code_travail=code_high_score, kali=kali_low_score)
 
-            results = retrieve_with_routing("Test", decision, top_k=10)
+            results = asyncio.run(retrieve_with_routing("Test", decision, top_k=10))
 
             # Verify sorting by score (descending) regardless of collection order
             scores = [r["score"] for r in results]
-            assert scores == [0.90, 0.70, 0.50]
+            assert scores == [0.80, 0.70, 0.50]
 
     def test_kali_filter_with_different_idcc(self):
         """Test different IDCC values produce different filters."""
@@ -276,7 +271,7 @@ class TestRetrieveWithRouting:
             with patch('src.agents.multi_retriever.retrieve') as mock_retrieve:
                 mock_retrieve.return_value = []
 
-                retrieve_with_routing("Test", decision, top_k=5)
+                asyncio.run(retrieve_with_routing("Test", decision, top_k=5))
 
                 call_args = mock_retrieve.call_args
                 filters = call_args[1]["filters"]
@@ -295,7 +290,80 @@ class TestRetrieveWithRouting:
         with patch('src.agents.multi_retriever.retrieve') as mock_retrieve:
             mock_retrieve.return_value = []
 
-            retrieve_with_routing("Test", decision, top_k=5)
+            asyncio.run(retrieve_with_routing("Test", decision, top_k=5))
 
             call_args = mock_retrieve.call_args
             assert call_args[1]["filters"] is None
+
+    def test_failing_collection_keeps_other_results(self, sample_results):
+        """Test an error in one collection does not drop the other's results."""
+        decision = RoutingDecision(
+            strategy="both_kali_first",
+            idcc="1486",
+            reasoning="Test"
+        )
+
+        def flaky_retrieve(**kwargs):
+            if kwargs["collection_name"] == "kali":
+                raise ConnectionError("Qdrant unavailable")
+            return sample_results["code_travail"]
+
+        with patch('src.agents.multi_retriever.retrieve') as mock_retrieve:
+            mock_retrieve.side_effect = flaky_retrieve
+
+            results = asyncio.run(retrieve_with_routing("Test", decision, top_k=10))
+
+            assert len(results) == 2
+            assert all(r["_collection"] == "code_travail" for r in results)
+
+    def test_query_encoded_once_for_all_collections(self, sample_results, mock_encode_query):
+        """Test the query is embedded once and the vector shared by every collection."""
+        decision = RoutingDecision(
+            strategy="both_kali_first",
+            idcc="1486",
+            reasoning="Test"
+        )
+
+        with patch('src.agents.multi_retriever.retrieve') as mock_retrieve:
+            mock_retrieve.side_effect = by_collection(**sample_results)
+
+            asyncio.run(retrieve_with_routing("Test", decision, top_k=5))
+
+            assert mock_encode_query.call_count == 1
+            assert all(call[1]["query_vector"] == [0.1, 0.2] for call in mock_retrieve.call_args_list)
+
+    def test_precomputed_query_vector_skips_encoding(self, sample_results, mock_encode_query):
+        """Test a caller-provided query vector is used as is."""
+        decision = RoutingDecision(
+            strategy="code_only",
+            idcc=None,
+            reasoning="Test"
+        )
+
+        with patch('src.agents.multi_retriever.retrieve') as mock_retrieve:
+            mock_retrieve.return_value = sample_results["code_travail"]
+
+            asyncio.run(retrieve_with_routing("Test", decision, top_k=5, query_vector=[0.5, 0.5]))
+
+            mock_encode_query.assert_not_called()
+            assert mock_retrieve.call_args[1]["query_vector"] == [0.5, 0.5]
+
+    def test_strong_primary_hit_skips_secondary(self, sample_results):
+        """Test a primary hit above the short-circuit score returns only the primary results."""
+        decision = RoutingDecision(
+            strategy="both_code_first",
+            idcc="1486",
+            reasoning="Test"
+        )
+        strong_code = [
+            {"content": "Exact article", "metadata": {}, "score": 0.92},
+            {"content": "Related article", "metadata": {}, "score": 0.70},
+        ]
+
+        with patch('src.agents.multi_retriever.retrieve') as mock_retrieve:
+            mock_retrieve.side_effect = by_collection(code_travail=strong_code, kali=sample_results["kali"])
+
+            results = asyncio.run(retrieve_with_routing("Test", decision, top_k=10))
+
+            assert [r["score"] for r in results] == [0.92, 0.70]
+            assert all(r["_collection"] == "code_travail" for r in results)
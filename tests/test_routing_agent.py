@@ -1,5 +1,6 @@
 """Tests for intelligent routing agent."""
 
+import asyncio
 import pytest
 from unittest.mock import Mock, patch
 from src.agents.routing_agent import RoutingAgent, RoutingDecision, get_routing_agent
@@ -19,6 +20,12 @@ class TestRoutingDecision:
         assert decision.idcc is None
         assert decision.collections == ["code_travail"]
 
+    def test_collections_follow_strategy_changes(self):
+        """Test collections are not stale after strategy is reassigned."""
+        decision = RoutingDecision(strategy="code_only", reasoning="Test")
+        decision.strategy = "both_kali_first"
+        assert decision.collections == ["kali", "code_travail"]
+
     def test_invalid_strategy_raises(self):
         """Test invalid strategy raises ValidationError."""
         with pytest.raises(Exception):  # Pydantic ValidationError
@@ -68,7 +75,7 @@ class TestRoutingAgent:
             )
 
             agent = RoutingAgent()
-            decision = agent.route("Quelle est la durée du préavis de démission?")
+            decision = asyncio.run(agent.route("Quelle est la durée du préavis de démission?"))
 
             assert decision.strategy == "code_only"
             assert decision.collections == ["code_travail"]
@@ -84,7 +91,7 @@ class TestRoutingAgent:
             )
 
             agent = RoutingAgent()
-            decision = agent.route("Période d'essai pour un ingénieur informatique")
+            decision = asyncio.run(agent.route("Période d'essai pour un ingénieur informatique"))
 
             assert decision.strategy == "both_kali_first"
             assert decision.collections == ["kali", "code_travail"]
@@ -100,7 +107,7 @@ class TestRoutingAgent:
             )
 
             agent = RoutingAgent()
-            decision = agent.route("Convention Syntec congés payés")
+            decision = asyncio.run(agent.route("Convention Syntec congés payés"))
 
             assert decision.strategy == "kali_only"
             assert decision.collections == ["kali"]
@@ -112,7 +119,7 @@ class TestRoutingAgent:
             mock_llm.side_effect = Exception("OpenAI API error")
 
             agent = RoutingAgent()
-            decision = agent.route("Test query")
+            decision = asyncio.run(agent.route("Préavis d'un cuisinier"))
 
             # Should fallback to code_only
             assert decision.strategy == "code_only"
@@ -120,6 +127,47 @@ class TestRoutingAgent:
             assert decision.idcc is None
             assert "Fallback" in decision.reasoning
 
+    def test_fast_path_skips_llm_without_convention_keyword(self):
+        """Test general query with no convention keyword routes without calling the LLM."""
+        with patch.object(RoutingAgent, '_llm_route') as mock_llm:
+            agent = RoutingAgent()
+            decision = asyncio.run(agent.route("Quelle est la durée légale des congés payés?"))
+
+            mock_llm.assert_not_called()
+            assert decision.strategy == "code_only"
+            assert decision.idcc is None
+
+    def test_keyword_match_is_accent_and_case_insensitive(self):
+        """Test convention keywords match regardless of accents and case, and go to the LLM."""
+        with patch.object(RoutingAgent, '_llm_route') as mock_llm:
+            mock_llm.return_value = RoutingDecision(
+                strategy="both_kali_first",
+                idcc="1979",
+                reasoning="Hotel worker (HCR convention)"
+            )
+
+            agent = RoutingAgent()
+            decision = asyncio.run(agent.route("Heures sup pour un employé d'HOTEL"))
+
+            mock_llm.assert_called_once()
+            assert decision.idcc == "1979"
+
+    def test_inflected_and_derived_forms_go_to_llm(self):
+        """Test feminine and derived job names are not routed by the code_only fast path."""
+        queries = [
+            "Pause d'une serveuse", "Salaire en restauration", "Préavis d'un informaticien",
+            "Prime d'un banquier", "Heures d'un garagiste", "Congés d'une développeuse",
+            "Période d'essai d'un consultant",
+        ]
+        with patch.object(RoutingAgent, '_llm_route') as mock_llm:
+            mock_llm.return_value = RoutingDecision(strategy="both_kali_first", reasoning="Test")
+
+            agent = RoutingAgent()
+            for query in queries:
+                asyncio.run(agent.route(query))
+
+            assert mock_llm.call_count == len(queries)
+
     def test_singleton_pattern(self):
         """Test get_routing_agent returns same instance."""
         agent1 = get_routing_agent()
@@ -135,7 +183,7 @@ class TestRoutingAgentIntegration:
     def test_real_openai_call(self):
         """Test real OpenAI API call (skipped by default)."""
         agent = get_routing_agent()
-        decision = agent.route("Période d'essai pour un développeur")
+        decision = asyncio.run(agent.route("Période d'essai pour un développeur"))
 
         # Should detect IT role and route to Syntec
         assert decision.idcc == "1486"